@@ -31,6 +31,7 @@ from torch.nn import Parameter
 import nerfstudio.utils.math
 import nerfstudio.utils.poses as pose_utils
 from nerfstudio.cameras import camera_utils
+from nerfstudio.cameras.inverse_distortion import InverseDistortionApproximation
 from nerfstudio.cameras.rays import RayBundle
 from nerfstudio.data.scene_box import OrientedBox, SceneBox
 from nerfstudio.utils.tensor_dataclass import TensorDataclass
@@ -318,6 +319,154 @@ class Cameras(TensorDataclass):
             image_coords = torch.stack(image_coords, dim=-1) + pixel_offset  # stored as (y, x) coordinates
         return image_coords
 
+    def get_packed_image_coords(
+        self, camera_indices: Int[Tensor, "num_images num_cameras_batch_dims"], pixel_offset: float = 0.5
+    ) -> Tuple[
+        Float[Tensor, "num_rays 2"], Int[Tensor, "num_rays num_cameras_batch_dims"], Int[Tensor, "num_images_plus_one"]
+    ]:
+        """Returns the image coordinates of every pixel of several cameras of any size, concatenated in row major
+        order, without a python loop over the cameras.
+
+        Args:
+            camera_indices: Indices of the cameras.
+            pixel_offset: Offset for each pixel. Defaults to center of pixel (0.5)
+
+        Returns:
+            The (y, x) coordinates of each pixel, the index of the camera of each pixel, and the offsets of the
+            pixels of each camera, such that the pixels of camera i are in [offsets[i], offsets[i + 1]).
+        """
+        camera_indices = camera_indices.to(self.device)
+        true_indices = tuple(camera_indices[..., i] for i in range(camera_indices.shape[-1]))
+        heights = self.height[true_indices][:, 0]
+        widths = self.width[true_indices][:, 0]
+        num_pixels = heights * widths
+        offsets = torch.nn.functional.pad(torch.cumsum(num_pixels, dim=0), (1, 0))
+        image_ids = torch.repeat_interleave(torch.arange(len(num_pixels), device=self.device), num_pixels)
+        pixel_ids = torch.arange(int(offsets[-1]), device=self.device) - offsets[image_ids]
+        ray_widths = widths[image_ids]
+        coords = torch.stack([pixel_ids // ray_widths, pixel_ids % ray_widths], dim=-1) + pixel_offset
+        return coords, camera_indices[image_ids], offsets
+
+    def generate_packed_rays(
+        self,
+        camera_indices: Optional[Int[Tensor, "num_images num_cameras_batch_dims"]] = None,
+        camera_opt_to_camera: Optional[Float[Tensor, "num_images 3 4"]] = None,
+        distortion_params_delta: Optional[Float[Tensor, "num_images 6"]] = None,
+        disable_distortion: bool = False,
+    ) -> Tuple[RayBundle, Int[Tensor, "num_images_plus_one"]]:
+        """Generates the rays of every pixel of several cameras of any size in a single call.
+
+        Unlike generate_rays, the rays are not shaped like images: the rays of all cameras are concatenated in one
+        flat RayBundle, so cameras of different resolutions are handled without padding or a loop over the cameras.
+        Use split_packed_outputs to get images back from the outputs rendered from these rays.
+
+        Args:
+            camera_indices: Indices of the cameras to generate rays for. Defaults to all cameras.
+            camera_opt_to_camera: Optional transform for the camera to world matrices, one per camera.
+            distortion_params_delta: Optional delta for the distortion parameters, one per camera.
+            disable_distortion: If True, disables distortion.
+
+        Returns:
+            The rays of all pixels, and the offsets of the rays of each camera, such that the rays of camera i are in
+            [offsets[i], offsets[i + 1]).
+        """
+        cameras = self.reshape((1,)) if not self.shape else self
+        if camera_indices is None:
+            camera_indices = torch.stack(
+                torch.meshgrid(*[torch.arange(size) for size in cameras.shape], indexing="ij"), dim=-1
+            ).reshape(-1, len(cameras.shape))
+        assert camera_indices.ndim == 2 and camera_indices.shape[-1] == len(
+            cameras.shape
+        ), "camera_indices must have shape (num_images, num_cameras_batch_dims)"
+        coords, ray_camera_indices, offsets = cameras.get_packed_image_coords(camera_indices.to(torch.long))
+        if camera_opt_to_camera is not None or distortion_params_delta is not None:
+            image_ids = torch.repeat_interleave(
+                torch.arange(len(offsets) - 1, device=cameras.device), offsets[1:] - offsets[:-1]
+            )
+            if camera_opt_to_camera is not None:
+                camera_opt_to_camera = camera_opt_to_camera.to(cameras.device)[image_ids]
+            if distortion_params_delta is not None:
+                distortion_params_delta = distortion_params_delta.to(cameras.device)[image_ids]
+        ray_bundle = cameras._generate_rays_from_coords(
+            ray_camera_indices,
+            coords,
+            camera_opt_to_camera,
+            distortion_params_delta,
+            disable_distortion=disable_distortion,
+        )
+        return ray_bundle, offsets
+
+    def split_packed_outputs(
+        self,
+        outputs: Dict[str, Tensor],
+        offsets: Int[Tensor, "num_images_plus_one"],
+        camera_indices: Optional[Int[Tensor, "num_images num_cameras_batch_dims"]] = None,
+    ) -> List[Dict[str, Tensor]]:
+        """Splits outputs rendered from the rays of generate_packed_rays into one dictionary of images per camera.
+
+        Args:
+            outputs: Outputs with one row per ray, e.g. the outputs of a model.
+            offsets: Offsets returned by generate_packed_rays.
+            camera_indices: Camera indices passed to generate_packed_rays. Defaults to all cameras.
+
+        Returns:
+            For each camera, the outputs reshaped to (height, width, ...).
+        """
+        cameras = self.reshape((1,)) if not self.shape else self
+        if camera_indices is None:
+            heights, widths = cameras.height.reshape(-1).tolist(), cameras.width.reshape(-1).tolist()
+        else:
+            true_indices = tuple(camera_indices[..., i] for i in range(camera_indices.shape[-1]))
+            heights, widths = cameras.height[true_indices][:, 0].tolist(), cameras.width[true_indices][:, 0].tolist()
+        sizes = (offsets[1:] - offsets[:-1]).tolist()
+        assert len(sizes) == len(heights), "The offsets and camera indices don't describe the same number of images"
+        images: List[Dict[str, Tensor]] = [{} for _ in sizes]
+        for key, value in outputs.items():
+            for image, chunk, height, width in zip(images, torch.split(value, sizes), heights, widths):
+                image[key] = chunk.reshape(height, width, *value.shape[1:])
+        return images
+
+    @torch.no_grad()
+    def fit_inverse_distortion(
+        self, tolerance: float = 0.05, max_grid_size: int = 1024
+    ) -> InverseDistortionApproximation:
+        """Fits an approximate inverse distortion for every distinct distorted camera model of these cameras.
+
+        Args:
+            tolerance: Maximum reprojection error in pixels for an approximation to be used.
+            max_grid_size: Resolution after which grids stop being refined.
+
+        Returns:
+            The approximation to pass to generate_rays. Its `reports` hold the accuracy of every camera model.
+        """
+        inverse_distortion = InverseDistortionApproximation(tolerance=tolerance, max_grid_size=max_grid_size)
+        cameras = self.flatten()
+        if cameras.distortion_params is None:
+            return inverse_distortion
+        camera_type = cameras.camera_type[:, 0]
+        distortion_params = cameras.distortion_params
+        intrinsics = torch.cat([cameras.fx, cameras.fy, cameras.cx, cameras.cy], dim=-1)
+        sizes = torch.cat([cameras.width, cameras.height], dim=-1)
+
+        opencv = (camera_type == CameraType.PERSPECTIVE.value) & (distortion_params != 0).any(dim=-1)
+        for params in torch.unique(distortion_params[opencv], dim=0):
+            group = opencv & (distortion_params == params).all(dim=-1)
+            focal, center = intrinsics[group, :2], intrinsics[group, 2:]
+            # Rays are also generated one pixel past the image to compute pixel areas.
+            lower = ((-1.0 - center) / focal).min(dim=0).values
+            upper = ((sizes[group] + 1.0 - center) / focal).max(dim=0).values
+            inverse_distortion.fit_opencv(
+                params, torch.cat([lower, upper]), float(focal.max()), num_cameras=int(group.sum())
+            )
+
+        fisheye624 = camera_type == CameraType.FISHEYE624.value
+        camera_params = torch.cat([intrinsics, distortion_params], dim=-1)
+        for params in torch.unique(camera_params[fisheye624], dim=0):
+            group = fisheye624 & (camera_params == params).all(dim=-1)
+            width, height = sizes[group].max(dim=0).values.tolist()
+            inverse_distortion.fit_fisheye624(params, (width, height), num_cameras=int(group.sum()))
+        return inverse_distortion
+
     def generate_rays(
         self,
         camera_indices: Union[Int[Tensor, "*num_rays num_cameras_batch_dims"], int],
@@ -328,6 +477,7 @@ class Cameras(TensorDataclass):
         disable_distortion: bool = False,
         aabb_box: Optional[SceneBox] = None,
         obb_box: Optional[OrientedBox] = None,
+        inverse_distortion: Optional[InverseDistortionApproximation] = None,
     ) -> RayBundle:
         """Generates rays for the given camera indices.
 
@@ -373,6 +523,7 @@ class Cameras(TensorDataclass):
                 camera_indices and coords tensors (if we can).
             disable_distortion: If True, disables distortion.
             aabb_box: if not None will calculate nears and fars of the ray according to aabb box intersection
+            inverse_distortion: If not None, fitted approximation used instead of the iterative undistortion.
 
         Returns:
             Rays for the given camera indices and coords.
@@ -423,13 +574,9 @@ class Cameras(TensorDataclass):
         if cameras.is_jagged and coords is None and (keep_shape is None or keep_shape is False):
             index_dim = camera_indices.shape[-1]
             camera_indices = camera_indices.reshape(-1, index_dim)
-            _coords = [cameras.get_image_coords(index=tuple(index)).reshape(-1, 2) for index in camera_indices]
-            camera_indices = torch.cat(
-                [index.unsqueeze(0).repeat(coords.shape[0], 1) for index, coords in zip(camera_indices, _coords)],
-            )
-            coords = torch.cat(_coords, dim=0)
-            assert coords.shape[0] == camera_indices.shape[0]
             # Need to get the coords of each indexed camera and flatten all coordinate maps and concatenate them
+            coords, camera_indices, _ = cameras.get_packed_image_coords(camera_indices)
+            assert coords.shape[0] == camera_indices.shape[0]
 
         # The case where we aren't jagged && keep_shape (since otherwise coords is already set) and coords
         # is None. In this case we append (h, w) to the num_rays dimensions for all tensors. In this case,
@@ -465,7 +612,12 @@ class Cameras(TensorDataclass):
         # raybundle.shape == (num_rays) when done
 
         raybundle = cameras._generate_rays_from_coords(
-            camera_indices, coords, camera_opt_to_camera, distortion_params_delta, disable_distortion=disable_distortion
+            camera_indices,
+            coords,
+            camera_opt_to_camera,
+            distortion_params_delta,
+            disable_distortion=disable_distortion,
+            inverse_distortion=inverse_distortion,
         )
 
         # If we have mandated that we don't keep the shape, then we flatten
@@ -509,6 +661,7 @@ class Cameras(TensorDataclass):
         camera_opt_to_camera: Optional[Float[Tensor, "*num_rays 3 4"]] = None,
         distortion_params_delta: Optional[Float[Tensor, "*num_rays 6"]] = None,
         disable_distortion: bool = False,
+        inverse_distortion: Optional[InverseDistortionApproximation] = None,
     ) -> RayBundle:
         """Generates rays for the given camera indices and coords where self isn't jagged
 
@@ -576,6 +729,8 @@ class Cameras(TensorDataclass):
 
             disable_distortion: If True, disables distortion.
 
+            inverse_distortion: If not None, fitted approximation used instead of the iterative undistortion.
+
         Returns:
             Rays for the given camera indices and coords. RayBundle.shape == num_rays
         """
@@ -647,7 +802,12 @@ class Cameras(TensorDataclass):
                 mask = (self.camera_type[true_indices] != CameraType.EQUIRECTANGULAR.value).squeeze(-1)  # (num_rays)
                 coord_mask = torch.stack([mask, mask, mask], dim=0)
                 if mask.any() and (distortion_params != 0).any():
-                    coord_stack[coord_mask, :] = camera_utils.radial_and_tangential_undistort(
+                    undistort = (
+                        inverse_distortion.undistort
+                        if inverse_distortion is not None
+                        else camera_utils.radial_and_tangential_undistort
+                    )
+                    coord_stack[coord_mask, :] = undistort(
                         coord_stack[coord_mask, :].reshape(3, -1, 2),
                         distortion_params[mask, :],
                     ).reshape(-1, 2)
@@ -877,7 +1037,12 @@ class Cameras(TensorDataclass):
                     ],
                     dim=1,
                 )
-                directions_stack[coord_mask] = camera_utils.fisheye624_unproject(masked_coords, camera_params)
+                unproject = (
+                    inverse_distortion.fisheye624_unproject
+                    if inverse_distortion is not None
+                    else camera_utils.fisheye624_unproject
+                )
+                directions_stack[coord_mask] = unproject(masked_coords, camera_params)
 
             else:
                 raise ValueError(f"Camera type {cam_type} not supported.")
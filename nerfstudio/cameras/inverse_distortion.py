@@ -0,0 +1,319 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Fast approximate inverse distortion.
+
+Undistortion has no closed form for the OpenCV and Fisheye624 camera models, so ray generation runs Newton iterations
+for every ray. For a given camera model, the inverse distortion is a smooth function of the pixel position: it is
+tabulated once on a regular grid with the exact solver, and bilinearly interpolated afterwards. Each grid is refined
+until its reprojection error, measured by distorting the approximate result again with the forward model, is below a
+tolerance. Camera models that can't reach the tolerance keep using the exact solver, as do rays outside the fitted
+image area and cameras whose distortion parameters changed since fitting (e.g. when they are optimized).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Literal, Tuple
+
+import torch
+import torch.nn.functional as F
+from jaxtyping import Float
+from rich.table import Table
+from torch import Tensor
+
+from nerfstudio.cameras import camera_utils
+from nerfstudio.utils.rich_utils import CONSOLE
+
+DistortionModel = Literal["opencv", "fisheye624"]
+
+
+@dataclass
+class InverseDistortionReport:
+    """Accuracy of the approximate inverse distortion of one camera model."""
+
+    model: DistortionModel
+    """Distortion model of the cameras."""
+    num_cameras: int
+    """Number of cameras sharing the camera model."""
+    grid_size: int
+    """Resolution of the last fitted grid."""
+    max_error: float
+    """Maximum reprojection error of the approximation, in pixels."""
+    exact_max_error: float
+    """Maximum reprojection error of the exact solver on the same points, in pixels."""
+    accepted: bool
+    """Whether the approximation is within the tolerance and used in place of the exact solver."""
+
+
+@dataclass
+class InverseDistortionGrid:
+    """Tabulated inverse distortion of one camera model."""
+
+    params: Tensor
+    """Parameters identifying the camera model."""
+    bounds: Float[Tensor, "4"]
+    """Area covered by the grid, as [x_min, y_min, x_max, y_max] in the input coordinates."""
+    deltas: Float[Tensor, "1 2 grid_size grid_size"]
+    """Correction to add to the input coordinates at every grid vertex."""
+
+    def contains(self, points: Float[Tensor, "num_points 2"]) -> Tensor:
+        """Returns which points are inside the area covered by the grid."""
+        return ((points >= self.bounds[:2]) & (points <= self.bounds[2:])).all(dim=-1)
+
+    def sample(self, points: Float[Tensor, "num_points 2"]) -> Float[Tensor, "num_points 2"]:
+        """Bilinearly interpolates the correction at points inside the grid."""
+        normalized = (points - self.bounds[:2]) / (self.bounds[2:] - self.bounds[:2]) * 2.0 - 1.0
+        deltas = F.grid_sample(
+            self.deltas, normalized.view(1, 1, -1, 2).to(self.deltas), align_corners=True, padding_mode="border"
+        )
+        return deltas[0, :, 0].T.to(points)
+
+
+def _opencv_distort(points: Float[Tensor, "num_points 2"], params: Float[Tensor, "6"]) -> Float[Tensor, "num_points 2"]:
+    """Applies the OpenCV distortion to normalized image coordinates."""
+    zeros = torch.zeros_like(points[..., 0])
+    xd, yd, *_ = camera_utils._compute_residual_and_jacobian(points[..., 0], points[..., 1], zeros, zeros, params)
+    return torch.stack([xd, yd], dim=-1)
+
+
+def _fisheye624_unproject_xy(
+    uv: Float[Tensor, "num_points 2"], params: Float[Tensor, "16"]
+) -> Float[Tensor, "num_points 2"]:
+    """Returns the x and y components of the rays (with z = 1) of pixels, in the OpenCV convention."""
+    return camera_utils.fisheye624_unproject_helper(uv[None], params[None])[0, :, :2]
+
+
+def _fisheye624_project(
+    xy: Float[Tensor, "num_points 2"], params: Float[Tensor, "16"]
+) -> Float[Tensor, "num_points 2"]:
+    """Projects rays with z = 1 to pixels."""
+    xyz = torch.cat([xy, torch.ones_like(xy[:, :1])], dim=-1)
+    return camera_utils.fisheye624_project(xyz[None], params[None])[0]
+
+
+class InverseDistortionApproximation:
+    """Approximates the inverse distortion of the OpenCV and Fisheye624 camera models of a set of cameras.
+
+    Usually created with `Cameras.fit_inverse_distortion`, and passed to `Cameras.generate_rays`.
+
+    Args:
+        tolerance: Maximum reprojection error in pixels for an approximation to be used.
+        min_grid_size: Resolution of the first grid fitted for each camera model.
+        max_grid_size: Resolution after which grids stop being refined.
+        num_validation_points: Number of random points the reprojection error is measured on.
+    """
+
+    def __init__(
+        self,
+        tolerance: float = 0.05,
+        min_grid_size: int = 64,
+        max_grid_size: int = 1024,
+        num_validation_points: int = 1 << 16,
+    ) -> None:
+        self.tolerance = tolerance
+        self.min_grid_size = min_grid_size
+        self.max_grid_size = max_grid_size
+        self.num_validation_points = num_validation_points
+        self.grids: Dict[DistortionModel, List[InverseDistortionGrid]] = {"opencv": [], "fisheye624": []}
+        self.reports: List[InverseDistortionReport] = []
+
+    @torch.no_grad()
+    def fit_opencv(
+        self,
+        distortion_params: Float[Tensor, "num_params"],
+        bounds: Float[Tensor, "4"],
+        pixel_scale: float,
+        num_cameras: int = 1,
+    ) -> InverseDistortionReport:
+        """Fits the inverse of an OpenCV distortion. The grid works on normalized image coordinates, so it is shared
+        by all cameras with the same distortion parameters, whatever their intrinsics.
+
+        Args:
+            distortion_params: The distortion parameters [k1, k2, k3, k4, p1, p2].
+            bounds: Normalized image coordinates to cover, as [x_min, y_min, x_max, y_max].
+            pixel_scale: Largest focal length of the cameras, to convert errors to pixels.
+            num_cameras: Number of cameras with these parameters, for the report.
+        """
+        return self._fit_model(
+            "opencv",
+            distortion_params,
+            bounds,
+            num_cameras,
+            solve=lambda points: camera_utils.radial_and_tangential_undistort(points, distortion_params) - points,
+            reproject=lambda points, deltas: _opencv_distort(points + deltas, distortion_params) * pixel_scale,
+            scale=pixel_scale,
+        )
+
+    @torch.no_grad()
+    def fit_fisheye624(
+        self, camera_params: Float[Tensor, "num_params"], image_size: Tuple[int, int], num_cameras: int = 1
+    ) -> InverseDistortionReport:
+        """Fits the unprojection of a Fisheye624 camera. The grid works on pixels, so it is specific to the
+        intrinsics.
+
+        Args:
+            camera_params: The intrinsics [fx, fy, cx, cy] followed by the distortion parameters.
+            image_size: Largest (width, height) of the cameras with these parameters.
+            num_cameras: Number of cameras with these parameters, for the report.
+        """
+        focal, center = camera_params[:2], camera_params[2:4]
+        bounds = torch.tensor([-1.0, -1.0, image_size[0] + 1.0, image_size[1] + 1.0]).to(camera_params)
+        return self._fit_model(
+            "fisheye624",
+            camera_params,
+            bounds,
+            num_cameras,
+            solve=lambda points: _fisheye624_unproject_xy(points, camera_params) - (points - center) / focal,
+            reproject=lambda points, deltas: _fisheye624_project((points - center) / focal + deltas, camera_params),
+            scale=1.0,
+        )
+
+    def _fit_model(
+        self,
+        model: DistortionModel,
+        params: Tensor,
+        bounds: Tensor,
+        num_cameras: int,
+        solve: Callable[[Tensor], Tensor],
+        reproject: Callable[[Tensor, Tensor], Tensor],
+        scale: float,
+    ) -> InverseDistortionReport:
+        """Refines the grid of one camera model until it meets the tolerance or reaches the maximum resolution.
+
+        Args:
+            model: Distortion model.
+            params: Parameters identifying the camera model.
+            bounds: Area to cover, as [x_min, y_min, x_max, y_max].
+            num_cameras: Number of cameras using the camera model, for the report.
+            solve: Exact correction to add to points.
+            reproject: Maps points and their correction back to the input coordinates, in pixels.
+            scale: Pixels per unit of the input coordinates.
+        """
+        generator = torch.Generator(device=bounds.device).manual_seed(0)
+        points = torch.rand((self.num_validation_points, 2), generator=generator, device=bounds.device)
+        points = bounds[:2] + points * (bounds[2:] - bounds[:2])
+        expected = points * scale
+        exact_error = float((reproject(points, solve(points)) - expected).norm(dim=-1).max())
+
+        grid_size = self.min_grid_size
+        while True:
+            xs = torch.linspace(float(bounds[0]), float(bounds[2]), grid_size, device=bounds.device)
+            ys = torch.linspace(float(bounds[1]), float(bounds[3]), grid_size, device=bounds.device)
+            vertices = torch.stack(torch.meshgrid(xs, ys, indexing="xy"), dim=-1).reshape(-1, 2)
+            deltas = solve(vertices).T.reshape(1, 2, grid_size, grid_size).contiguous()
+            grid = InverseDistortionGrid(params=params, bounds=bounds, deltas=deltas)
+            max_error = float(
+                (reproject(points, grid.sample(points)) - expected).norm(dim=-1).nan_to_num(torch.inf).max()
+            )
+            if max_error <= self.tolerance or grid_size >= self.max_grid_size:
+                break
+            grid_size = min(grid_size * 2, self.max_grid_size)
+
+        accepted = max_error <= self.tolerance
+        if accepted:
+            self.grids[model].append(grid)
+        report = InverseDistortionReport(
+            model=model,
+            num_cameras=num_cameras,
+            grid_size=grid_size,
+            max_error=max_error,
+            exact_max_error=exact_error,
+            accepted=accepted,
+        )
+        self.reports.append(report)
+        return report
+
+    def undistort(
+        self, coords: Float[Tensor, "*batch 2"], distortion_params: Float[Tensor, "*params_batch num_params"]
+    ) -> Float[Tensor, "*batch 2"]:
+        """Drop-in replacement for `camera_utils.radial_and_tangential_undistort`.
+
+        Args:
+            coords: The distorted coordinates.
+            distortion_params: The distortion parameters [k1, k2, k3, k4, p1, p2].
+
+        Returns:
+            The undistorted coordinates.
+        """
+        shape = coords.shape
+        coords = coords.reshape(-1, 2)
+        distortion_params = distortion_params.expand(shape[:-1] + distortion_params.shape[-1:]).reshape(
+            -1, distortion_params.shape[-1]
+        )
+        deltas, done = self._sample_grids("opencv", coords, distortion_params)
+        undistorted = coords + deltas
+        if not done.all():
+            undistorted[~done] = camera_utils.radial_and_tangential_undistort(coords[~done], distortion_params[~done])
+        return undistorted.reshape(shape)
+
+    def fisheye624_unproject(
+        self, coords: Float[Tensor, "num_rays 2"], camera_params: Float[Tensor, "num_cameras num_params"]
+    ) -> Float[Tensor, "1 num_rays 3"]:
+        """Drop-in replacement for `camera_utils.fisheye624_unproject`. Like it, only uses the first camera params.
+
+        Args:
+            coords: Pixel coordinates.
+            camera_params: The intrinsics [fx, fy, cx, cy] and distortion parameters of the cameras.
+
+        Returns:
+            The ray directions in camera space, in the OpenGL convention.
+        """
+        params = camera_params[0]
+        deltas, done = self._sample_grids("fisheye624", coords, params.expand(coords.shape[0], -1))
+        if not done.any():
+            return camera_utils.fisheye624_unproject(coords, camera_params)
+        xy = (coords - params[2:4]) / params[:2] + deltas
+        if not done.all():
+            xy[~done] = _fisheye624_unproject_xy(coords[~done], params)
+        # Switch from OpenCV to OpenGL, like camera_utils.fisheye624_unproject.
+        return torch.cat([xy[:, :1], -xy[:, 1:], -torch.ones_like(xy[:, :1])], dim=-1)[None]
+
+    def _sample_grids(
+        self,
+        model: DistortionModel,
+        points: Float[Tensor, "num_points 2"],
+        params: Float[Tensor, "num_points num_params"],
+    ) -> Tuple[Float[Tensor, "num_points 2"], Tensor]:
+        """Returns the interpolated corrections of points, and which points were covered by a grid."""
+        deltas = torch.zeros_like(points)
+        done = torch.zeros_like(points[:, 0], dtype=torch.bool)
+        for grid in self.grids[model]:
+            inside = (params == grid.params.to(params)).all(dim=-1) & grid.contains(points) & ~done
+            if inside.all():
+                # Common case of a single camera model: no indexing.
+                return grid.sample(points), inside
+            if inside.any():
+                deltas[inside] = grid.sample(points[inside])
+                done |= inside
+        return deltas, done
+
+    def print_report(self) -> None:
+        """Prints the accuracy of every camera model."""
+        if not self.reports:
+            return
+        table = Table(title=f"Approximate inverse distortion (tolerance {self.tolerance:g} px)")
+        for column in ("Model", "Cameras", "Grid", "Max error (px)", "Exact solver max error (px)", "Used"):
+            table.add_column(column)
+        for report in self.reports:
+            table.add_row(
+                report.model,
+                str(report.num_cameras),
+                f"{report.grid_size}x{report.grid_size}",
+                f"{report.max_error:.4f}",
+                f"{report.exact_max_error:.4f}",
+                "yes" if report.accepted else "no, using the exact solver",
+            )
+        CONSOLE.print(table)
@@ -21,7 +21,7 @@ from dataclasses import dataclass, field
 from typing import Callable, Dict, Literal, Optional, Tuple, Union, overload
 
 import torch
-from jaxtyping import Float, Int, Shaped
+from jaxtyping import Bool, Float, Int, Shaped
 from torch import Tensor
 
 from nerfstudio.utils.math import Gaussians, conical_frustum_to_gaussian
@@ -187,6 +187,170 @@ class RaySamples(TensorDataclass):
         return weights, transmittance
 
 
+@dataclass
+class PackedRaySamples:
+    """Samples of rays that each have their own number of samples, concatenated ray after ray.
+
+    This is the packed layout of nerfacc, which avoids padding rays to the same number of samples, e.g. after culling
+    samples. The samples of each ray must be contiguous and sorted along the ray.
+    """
+
+    ray_samples: RaySamples
+    """Samples of all the rays, of shape (num_samples,)."""
+    ray_indices: Int[Tensor, "num_samples"]
+    """Index of the ray of each sample, in increasing order."""
+    num_rays: int
+    """Number of rays, including the rays without samples."""
+    sample_indices: Optional[Int[Tensor, "num_samples"]] = None
+    """Index of each sample among the samples of its ray in the dense layout it was packed from, if any."""
+
+    @classmethod
+    def from_dense(
+        cls, ray_samples: RaySamples, mask: Optional[Bool[Tensor, "num_rays num_samples"]] = None
+    ) -> "PackedRaySamples":
+        """Packs samples of shape (num_rays, num_samples), keeping the samples where mask is True.
+
+        Args:
+            ray_samples: Samples to pack.
+            mask: Samples to keep. Keeps all the samples if None.
+        """
+        num_rays, num_samples = ray_samples.shape
+        if mask is None:
+            device = ray_samples.frustums.origins.device
+            return cls(
+                ray_samples=ray_samples.flatten(),
+                ray_indices=torch.arange(num_rays, device=device).repeat_interleave(num_samples),
+                num_rays=num_rays,
+                sample_indices=torch.arange(num_samples, device=device).repeat(num_rays),
+            )
+        ray_indices, sample_indices = mask.nonzero().unbind(-1)
+        return cls(
+            ray_samples=ray_samples[mask], ray_indices=ray_indices, num_rays=num_rays, sample_indices=sample_indices
+        )
+
+    def pack_values(
+        self, values: Shaped[Tensor, "num_rays dense_num_samples channels"]
+    ) -> Shaped[Tensor, "num_samples channels"]:
+        """Returns the values of the samples, from values of the dense layout the samples were packed from.
+
+        Args:
+            values: Values of each sample of the dense layout, e.g. weights computed before packing.
+        """
+        assert self.sample_indices is not None, "The samples were not packed from a dense layout"
+        return values[self.ray_indices, self.sample_indices]
+
+    def __getitem__(self, mask: Bool[Tensor, "num_samples"]) -> "PackedRaySamples":
+        """Returns the samples where mask is True."""
+        return PackedRaySamples(
+            ray_samples=self.ray_samples[mask],
+            ray_indices=self.ray_indices[mask],
+            num_rays=self.num_rays,
+            sample_indices=None if self.sample_indices is None else self.sample_indices[mask],
+        )
+
+    def __len__(self) -> int:
+        return self.ray_indices.shape[0]
+
+    def to(self, device: TORCH_DEVICE) -> "PackedRaySamples":
+        """Returns the samples on the device."""
+        return PackedRaySamples(
+            ray_samples=self.ray_samples.to(device),
+            ray_indices=self.ray_indices.to(device),
+            num_rays=self.num_rays,
+            sample_indices=None if self.sample_indices is None else self.sample_indices.to(device),
+        )
+
+    def get_num_samples_per_ray(self) -> Int[Tensor, "num_rays"]:
+        """Returns the number of samples of each ray."""
+        return torch.bincount(self.ray_indices, minlength=self.num_rays)
+
+    def _get_first_samples(self) -> Int[Tensor, "num_samples"]:
+        """Returns the index of the first sample of the ray of each sample."""
+        num_samples_per_ray = self.get_num_samples_per_ray()
+        return (torch.cumsum(num_samples_per_ray, dim=0) - num_samples_per_ray)[self.ray_indices]
+
+    def get_sample_positions(self) -> Int[Tensor, "num_samples"]:
+        """Returns the position of each sample among the samples of its ray."""
+        return torch.arange(len(self), device=self.ray_indices.device) - self._get_first_samples()
+
+    def exclusive_sum(self, values: Float[Tensor, "num_samples channels"]) -> Float[Tensor, "num_samples channels"]:
+        """Returns the sum of the values of the previous samples of the same ray, for each sample.
+
+        Args:
+            values: Values of each sample.
+        """
+        # The sum runs over all the rays, in double precision so that the rays far from the first one stay exact.
+        exclusive = torch.cumsum(values.double(), dim=0) - values.double()
+        return (exclusive - exclusive[self._get_first_samples()]).to(values)
+
+    def sum_along_rays(self, values: Float[Tensor, "num_samples channels"]) -> Float[Tensor, "num_rays channels"]:
+        """Returns the sum of the values of the samples of each ray.
+
+        Args:
+            values: Values of each sample.
+        """
+        sums = values.new_zeros((self.num_rays, values.shape[-1]))
+        return sums.index_add(0, self.ray_indices, values)
+
+    def get_weights(self, densities: Float[Tensor, "num_samples 1"]) -> Float[Tensor, "num_samples 1"]:
+        """Return weights based on predicted densities, like RaySamples.get_weights.
+
+        Args:
+            densities: Predicted densities for samples along ray
+
+        Returns:
+            Weights for each sample
+        """
+        assert self.ray_samples.deltas is not None
+        delta_density = self.ray_samples.deltas * densities
+        alphas = 1 - torch.exp(-delta_density)
+        transmittance = torch.exp(-self.exclusive_sum(delta_density))
+        return torch.nan_to_num(alphas * transmittance)
+
+    def to_dense(
+        self, values: Shaped[Tensor, "num_samples channels"], fill_value: float = 0.0
+    ) -> Shaped[Tensor, "num_rays max_num_samples channels"]:
+        """Returns the values of the samples padded to the largest number of samples per ray.
+
+        Args:
+            values: Values of each sample.
+            fill_value: Value of the padding.
+        """
+        max_num_samples = int(self.get_num_samples_per_ray().max()) if len(self) > 0 else 0
+        dense = values.new_full((self.num_rays, max_num_samples, values.shape[-1]), fill_value)
+        dense[self.ray_indices, self.get_sample_positions()] = values
+        return dense
+
+    def get_spacing_bins(
+        self, weights: Float[Tensor, "num_samples 1"]
+    ) -> Tuple[Float[Tensor, "num_rays num_bins_1"], Float[Tensor, "num_rays num_bins"]]:
+        """Returns the edges of contiguous spacing bins of each ray with their weights, for the losses that compare
+        histograms along rays.
+
+        The gap before each sample becomes a bin without weight, and rays are padded with empty bins at their last
+        edge.
+
+        Args:
+            weights: Weights of each sample.
+        """
+        starts, ends = self.ray_samples.spacing_starts, self.ray_samples.spacing_ends
+        assert starts is not None and ends is not None, "Ray samples must have spacing starts and ends"
+        positions = self.get_sample_positions()
+        is_first = positions == 0
+        is_last = positions == self.get_num_samples_per_ray()[self.ray_indices] - 1
+        last_ends = ends.new_zeros((self.num_rays, 1))
+        last_ends[self.ray_indices[is_last]] = ends[is_last]
+        num_bins = 2 * int(positions.max() + 1) if len(self) > 0 else 0
+        edges = last_ends.expand(-1, num_bins + 1).clone()
+        # The gap before a sample starts at the end of the previous one, or at its own start for the first one.
+        edges[self.ray_indices[is_first], 0] = starts[is_first, 0]
+        edges[self.ray_indices, 2 * positions + 1] = starts[:, 0]
+        edges[self.ray_indices, 2 * positions + 2] = ends[:, 0]
+        bin_weights = weights.new_zeros((self.num_rays, num_bins))
+        bin_weights[self.ray_indices, 2 * positions + 1] = weights[:, 0]
+        return edges, bin_weights
+
+
 @dataclass
 class RayBundle(TensorDataclass):
     """A bundle of ray parameters."""
@@ -272,23 +436,31 @@ class RayBundle(TensorDataclass):
 
         shaped_raybundle_fields = self[..., None]
 
-        frustums = Frustums(
-            origins=shaped_raybundle_fields.origins,  # [..., 1, 3]
-            directions=shaped_raybundle_fields.directions,  # [..., 1, 3]
-            starts=bin_starts,  # [..., num_samples, 1]
-            ends=bin_ends,  # [..., num_samples, 1]
-            pixel_area=shaped_raybundle_fields.pixel_area,  # [..., 1, 1]
+        # Ray fields are expanded to the samples here, so the dataclasses don't need to be checked and broadcast.
+        batch_shape = torch.broadcast_shapes(bin_starts.shape[:-1], bin_ends.shape[:-1])
+
+        def expand(x: Tensor) -> Tensor:
+            return x.expand(*batch_shape, x.shape[-1])
+
+        frustums = Frustums.construct_unchecked(
+            batch_shape,
+            origins=expand(shaped_raybundle_fields.origins),  # [..., num_samples, 3]
+            directions=expand(shaped_raybundle_fields.directions),  # [..., num_samples, 3]
+            starts=expand(bin_starts),  # [..., num_samples, 1]
+            ends=expand(bin_ends),  # [..., num_samples, 1]
+            pixel_area=expand(shaped_raybundle_fields.pixel_area),  # [..., num_samples, 1]
         )
 
-        ray_samples = RaySamples(
+        ray_samples = RaySamples.construct_unchecked(
+            batch_shape,
             frustums=frustums,
-            camera_indices=camera_indices,  # [..., 1, 1]
-            deltas=deltas,  # [..., num_samples, 1]
-            spacing_starts=spacing_starts,  # [..., num_samples, 1]
-            spacing_ends=spacing_ends,  # [..., num_samples, 1]
+            camera_indices=None if camera_indices is None else expand(camera_indices),  # [..., num_samples, 1]
+            deltas=expand(deltas),  # [..., num_samples, 1]
+            spacing_starts=None if spacing_starts is None else expand(spacing_starts),  # [..., num_samples, 1]
+            spacing_ends=None if spacing_ends is None else expand(spacing_ends),  # [..., num_samples, 1]
             spacing_to_euclidean_fn=spacing_to_euclidean_fn,
-            metadata=shaped_raybundle_fields.metadata,
-            times=None if self.times is None else self.times[..., None],  # [..., 1, 1]
+            metadata={key: expand(value) for key, value in shaped_raybundle_fields.metadata.items()},
+            times=None if self.times is None else expand(self.times[..., None]),  # [..., num_samples, 1]
         )
 
         return ray_samples
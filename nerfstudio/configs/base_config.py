@@ -151,3 +151,13 @@ class ViewerConfig(PrintableConfig):
     """Scale for the camera frustums in the viewer."""
     default_composite_depth: bool = True
     """The default value for compositing depth. Turn off if you want to see the camera frustums without occlusions."""
+    render_cache_size: int = 1
+    """Number of renders whose outputs the viewer keeps, so that changing the output type, colormap or split view of
+    a static view doesn't render it again. Each render keeps all the outputs of the model at full resolution on the
+    model device. Set to 0 to disable."""
+    progressive_render: bool = False
+    """Whether to render high resolution images in passes over finer and finer grids of pixels, sending each pass
+    to the viewer, instead of all at once. Only applies to models rendering rays."""
+    reproject_on_move: bool = False
+    """Whether to show the last high resolution image reprojected to the new camera pose while moving the camera,
+    filled in with the low resolution render where it is disoccluded. Only applies to models rendering rays."""
@@ -55,8 +55,14 @@ from nerfstudio.configs.dataparser_configs import AnnotatedDataParserUnion
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
 from nerfstudio.data.dataparsers.blender_dataparser import BlenderDataParserConfig
 from nerfstudio.data.datasets.base_dataset import InputDataset
-from nerfstudio.data.pixel_samplers import PatchPixelSamplerConfig, PixelSampler, PixelSamplerConfig
+from nerfstudio.data.pixel_samplers import (
+    ErrorDrivenPixelSampler,
+    PatchPixelSamplerConfig,
+    PixelSampler,
+    PixelSamplerConfig,
+)
 from nerfstudio.data.utils.dataloaders import CacheDataloader, FixedIndicesEvalDataloader, RandIndicesEvalDataloader
+from nerfstudio.data.utils.image_decoders import ImageDecoderName, get_image_decoder
 from nerfstudio.data.utils.nerfstudio_collate import nerfstudio_collate
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.model_components.ray_generators import RayGenerator
@@ -109,6 +115,16 @@ class DataManagerConfig(InstantiateConfig):
     """Process masks on GPU for speed at the expense of memory, if True."""
     images_on_gpu: bool = False
     """Process images on GPU for speed at the expense of memory, if True."""
+    image_cache_dir: Optional[Path] = None
+    """If set, decoded and rescaled images and masks are stored in a memory-mapped file in this directory the first
+    time they are loaded, and read back without decoding on later runs."""
+    image_decoder: ImageDecoderName = "pil"
+    """Library used to decode images. "turbojpeg" requires PyTurboJPEG."""
+    reduced_image_decoding: bool = False
+    """When downscaling JPEGs by half or more, decode them at a reduced size in the DCT domain before resizing. This
+    is faster, but the pixels differ slightly from a full resolution decode."""
+    max_thread_workers: Optional[int] = None
+    """Maximum number of threads used to load, decode and cache images. If None, uses the ThreadPoolExecutor default."""
 
 
 class DataManager(nn.Module):
@@ -227,6 +243,13 @@ class DataManager(nn.Module):
         """
         return IterableWrapper(self.iter_eval, self.next_eval, length)
 
+    def _setup_dataset_decoding(self, dataset: InputDataset) -> None:
+        """Sets the image decoder of a newly created dataset and, if configured, its decoded image cache."""
+        config = cast(DataManagerConfig, self.config)
+        dataset.image_decoder = get_image_decoder(config.image_decoder, config.reduced_image_decoding)
+        if config.image_cache_dir is not None and self.test_mode != "inference":
+            dataset.setup_image_cache(config.image_cache_dir, max_workers=config.max_thread_workers)
+
     @abstractmethod
     def setup_train(self):
         """Sets up the data manager for training.
@@ -293,6 +316,14 @@ class DataManager(nn.Module):
         """Returns a list of callbacks to be used during training."""
         return []
 
+    def update_train_losses(self, batch: Dict, model_outputs: Dict) -> None:
+        """Reports the model outputs for the last training batch, e.g. to guide error-driven pixel sampling.
+
+        Args:
+            batch: batch returned by `next_train`
+            model_outputs: outputs of the model for the batch
+        """
+
     @abstractmethod
     def get_param_groups(self) -> Dict[str, List[Parameter]]:
         """Get the param groups for the data manager.
@@ -318,6 +349,20 @@ class VanillaDataManagerConfig(DataManagerConfig):
     train_num_times_to_repeat_images: int = -1
     """When not training on all images, number of iterations before picking new
     images. If -1, never pick new images."""
+    prefetch_train_images: bool = False
+    """When picking new training images, load the next images in the background while the current ones are used.
+    This avoids stalling training on every resample, at the cost of keeping two sets of images in memory."""
+    use_ray_direction_lut: bool = False
+    """Generate training rays from camera space directions precomputed once per group of cameras sharing the same
+    intrinsics, instead of unprojecting and undistorting every sampled pixel on every step."""
+    ray_direction_lut_max_mb: float = 512.0
+    """Memory budget of the ray direction lookup table. Rays of cameras that don't fit are generated on the fly."""
+    approximate_undistortion: bool = False
+    """Generate training rays with an inverse distortion interpolated from a grid fitted once per camera model,
+    instead of running the iterative undistortion for every ray. A report of the fitting error is printed."""
+    undistortion_tolerance: float = 0.05
+    """Maximum reprojection error in pixels of the approximate inverse distortion. Camera models that exceed it keep
+    using the exact solver."""
     eval_num_rays_per_batch: int = 1024
     """Number of rays per batch to use per eval iteration."""
     eval_num_images_to_sample_from: int = -1
@@ -448,17 +493,21 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
 
     def create_train_dataset(self) -> TDataset:
         """Sets up the data loaders for training"""
-        return self.dataset_type(
+        dataset = self.dataset_type(
             dataparser_outputs=self.train_dataparser_outputs,
             scale_factor=self.config.camera_res_scale_factor,
         )
+        self._setup_dataset_decoding(dataset)
+        return dataset
 
     def create_eval_dataset(self) -> TDataset:
         """Sets up the data loaders for evaluation"""
-        return self.dataset_type(
+        dataset = self.dataset_type(
             dataparser_outputs=self.dataparser.get_dataparser_outputs(split=self.test_split),
             scale_factor=self.config.camera_res_scale_factor,
         )
+        self._setup_dataset_decoding(dataset)
+        return dataset
 
     def _get_pixel_sampler(self, dataset: TDataset, num_rays_per_batch: int) -> PixelSampler:
         """Infer pixel sampler to use."""
@@ -478,6 +527,7 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
             is_equirectangular=is_equirectangular,
             num_rays_per_batch=num_rays_per_batch,
             fisheye_crop_radius=fisheye_crop_radius,
+            num_images=len(dataset),
         )
 
     def setup_train(self):
@@ -493,10 +543,17 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
             pin_memory=True,
             collate_fn=self.config.collate_fn,
             exclude_batch_keys_from_device=self.exclude_batch_keys_from_device,
+            prefetch_images=self.config.prefetch_train_images,
         )
         self.iter_train_image_dataloader = iter(self.train_image_dataloader)
         self.train_pixel_sampler = self._get_pixel_sampler(self.train_dataset, self.config.train_num_rays_per_batch)
-        self.train_ray_generator = RayGenerator(self.train_dataset.cameras.to(self.device))
+        self.train_ray_generator = RayGenerator(
+            self.train_dataset.cameras.to(self.device),
+            use_direction_lut=self.config.use_ray_direction_lut,
+            max_lut_memory_mb=self.config.ray_direction_lut_max_mb,
+            approximate_undistortion=self.config.approximate_undistortion,
+            undistortion_tolerance=self.config.undistortion_tolerance,
+        )
 
     def setup_eval(self):
         """Sets up the data loader for evaluation"""
@@ -538,6 +595,10 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
         ray_bundle = self.train_ray_generator(ray_indices)
         return ray_bundle, batch
 
+    def update_train_losses(self, batch: Dict, model_outputs: Dict) -> None:
+        if isinstance(self.train_pixel_sampler, ErrorDrivenPixelSampler):
+            self.train_pixel_sampler.update_from_outputs(batch, model_outputs)
+
     def next_eval(self, step: int) -> Tuple[RayBundle, Dict]:
         """Returns the next batch of data from the eval dataloader."""
         self.eval_count += 1
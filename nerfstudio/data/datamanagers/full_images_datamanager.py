@@ -21,13 +21,29 @@ paradigm
 
 from __future__ import annotations
 
+import json
 import random
 from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from dataclasses import dataclass, field
 from functools import cached_property
 from pathlib import Path
-from typing import Dict, ForwardRef, Generic, List, Literal, Optional, Tuple, Type, Union, cast, get_args, get_origin
+from typing import (
+    Any,
+    Dict,
+    ForwardRef,
+    Generic,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+    cast,
+    get_args,
+    get_origin,
+)
 
 import cv2
 import fpsample
@@ -44,7 +60,16 @@ from nerfstudio.data.datamanagers.base_datamanager import DataManager, DataManag
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
 from nerfstudio.data.dataparsers.nerfstudio_dataparser import NerfstudioDataParserConfig
 from nerfstudio.data.datasets.base_dataset import InputDataset
-from nerfstudio.utils.misc import get_orig_class
+from nerfstudio.data.utils.image_cache import (
+    ImageShard,
+    ImageShardWriter,
+    LRUImageCache,
+    build_image_shard,
+    get_cache_key,
+    get_file_signature,
+)
+from nerfstudio.utils import writer
+from nerfstudio.utils.misc import get_orig_class, step_check
 from nerfstudio.utils.rich_utils import CONSOLE
 
 
@@ -67,8 +92,6 @@ class FullImageDatamanagerConfig(DataManagerConfig):
     """Whether to cache images in memory. If "cpu", caches on cpu. If "gpu", caches on device."""
     cache_images_type: Literal["uint8", "float32"] = "float32"
     """The image type returned from manager, caching images in uint8 saves memory"""
-    max_thread_workers: Optional[int] = None
-    """The maximum number of threads to use for caching images. If None, uses all available threads."""
     train_cameras_sampling_strategy: Literal["random", "fps"] = "random"
     """Specifies which sampling strategy is used to generate train cameras, 'random' means sampling 
     uniformly random without replacement, 'fps' means farthest point sampling which is helpful to reduce the artifacts 
@@ -79,6 +102,52 @@ class FullImageDatamanagerConfig(DataManagerConfig):
     fps_reset_every: int = 100
     """The number of iterations before one resets fps sampler repeatly, which is essentially drawing fps_reset_every
     samples from the pool of all training cameras without replacement before a new round of sampling starts."""
+    undistorted_cache_dir: Optional[Path] = None
+    """If set, undistorted images, masks and the updated camera intrinsics are stored in this directory and reused
+    by later runs (including ns-render and ns-eval). The cache is invalidated when the images, intrinsics,
+    distortion parameters or scale factors change."""
+    max_resident_images: int = -1
+    """If > 0, at most this many decoded images per split are kept in memory instead of caching the whole dataset.
+    The images that the train camera sampler will visit next are loaded in the background and the least recently
+    used ones are evicted. Use this for datasets that don't fit in memory."""
+    num_prefetch_images: int = 8
+    """When max_resident_images is set, the number of upcoming train images to load in the background."""
+
+
+class LazyEvalImages(Sequence[Tuple[Cameras, Dict]]):
+    """(camera, data) tuples of the eval images that are only loaded when accessed, so that iterating over them
+    keeps at most `max_resident_images` images in memory.
+
+    Args:
+        cameras: Cameras of the eval images. Their intrinsics are updated when an image is undistorted, so they are
+            only read after the image is loaded.
+        images: Cache of the eval images.
+        device: Device to move the images to.
+        num_prefetch_images: Number of upcoming images to load in the background.
+    """
+
+    def __init__(
+        self, cameras: Cameras, images: LRUImageCache, device: Union[torch.device, str], num_prefetch_images: int
+    ):
+        self.cameras = cameras
+        self.images = images
+        self.device = device
+        self.num_prefetch_images = num_prefetch_images
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(len(self))[idx]]
+        if idx < 0:
+            idx += len(self)
+        # Decode the next images while the current one is evaluated.
+        self.images.prefetch(range(idx + 1, min(idx + 1 + self.num_prefetch_images, len(self))))
+        # Copy to not mutate the cached dictionary.
+        data = self.images[idx].copy()
+        data["image"] = data["image"].to(self.device)
+        return self.cameras[idx : idx + 1].to(self.device), data
 
 
 class FullImageDatamanager(DataManager, Generic[TDataset]):
@@ -177,21 +246,65 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
             raise ValueError(f"Unknown train camera sampling strategy: {self.config.train_cameras_sampling_strategy}")
 
     @cached_property
-    def cached_train(self) -> List[Dict[str, torch.Tensor]]:
+    def cached_train(self) -> Union[List[Dict], LRUImageCache]:
         """Get the training images. Will load and undistort the images the
         first time this (cached) property is accessed."""
         return self._load_images("train", cache_images_device=self.config.cache_images)
 
     @cached_property
-    def cached_eval(self) -> List[Dict[str, torch.Tensor]]:
+    def cached_eval(self) -> Union[List[Dict], LRUImageCache]:
         """Get the eval images. Will load and undistort the images the
         first time this (cached) property is accessed."""
         return self._load_images("eval", cache_images_device=self.config.cache_images)
 
+    def _undistort_idx(self, dataset: TDataset, distorted_cameras: Cameras, idx: int) -> Dict:
+        """Loads image `idx` of `dataset` and undistorts it using the intrinsics of `distorted_cameras`.
+        The intrinsics of the undistorted image are written to `dataset.cameras`."""
+        data = dataset.get_data(idx, image_type=self.config.cache_images_type)
+        camera = distorted_cameras[idx].reshape(())
+        assert data["image"].shape[1] == camera.width.item() and data["image"].shape[0] == camera.height.item(), (
+            f'The size of image ({data["image"].shape[1]}, {data["image"].shape[0]}) loaded '
+            f'does not match the camera parameters ({camera.width.item(), camera.height.item()})'
+        )
+        if camera.distortion_params is None or torch.all(camera.distortion_params == 0):
+            return data
+        K = camera.get_intrinsics_matrices().numpy()
+        distortion_params = camera.distortion_params.numpy()
+        image = data["image"].numpy()
+
+        K, image, mask = _undistort_image(camera, distortion_params, data, image, K)
+        data["image"] = torch.from_numpy(image)
+        if mask is not None:
+            data["mask"] = mask
+
+        dataset.cameras.fx[idx] = float(K[0, 0])
+        dataset.cameras.fy[idx] = float(K[1, 1])
+        dataset.cameras.cx[idx] = float(K[0, 2])
+        dataset.cameras.cy[idx] = float(K[1, 2])
+        dataset.cameras.width[idx] = image.shape[1]
+        dataset.cameras.height[idx] = image.shape[0]
+        return data
+
+    def _to_cache_device(self, data: Dict, cache_images_device: Literal["cpu", "gpu"]) -> Dict:
+        """Moves the image data of a single image to where cached images are kept."""
+        if cache_images_device == "gpu":
+            data["image"] = data["image"].to(self.device)
+            if "mask" in data:
+                data["mask"] = data["mask"].to(self.device)
+            if "depth" in data:
+                data["depth"] = data["depth"].to(self.device)
+        elif cache_images_device == "cpu":
+            data["image"] = data["image"].pin_memory()
+            if "mask" in data:
+                data["mask"] = data["mask"].pin_memory()
+        else:
+            assert_never(cache_images_device)
+        return data
+
     def _load_images(
         self, split: Literal["train", "eval"], cache_images_device: Literal["cpu", "gpu"]
-    ) -> List[Dict[str, torch.Tensor]]:
-        undistorted_images: List[Dict[str, torch.Tensor]] = []
+    ) -> Union[List[Dict], LRUImageCache]:
+        undistorted_images: List[Dict] = []
 
         # Which dataset?
         if split == "train":
@@ -201,79 +314,146 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
         else:
             assert_never(split)
 
-        def undistort_idx(idx: int) -> Dict[str, torch.Tensor]:
-            data = dataset.get_data(idx, image_type=self.config.cache_images_type)
-            camera = dataset.cameras[idx].reshape(())
-            assert data["image"].shape[1] == camera.width.item() and data["image"].shape[0] == camera.height.item(), (
-                f'The size of image ({data["image"].shape[1]}, {data["image"].shape[0]}) loaded '
-                f'does not match the camera parameters ({camera.width.item(), camera.height.item()})'
-            )
-            if camera.distortion_params is None or torch.all(camera.distortion_params == 0):
-                return data
-            K = camera.get_intrinsics_matrices().numpy()
-            distortion_params = camera.distortion_params.numpy()
-            image = data["image"].numpy()
-
-            K, image, mask = _undistort_image(camera, distortion_params, data, image, K)
-            data["image"] = torch.from_numpy(image)
-            if mask is not None:
-                data["mask"] = mask
-
-            dataset.cameras.fx[idx] = float(K[0, 0])
-            dataset.cameras.fy[idx] = float(K[1, 1])
-            dataset.cameras.cx[idx] = float(K[0, 2])
-            dataset.cameras.cy[idx] = float(K[1, 2])
-            dataset.cameras.width[idx] = image.shape[1]
-            dataset.cameras.height[idx] = image.shape[0]
-            return data
+        cache_path = None
+        if self.config.undistorted_cache_dir is not None:
+            cache_path = self._get_undistorted_cache_path(dataset)
 
-        CONSOLE.log(f"Caching / undistorting {split} images")
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            undistorted_images = list(
-                track(
-                    executor.map(
-                        undistort_idx,
-                        range(len(dataset)),
-                    ),
-                    description=f"Caching / undistorting {split} images",
-                    transient=True,
-                    total=len(dataset),
+        if self.config.max_resident_images > 0:
+            return self._setup_lru_images(split, dataset, cache_images_device, cache_path)
+
+        if cache_path is not None and cache_path.exists():
+            CONSOLE.log(f"Loading undistorted {split} images from {cache_path}")
+            undistorted_images = _read_undistorted_cache(ImageShard(cache_path), dataset)
+        else:
+            CONSOLE.log(f"Caching / undistorting {split} images")
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                undistorted_images = list(
+                    track(
+                        executor.map(
+                            lambda idx: self._undistort_idx(dataset, dataset.cameras, idx),
+                            range(len(dataset)),
+                        ),
+                        description=f"Caching / undistorting {split} images",
+                        transient=True,
+                        total=len(dataset),
+                    )
                 )
-            )
+            if cache_path is not None:
+                CONSOLE.log(f"Saving undistorted {split} images to {cache_path}")
+                try:
+                    _write_undistorted_cache(cache_path, undistorted_images, dataset)
+                except UncacheableDataError as e:
+                    CONSOLE.print(f"Not caching undistorted {split} images: {e}", style="bold yellow")
 
         # Move to device.
+        for cache in undistorted_images:
+            self._to_cache_device(cache, cache_images_device)
         if cache_images_device == "gpu":
-            for cache in undistorted_images:
-                cache["image"] = cache["image"].to(self.device)
-                if "mask" in cache:
-                    cache["mask"] = cache["mask"].to(self.device)
-                if "depth" in cache:
-                    cache["depth"] = cache["depth"].to(self.device)
-                self.train_cameras = self.train_dataset.cameras.to(self.device)
-        elif cache_images_device == "cpu":
-            for cache in undistorted_images:
-                cache["image"] = cache["image"].pin_memory()
-                if "mask" in cache:
-                    cache["mask"] = cache["mask"].pin_memory()
-                self.train_cameras = self.train_dataset.cameras
+            self.train_cameras = self.train_dataset.cameras.to(self.device)
         else:
-            assert_never(cache_images_device)
+            self.train_cameras = self.train_dataset.cameras
 
         return undistorted_images
 
+    def _setup_lru_images(
+        self,
+        split: Literal["train", "eval"],
+        dataset: TDataset,
+        cache_images_device: Literal["cpu", "gpu"],
+        cache_path: Optional[Path],
+    ) -> LRUImageCache:
+        """Returns a bounded working set of images that are loaded and undistorted on demand. With an undistorted
+        image cache, the shard is built one image at a time on first use and the images are then read from it."""
+        # Undistortion updates the intrinsics of `dataset.cameras`, so keep the original ones around.
+        distorted_cameras = deepcopy(dataset.cameras)
+        if cache_path is not None and not cache_path.exists():
+            CONSOLE.log(f"Saving undistorted {split} images to {cache_path}")
+            extras: List[Dict[str, Any]] = [{} for _ in range(len(dataset))]
+
+            def get_record(idx: int) -> Dict[str, np.ndarray]:
+                data = self._undistort_idx(dataset, distorted_cameras, idx)
+                extras[idx] = _get_undistorted_extras(data)
+                return _get_undistorted_record(data)
+
+            try:
+                build_image_shard(
+                    cache_path,
+                    len(dataset),
+                    get_record,
+                    metadata=lambda: _get_undistorted_cache_metadata(dataset, extras),
+                    max_workers=self.config.max_thread_workers,
+                    description=f"Caching / undistorting {split} images",
+                )
+            except UncacheableDataError as e:
+                CONSOLE.print(f"Not caching undistorted {split} images: {e}", style="bold yellow")
+                cache_path = None
+
+        if cache_path is not None:
+            CONSOLE.log(f"Streaming undistorted {split} images from {cache_path}")
+            shard_images = _read_undistorted_cache(ImageShard(cache_path), dataset)
+
+            def load_idx(idx: int) -> Dict:
+                return self._to_cache_device(shard_images[idx].copy(), cache_images_device)
+
+        else:
+            # Without a cache, images are undistorted again every time they are reloaded.
+
+            def load_idx(idx: int) -> Dict:
+                return self._to_cache_device(self._undistort_idx(dataset, distorted_cameras, idx), cache_images_device)
+
+        CONSOLE.log(f"Keeping at most {self.config.max_resident_images} {split} images in memory")
+        # Intrinsics of images that were not loaded yet are updated lazily, so the cameras can't be copied to the
+        # device once up front.
+        self.train_cameras = self.train_dataset.cameras
+        return LRUImageCache(
+            load_idx,
+            num_images=len(dataset),
+            max_resident_images=self.config.max_resident_images,
+            max_workers=self.config.max_thread_workers,
+        )
+
+    def _get_undistorted_cache_path(self, dataset: TDataset) -> Path:
+        """Returns the location of the undistorted image cache for a dataset. Must be called before the
+        dataset's cameras are updated by undistortion."""
+        outputs = dataset._dataparser_outputs
+        cameras = dataset.cameras
+        fisheye_crop_radius = None
+        if cameras.metadata is not None:
+            fisheye_crop_radius = cameras.metadata.get("fisheye_crop_radius")
+        key = get_cache_key(
+            [
+                UNDISTORTED_CACHE_VERSION,
+                type(dataset).__name__,
+                [get_file_signature(filepath) for filepath in outputs.image_filenames],
+                [get_file_signature(filepath) for filepath in outputs.mask_filenames or []],
+                dataset.scale_factor,
+                self.config.cache_images_type,
+                None if outputs.alpha_color is None else outputs.alpha_color.tolist(),
+                [cameras.fx.tolist(), cameras.fy.tolist(), cameras.cx.tolist(), cameras.cy.tolist()],
+                [cameras.width.tolist(), cameras.height.tolist(), cameras.camera_type.tolist()],
+                None if cameras.distortion_params is None else cameras.distortion_params.tolist(),
+                fisheye_crop_radius,
+            ]
+        )
+        return Path(self.config.undistorted_cache_dir) / f"undistorted_{key}.shard"
+
     def create_train_dataset(self) -> TDataset:
         """Sets up the data loaders for training"""
-        return self.dataset_type(
+        dataset = self.dataset_type(
             dataparser_outputs=self.train_dataparser_outputs,
             scale_factor=self.config.camera_res_scale_factor,
         )
+        self._setup_dataset_decoding(dataset)
+        return dataset
 
     def create_eval_dataset(self) -> TDataset:
         """Sets up the data loaders for evaluation"""
-        return self.dataset_type(
+        dataset = self.dataset_type(
             dataparser_outputs=self.dataparser.get_dataparser_outputs(split=self.test_split),
             scale_factor=self.config.camera_res_scale_factor,
         )
+        self._setup_dataset_decoding(dataset)
+        return dataset
 
     @cached_property
     def dataset_type(self) -> Type[TDataset]:
@@ -310,18 +490,23 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
         """Sets up the data loader for evaluation"""
 
     @property
-    def fixed_indices_eval_dataloader(self) -> List[Tuple[Cameras, Dict]]:
+    def fixed_indices_eval_dataloader(self) -> Sequence[Tuple[Cameras, Dict]]:
         """
-        Pretends to be the dataloader for evaluation, it returns a list of (camera, data) tuples
+        Pretends to be the dataloader for evaluation, it returns a list of (camera, data) tuples. When
+        max_resident_images is set, the images are loaded as the tuples are accessed instead.
         """
         image_indices = [i for i in range(len(self.eval_dataset))]
+        assert len(self.eval_dataset.cameras.shape) == 1, "Assumes single batch dimension"
+        if isinstance(self.cached_eval, LRUImageCache):
+            num_prefetch = min(self.config.num_prefetch_images, self.config.max_resident_images - 1)
+            return LazyEvalImages(self.eval_dataset.cameras, self.cached_eval, self.device, num_prefetch)
+        # Load (and undistort) the images before copying the cameras, as undistortion updates their intrinsics.
         data = [d.copy() for d in self.cached_eval]
         _cameras = deepcopy(self.eval_dataset.cameras).to(self.device)
         cameras = []
         for i in image_indices:
             data[i]["image"] = data[i]["image"].to(self.device)
             cameras.append(_cameras[i : i + 1])
-        assert len(self.eval_dataset.cameras.shape) == 1, "Assumes single batch dimension"
         return list(zip(cameras, data))
 
     def get_param_groups(self) -> Dict[str, List[Parameter]]:
@@ -349,6 +534,13 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
         if len(self.train_unseen_cameras) == 0:
             self.train_unseen_cameras = self.sample_train_cameras()
 
+        if isinstance(self.cached_train, LRUImageCache):
+            # Decode the images we're about to visit while the model trains on the current one.
+            num_prefetch = min(self.config.num_prefetch_images, self.config.max_resident_images - 1)
+            self.cached_train.prefetch(self.train_unseen_cameras[:num_prefetch])
+            if writer.is_initialized() and step_check(step, writer.GLOBAL_BUFFER["steps_per_log"], run_at_zero=True):
+                writer.put_dict(name="Train Image Cache", scalar_dict=self.cached_train.get_stats(), step=step)
+
         data = self.cached_train[image_idx]
         # We're going to copy to make sure we don't mutate the cached dictionary.
         # This can cause a memory leak: https://github.com/nerfstudio-project/nerfstudio/issues/3335
@@ -386,6 +578,83 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
         return camera, data
 
 
+UNDISTORTED_CACHE_VERSION = 2
+
+
+class UncacheableDataError(Exception):
+    """Raised when an image data dictionary has entries that can't be stored in the undistorted image cache."""
+
+
+def _write_undistorted_cache(path: Path, undistorted_images: List[Dict], dataset: InputDataset):
+    """Saves undistorted images, their non-tensor data and the updated intrinsics of `dataset.cameras` to a shard."""
+    writer = ImageShardWriter(path)
+    try:
+        extras = [_get_undistorted_extras(data) for data in undistorted_images]
+        for data in undistorted_images:
+            writer.append(_get_undistorted_record(data))
+        writer.close(metadata=_get_undistorted_cache_metadata(dataset, extras))
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def _get_undistorted_record(data: Dict) -> Dict[str, np.ndarray]:
+    """Returns the arrays of an undistorted image data dictionary that are stored in the shard."""
+    return {key: value.cpu().numpy() for key, value in data.items() if isinstance(value, torch.Tensor)}
+
+
+def _get_undistorted_extras(data: Dict) -> Dict[str, Any]:
+    """Returns the non-tensor entries of an undistorted image data dictionary, which are stored in the shard metadata.
+
+    Raises:
+        UncacheableDataError: If an entry does not survive a round trip through json unchanged.
+    """
+    extras = {
+        key: value for key, value in data.items() if key != "image_idx" and not isinstance(value, torch.Tensor)
+    }
+    try:
+        roundtrip = json.loads(json.dumps(extras))
+    except (TypeError, ValueError) as e:
+        raise UncacheableDataError(f"Image data entries {list(extras)} are not json-serializable: {e}") from e
+    if roundtrip != extras:
+        raise UncacheableDataError(f"Image data entries {list(extras)} change when serialized to json")
+    return extras
+
+
+def _get_undistorted_cache_metadata(dataset: InputDataset, extras: List[Dict[str, Any]]) -> Dict:
+    """Returns the updated intrinsics of `dataset.cameras`, once all its images are undistorted, and the non-tensor
+    entries of each image."""
+    cameras = dataset.cameras
+    intrinsics = {
+        "fx": cameras.fx.squeeze(-1).tolist(),
+        "fy": cameras.fy.squeeze(-1).tolist(),
+        "cx": cameras.cx.squeeze(-1).tolist(),
+        "cy": cameras.cy.squeeze(-1).tolist(),
+        "width": cameras.width.squeeze(-1).tolist(),
+        "height": cameras.height.squeeze(-1).tolist(),
+    }
+    return {"intrinsics": intrinsics, "extras": extras}
+
+
+def _read_undistorted_cache(shard: ImageShard, dataset: InputDataset) -> List[Dict]:
+    """Loads undistorted images from a shard and writes the cached intrinsics back into `dataset.cameras`."""
+    assert len(shard) == len(dataset), "Undistorted image cache does not match the dataset"
+    extras = shard.metadata["extras"]
+    undistorted_images = []
+    for idx in range(len(shard)):
+        data = {"image_idx": idx, **extras[idx]}
+        for name in shard.records[idx]:
+            data[name] = torch.from_numpy(shard.get(idx, name))
+        undistorted_images.append(data)
+
+    intrinsics = shard.metadata["intrinsics"]
+    cameras = dataset.cameras
+    for name in ("fx", "fy", "cx", "cy", "width", "height"):
+        values = getattr(cameras, name)
+        values[:] = torch.tensor(intrinsics[name], dtype=values.dtype).unsqueeze(-1)
+    return undistorted_images
+
+
 def _undistort_image(
     camera: Cameras, distortion_params: np.ndarray, data: dict, image: np.ndarray, K: np.ndarray
 ) -> Tuple[np.ndarray, np.ndarray, Optional[torch.Tensor]]:
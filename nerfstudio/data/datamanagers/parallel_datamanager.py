@@ -19,12 +19,27 @@ Parallel data manager that generates training data in multiple python processes.
 from __future__ import annotations
 
 import concurrent.futures
+import dataclasses
 import queue
 import time
 from dataclasses import dataclass, field
 from functools import cached_property
 from pathlib import Path
-from typing import Dict, ForwardRef, Generic, List, Literal, Optional, Tuple, Type, Union, cast, get_args, get_origin
+from typing import (
+    Any,
+    Dict,
+    ForwardRef,
+    Generic,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    cast,
+    get_args,
+    get_origin,
+)
 
 import torch
 from pathos.helpers import mp
@@ -41,8 +56,15 @@ from nerfstudio.data.datamanagers.base_datamanager import (
 )
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
 from nerfstudio.data.datasets.base_dataset import InputDataset
-from nerfstudio.data.pixel_samplers import PatchPixelSamplerConfig, PixelSampler, PixelSamplerConfig
+from nerfstudio.data.pixel_samplers import (
+    ErrorDrivenPixelSampler,
+    PatchPixelSamplerConfig,
+    PixelSampler,
+    PixelSamplerConfig,
+)
 from nerfstudio.data.utils.dataloaders import CacheDataloader, FixedIndicesEvalDataloader, RandIndicesEvalDataloader
+from nerfstudio.data.utils.nerfstudio_collate import nerfstudio_collate
+from nerfstudio.data.utils.shared_memory import SharedTensor, SharedTensorRing
 from nerfstudio.model_components.ray_generators import RayGenerator
 from nerfstudio.utils.misc import get_orig_class
 from nerfstudio.utils.rich_utils import CONSOLE
@@ -58,9 +80,16 @@ class ParallelDataManagerConfig(VanillaDataManagerConfig):
     """Number of processes to use for train data loading. More than 1 doesn't result in that much better performance"""
     queue_size: int = 2
     """Size of shared data queue containing generated ray bundles and batches.
-    If queue_size <= 0, the queue size is infinite."""
-    max_thread_workers: Optional[int] = None
-    """Maximum number of threads to use in thread pool executor. If None, use ThreadPool default."""
+    If queue_size <= 0, the queue size is infinite. When use_ring_buffer is set, this is the number of ring slots
+    (at least num_processes + 1)."""
+    use_ring_buffer: bool = True
+    """If True, ray bundles and batches are passed to the main process through a ring of preallocated shared memory
+    slots instead of being pickled through a multiprocessing queue. Falls back to the queue if batches contain
+    anything other than tensors."""
+    share_images: bool = True
+    """If True, the main process decodes the training images once into a uint8 buffer in shared memory that all
+    processes read from. Otherwise every process decodes and stores its own copy of the dataset. Only used when all
+    training images have the same resolution."""
 
 
 class DataProcessor(mp.Process):  # type: ignore
@@ -75,6 +104,8 @@ class DataProcessor(mp.Process):  # type: ignore
         dataparser_outputs: outputs from the dataparser
         dataset: input dataset
         pixel_sampler: The pixel sampler for sampling rays
+        shared_img_data: collated image data in shared memory. If None, the process caches its own images.
+        ring: shared memory ring to write batches to. If None, batches are put on `out_queue`.
     """
 
     def __init__(
@@ -84,6 +115,8 @@ class DataProcessor(mp.Process):  # type: ignore
         dataparser_outputs: DataparserOutputs,
         dataset: TDataset,
         pixel_sampler: PixelSampler,
+        shared_img_data: Optional[Dict[str, Any]] = None,
+        ring: Optional[SharedTensorRing] = None,
     ):
         super().__init__()
         self.daemon = True
@@ -93,15 +126,32 @@ class DataProcessor(mp.Process):  # type: ignore
         self.dataset = dataset
         self.exclude_batch_keys_from_device = self.dataset.exclude_batch_keys_from_device
         self.pixel_sampler = pixel_sampler
-        self.ray_generator = RayGenerator(self.dataset.cameras)
+        self.ray_generator = RayGenerator(
+            self.dataset.cameras,
+            use_direction_lut=self.config.use_ray_direction_lut,
+            max_lut_memory_mb=self.config.ray_direction_lut_max_mb,
+            approximate_undistortion=self.config.approximate_undistortion,
+            undistortion_tolerance=self.config.undistortion_tolerance,
+        )
+        self.shared_img_data = shared_img_data
+        self.ring = ring
 
     def run(self):
         """Append out queue in parallel with ray bundles and batches."""
-        self.cache_images()
+        if self.shared_img_data is not None:
+            self.img_data = {
+                key: value.tensor if isinstance(value, SharedTensor) else value
+                for key, value in self.shared_img_data.items()
+            }
+        else:
+            self.cache_images()
         while True:
-            batch = self.pixel_sampler.sample(self.img_data)
-            ray_indices = batch["indices"]
-            ray_bundle: RayBundle = self.ray_generator(ray_indices)
+            ray_bundle, batch = sample_ray_batch(self.img_data, self.pixel_sampler, self.ray_generator)
+            if self.ring is not None:
+                flat_batch = flatten_ray_batch(ray_bundle, batch)
+                assert flat_batch is not None
+                self.ring.put(flat_batch)
+                continue
             # check that GPUs are available
             if torch.cuda.is_available():
                 ray_bundle = ray_bundle.pin_memory()
@@ -129,6 +179,95 @@ class DataProcessor(mp.Process):  # type: ignore
         self.img_data = self.config.collate_fn(batch_list)
 
 
+def sample_ray_batch(
+    img_data: Dict, pixel_sampler: PixelSampler, ray_generator: RayGenerator
+) -> Tuple[RayBundle, Dict]:
+    """Samples a batch of pixels from the cached images and generates their rays."""
+    batch = pixel_sampler.sample(img_data)
+    if batch["image"].dtype == torch.uint8:
+        batch["image"] = batch["image"].float() / 255.0
+    ray_indices = batch["indices"]
+    ray_bundle: RayBundle = ray_generator(ray_indices)
+    return ray_bundle, batch
+
+
+def flatten_ray_batch(ray_bundle: RayBundle, batch: Dict) -> Optional[Dict[str, torch.Tensor]]:
+    """Flattens a ray bundle and batch into a dictionary of tensors that can be written to a `SharedTensorRing`.
+
+    Returns None if the batch contains anything other than tensors.
+    """
+    flat_batch = {}
+    for ray_field in dataclasses.fields(ray_bundle):
+        value = getattr(ray_bundle, ray_field.name)
+        if ray_field.name == "metadata":
+            for key, metadata_value in value.items():
+                flat_batch[f"ray_bundle.metadata.{key}"] = metadata_value
+        elif value is not None:
+            flat_batch[f"ray_bundle.{ray_field.name}"] = value
+    for key, value in batch.items():
+        flat_batch[f"batch.{key}"] = value
+    if not all(isinstance(value, torch.Tensor) for value in flat_batch.values()):
+        return None
+    return flat_batch
+
+
+def unflatten_ray_batch(flat_batch: Dict[str, torch.Tensor]) -> Tuple[RayBundle, Dict]:
+    """Inverse of `flatten_ray_batch`."""
+    ray_fields: Dict[str, Any] = {"metadata": {}}
+    batch = {}
+    for key, value in flat_batch.items():
+        group, _, name = key.partition(".")
+        if group == "batch":
+            batch[name] = value
+        elif name.startswith("metadata."):
+            ray_fields["metadata"][name[len("metadata.") :]] = value
+        else:
+            ray_fields[name] = value
+    return RayBundle(**ray_fields), batch
+
+
+def cache_images_to_shared_memory(
+    dataset: InputDataset, collate_fn, max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """Decodes all images of a dataset once and collates them into tensors in shared memory.
+
+    Images are decoded as uint8 and written straight into a NxHxWx3 `SharedTensor`, as are any other per-pixel
+    tensors such as masks. Remaining data (e.g. image indices) is collated with `collate_fn`.
+
+    Args:
+        dataset: Dataset whose images all have the same resolution.
+        collate_fn: Collate function for the data that isn't stored per-pixel.
+        max_workers: Maximum number of decoding threads.
+
+    Returns:
+        Collated batch in which the per-pixel data are `SharedTensor`s.
+    """
+    num_images = len(dataset)
+    shared: Dict[str, SharedTensor] = {}
+    batch_list = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for idx, data in enumerate(
+            track(
+                executor.map(lambda idx: dataset.get_data(idx, image_type="uint8"), range(num_images)),
+                description="Loading data batch into shared memory",
+                total=num_images,
+                transient=False,
+            )
+        ):
+            image_shape = data["image"].shape[:2]
+            for key in list(data.keys()):
+                value = data[key]
+                if isinstance(value, torch.Tensor) and len(value.shape) >= 2 and value.shape[:2] == image_shape:
+                    if key not in shared:
+                        shared[key] = SharedTensor((num_images, *value.shape), value.dtype)
+                    shared[key].tensor[idx] = value
+                    del data[key]
+            batch_list.append(data)
+    collated_batch = collate_fn(batch_list)
+    collated_batch.update(shared)
+    return collated_batch
+
+
 class ParallelDataManager(DataManager, Generic[TDataset]):
     """Data manager implementation for parallel dataloading.
 
@@ -205,17 +344,21 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
 
     def create_train_dataset(self) -> TDataset:
         """Sets up the data loaders for training."""
-        return self.dataset_type(
+        dataset = self.dataset_type(
             dataparser_outputs=self.train_dataparser_outputs,
             scale_factor=self.config.camera_res_scale_factor,
         )
+        self._setup_dataset_decoding(dataset)
+        return dataset
 
     def create_eval_dataset(self) -> TDataset:
         """Sets up the data loaders for evaluation."""
-        return self.dataset_type(
+        dataset = self.dataset_type(
             dataparser_outputs=self.dataparser.get_dataparser_outputs(split=self.test_split),
             scale_factor=self.config.camera_res_scale_factor,
         )
+        self._setup_dataset_decoding(dataset)
+        return dataset
 
     def _get_pixel_sampler(self, dataset: TDataset, num_rays_per_batch: int) -> PixelSampler:
         """Infer pixel sampler to use."""
@@ -235,6 +378,7 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
             is_equirectangular=is_equirectangular,
             num_rays_per_batch=num_rays_per_batch,
             fisheye_crop_radius=fisheye_crop_radius,
+            num_images=len(dataset),
         )
 
     def setup_train(self):
@@ -242,6 +386,20 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
         assert self.train_dataset is not None
         self.train_pixel_sampler = self._get_pixel_sampler(self.train_dataset, self.config.train_num_rays_per_batch)  # type: ignore
         self.data_queue = mp.Queue(maxsize=self.config.queue_size)  # type: ignore
+        self.shared_img_data = None
+        cameras = self.train_dataset.cameras
+        same_resolution = bool(
+            (cameras.width == cameras.width[0]).all() and (cameras.height == cameras.height[0]).all()
+        )
+        if self.config.share_images and same_resolution:
+            self.shared_img_data = cache_images_to_shared_memory(
+                self.train_dataset, nerfstudio_collate, max_workers=self.config.max_thread_workers
+            )
+        elif self.config.share_images:
+            CONSOLE.print("[bold yellow]Variable resolution images, each data process will cache its own images.")
+        self.data_ring = None
+        if self.config.use_ring_buffer:
+            self.data_ring = self._setup_data_ring()
         self.data_procs = [
             DataProcessor(
                 out_queue=self.data_queue,  # type: ignore
@@ -249,6 +407,8 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
                 dataparser_outputs=self.train_dataparser_outputs,
                 dataset=self.train_dataset,
                 pixel_sampler=self.train_pixel_sampler,
+                shared_img_data=self.shared_img_data,
+                ring=self.data_ring,
             )
             for i in range(self.config.num_processes)
         ]
@@ -256,6 +416,25 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
             proc.start()
         print("Started threads")
 
+    def _setup_data_ring(self) -> Optional[SharedTensorRing]:
+        """Allocates the shared memory ring, using a batch sampled from the first training image as template."""
+        assert self.train_dataset is not None
+        if self.shared_img_data is not None:
+            img_data = {
+                key: value.tensor if isinstance(value, SharedTensor) else value
+                for key, value in self.shared_img_data.items()
+            }
+        else:
+            img_data = self.config.collate_fn([self.train_dataset[0]])
+        ray_bundle, batch = sample_ray_batch(
+            img_data, self.train_pixel_sampler, RayGenerator(self.train_dataset.cameras)
+        )
+        template = flatten_ray_batch(ray_bundle, batch)
+        if template is None:
+            CONSOLE.print("[bold yellow]Batches contain non-tensor data, falling back to the multiprocessing queue.")
+            return None
+        return SharedTensorRing(template, num_slots=max(self.config.queue_size, self.config.num_processes + 1))
+
     def setup_eval(self):
         """Sets up the data loader for evaluation."""
         assert self.eval_dataset is not None
@@ -288,10 +467,20 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
     def next_train(self, step: int) -> Tuple[RayBundle, Dict]:
         """Returns the next batch of data from the parallel training processes."""
         self.train_count += 1
+        if self.data_ring is not None:
+            flat_batch = self.data_ring.get(
+                self.device, exclude=[key for key in self.data_ring.specs if key.startswith("batch.")]
+            )
+            return unflatten_ray_batch(flat_batch)
         bundle, batch = self.data_queue.get()
         ray_bundle = bundle.to(self.device)
         return ray_bundle, batch
 
+    def update_train_losses(self, batch: Dict, model_outputs: Dict) -> None:
+        # The loss map is shared with the data processes, which pick up the new losses when they refresh.
+        if isinstance(self.train_pixel_sampler, ErrorDrivenPixelSampler):
+            self.train_pixel_sampler.update_from_outputs(batch, model_outputs)
+
     def next_eval(self, step: int) -> Tuple[RayBundle, Dict]:
         """Returns the next batch of data from the eval dataloader."""
         self.eval_count += 1
@@ -339,3 +528,5 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
             for proc in self.data_procs:
                 proc.terminate()
                 proc.join()
+        if getattr(self, "data_ring", None) is not None:
+            self.data_ring.close()
@@ -15,6 +15,7 @@
 
 from __future__ import annotations
 
+from copy import deepcopy
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Literal, Optional, Tuple, Type
@@ -33,6 +34,13 @@ from nerfstudio.data.utils.dataparsers_utils import (
     get_train_eval_split_fraction,
     get_train_eval_split_interval,
 )
+from nerfstudio.data.utils.dataset_archive import (
+    ARCHIVE_SUFFIX,
+    dataset_file_exists,
+    extract_dataset_file,
+    get_archive,
+    open_dataset_file,
+)
 from nerfstudio.utils.io import load_from_json
 from nerfstudio.utils.rich_utils import CONSOLE
 
@@ -46,7 +54,8 @@ class NerfstudioDataParserConfig(DataParserConfig):
     _target: Type = field(default_factory=lambda: Nerfstudio)
     """target class to instantiate"""
     data: Path = Path()
-    """Directory or explicit json file path specifying location of data."""
+    """Directory, explicit json file path or packed dataset (see `ns-process-data pack`) specifying location of
+    data."""
     scale_factor: float = 1.0
     """How much to scale the camera origins by."""
     downscale_factor: Optional[int] = None
@@ -92,6 +101,10 @@ class Nerfstudio(DataParser):
         if self.config.data.suffix == ".json":
             meta = load_from_json(self.config.data)
             data_dir = self.config.data.parent
+        elif self.config.data.suffix == ARCHIVE_SUFFIX:
+            # Files are read from the archive through virtual paths below the archive path.
+            meta = deepcopy(get_archive(self.config.data).transforms)
+            data_dir = self.config.data
         else:
             meta = load_from_json(self.config.data / "transforms.json")
             data_dir = self.config.data
@@ -432,7 +445,10 @@ class Nerfstudio(DataParser):
         """
         import open3d as o3d  # Importing open3d is slow, so we only do it if we need it.
 
-        pcd = o3d.io.read_point_cloud(str(ply_file_path))
+        local_ply_file_path = extract_dataset_file(ply_file_path)
+        pcd = o3d.io.read_point_cloud(str(local_ply_file_path))
+        if local_ply_file_path != ply_file_path:
+            local_ply_file_path.unlink()
 
         # if no points found don't read in an initial point cloud
         if len(pcd.points) == 0:
@@ -469,14 +485,14 @@ class Nerfstudio(DataParser):
 
         if self.downscale_factor is None:
             if self.config.downscale_factor is None:
-                test_img = Image.open(data_dir / filepath)
+                test_img = Image.open(open_dataset_file(data_dir / filepath))
                 h, w = test_img.size
                 max_res = max(h, w)
                 df = 0
                 while True:
                     if (max_res / 2 ** (df)) <= MAX_AUTO_RESOLUTION:
                         break
-                    if not (data_dir / f"{downsample_folder_prefix}{2**(df+1)}" / filepath.name).exists():
+                    if not dataset_file_exists(data_dir / f"{downsample_folder_prefix}{2**(df+1)}" / filepath.name):
                         break
                     df += 1
 
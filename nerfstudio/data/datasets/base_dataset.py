@@ -20,19 +20,27 @@ from __future__ import annotations
 
 from copy import deepcopy
 from pathlib import Path
-from typing import Dict, List, Literal
+from typing import Dict, List, Literal, Optional
 
 import numpy as np
 import numpy.typing as npt
 import torch
 from jaxtyping import Float, UInt8
-from PIL import Image
 from torch import Tensor
 from torch.utils.data import Dataset
 
 from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
 from nerfstudio.data.utils.data_utils import get_image_mask_tensor_from_path
+from nerfstudio.data.utils.image_cache import (
+    IMAGE_CACHE_VERSION,
+    ImageShard,
+    build_image_shard,
+    get_cache_key,
+    get_file_signature,
+)
+from nerfstudio.data.utils.image_decoders import ImageDecoder, PILImageDecoder
+from nerfstudio.utils.rich_utils import CONSOLE
 
 
 class InputDataset(Dataset):
@@ -45,6 +53,7 @@ class InputDataset(Dataset):
 
     exclude_batch_keys_from_device: List[str] = ["image", "mask"]
     cameras: Cameras
+    image_cache: Optional[ImageShard] = None
 
     def __init__(self, dataparser_outputs: DataparserOutputs, scale_factor: float = 1.0):
         super().__init__()
@@ -55,6 +64,7 @@ class InputDataset(Dataset):
         self.cameras = deepcopy(dataparser_outputs.cameras)
         self.cameras.rescale_output_resolution(scaling_factor=scale_factor)
         self.mask_color = dataparser_outputs.metadata.get("mask_color", None)
+        self.image_decoder: ImageDecoder = PILImageDecoder()
 
     def __len__(self):
         return len(self._dataparser_outputs.image_filenames)
@@ -65,13 +75,10 @@ class InputDataset(Dataset):
         Args:
             image_idx: The image index in the dataset.
         """
+        if self.image_cache is not None:
+            return self.image_cache.get(image_idx, "image")
         image_filename = self._dataparser_outputs.image_filenames[image_idx]
-        pil_image = Image.open(image_filename)
-        if self.scale_factor != 1.0:
-            width, height = pil_image.size
-            newsize = (int(width * self.scale_factor), int(height * self.scale_factor))
-            pil_image = pil_image.resize(newsize, resample=Image.Resampling.BILINEAR)
-        image = np.array(pil_image, dtype="uint8")  # shape is (h, w) or (h, w, 3 or 4)
+        image = self.image_decoder.decode(image_filename, self.scale_factor)  # shape is (h, w) or (h, w, 3 or 4)
         if len(image.shape) == 2:
             image = image[:, :, None].repeat(3, axis=2)
         assert len(image.shape) == 3
@@ -126,15 +133,20 @@ class InputDataset(Dataset):
 
         data = {"image_idx": image_idx, "image": image}
         if self._dataparser_outputs.mask_filenames is not None:
-            mask_filepath = self._dataparser_outputs.mask_filenames[image_idx]
-            data["mask"] = get_image_mask_tensor_from_path(filepath=mask_filepath, scale_factor=self.scale_factor)
+            if self.image_cache is not None:
+                data["mask"] = torch.from_numpy(self.image_cache.get(image_idx, "mask"))
+            else:
+                mask_filepath = self._dataparser_outputs.mask_filenames[image_idx]
+                data["mask"] = get_image_mask_tensor_from_path(filepath=mask_filepath, scale_factor=self.scale_factor)
             assert (
                 data["mask"].shape[:2] == data["image"].shape[:2]
             ), f"Mask and image have different shapes. Got {data['mask'].shape[:2]} and {data['image'].shape[:2]}"
         if self.mask_color:
-            data["image"] = torch.where(
-                data["mask"] == 1.0, data["image"], torch.ones_like(data["image"]) * torch.tensor(self.mask_color)
-            )
+            mask_color = torch.tensor(self.mask_color)
+            if data["image"].dtype == torch.uint8:
+                # mask_color is in [0, 1], keep uint8 images uint8
+                mask_color = (mask_color * 255.0).round()
+            data["image"] = torch.where(data["mask"] == 1.0, data["image"], mask_color.to(data["image"].dtype))
         metadata = self.get_metadata(data)
         data.update(metadata)
         return data
@@ -148,6 +160,48 @@ class InputDataset(Dataset):
         del data
         return {}
 
+    def setup_image_cache(self, cache_dir: Path, max_workers: Optional[int] = None) -> None:
+        """Loads decoded images and masks from a memory-mapped shard in `cache_dir`, building it if needed.
+
+        The shard stores the images exactly as returned by `get_numpy_image`, i.e. rescaled RGB or RGBA images, together
+        with the rescaled masks. Compositing over `alpha_color` is left to the getters, so the dataset returns the same
+        images with and without the cache. The shard is keyed by the image and mask files (including their size and
+        modification time), the scale factor and the image decoder, so any change to the inputs results in a new
+        shard.
+
+        Args:
+            cache_dir: Directory where shards are stored.
+            max_workers: Number of decoding threads used when building the shard.
+        """
+        outputs = self._dataparser_outputs
+        if len(self) == 0:
+            return
+        key = get_cache_key(
+            [
+                IMAGE_CACHE_VERSION,
+                [get_file_signature(filepath) for filepath in outputs.image_filenames],
+                [get_file_signature(filepath) for filepath in outputs.mask_filenames or []],
+                self.scale_factor,
+                [self.image_decoder.name, self.image_decoder.reduced_decoding],
+            ]
+        )
+        path = Path(cache_dir) / f"images_{key}.shard"
+        if path.exists():
+            CONSOLE.log(f"Loading decoded images from {path}")
+            self.image_cache = ImageShard(path)
+            return
+
+        def get_record(image_idx: int) -> Dict[str, npt.NDArray[np.uint8]]:
+            record = {"image": self.get_numpy_image(image_idx)}
+            if outputs.mask_filenames is not None:
+                mask = get_image_mask_tensor_from_path(outputs.mask_filenames[image_idx], self.scale_factor)
+                record["mask"] = mask.numpy()
+            return record
+
+        self.image_cache = build_image_shard(
+            path, len(self), get_record, max_workers=max_workers, description=f"Caching decoded images to {path}"
+        )
+
     def __getitem__(self, image_idx: int) -> Dict:
         data = self.get_data(image_idx)
         return data
@@ -18,15 +18,17 @@ Code for sampling pixels.
 
 import random
 import warnings
+import weakref
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Type, Union
+from typing import Dict, List, Optional, Type, Union
 
 import torch
-from jaxtyping import Int
+from jaxtyping import Float, Int
 from torch import Tensor
 
 from nerfstudio.configs.base_config import InstantiateConfig
 from nerfstudio.data.utils.pixel_sampling_utils import divide_rays_per_image, erode_mask
+from nerfstudio.data.utils.shared_memory import SharedTensor
 
 
 @dataclass
@@ -411,6 +413,431 @@ class PixelSampler:
         return pixel_batch
 
 
+@dataclass
+class PixelIndex:
+    """Flattened index of the pixels that can be sampled from an image batch.
+
+    The pixels of all images are laid out one after the other, row by row. Pixels of the same image row are
+    contiguous in the index, which lets us sample rows with a weight and then pixels uniformly within a row.
+    """
+
+    pixels: Dict[str, Tensor]
+    """Every per-pixel value of the batch (image, mask, depth...), flattened to (num_pixels, channels)."""
+    image_offsets: Int[Tensor, "num_images"]
+    """Flat position of the first pixel of each image."""
+    image_heights: Int[Tensor, "num_images"]
+    """Height of each image."""
+    image_widths: Int[Tensor, "num_images"]
+    """Width of each image."""
+    image_idx: Int[Tensor, "num_images"]
+    """Camera index of each image."""
+    valid_pixels: Optional[Tensor]
+    """Flat positions of the pixels that can be sampled, or None if every pixel can be sampled."""
+    num_valid_pixels: int
+    """Number of pixels that can be sampled."""
+    row_cdf: Optional[Tensor] = None
+    """Cumulative sampling weight of each image row, if rows are not sampled uniformly."""
+    row_offsets: Optional[Tensor] = None
+    """Position in `valid_pixels` of the first valid pixel of each image row."""
+    row_counts: Optional[Tensor] = None
+    """Number of valid pixels in each image row."""
+
+
+@dataclass
+class IndexedPixelSamplerConfig(PixelSamplerConfig):
+    """Config dataclass for IndexedPixelSampler."""
+
+    _target: Type = field(default_factory=lambda: IndexedPixelSampler)
+    """Target class to instantiate."""
+
+
+class IndexedPixelSampler(PixelSampler):
+    """Samples 'pixel_batch's from 'image_batch's using a precomputed index of the valid pixels.
+
+    The first time an image batch is seen, the pixels allowed by the masks (and by the fisheye crop radius) are
+    gathered into a flat index on the device of the images. Every step then draws the requested number of rays
+    with a single random draw and gather, without rejection sampling, python loops over the images or host/device
+    synchronization. Equirectangular images are sampled uniformly on the sphere, also within masks.
+
+    Rays are drawn uniformly over all valid pixels of the batch, so images with different resolutions receive a
+    number of rays proportional to their number of valid pixels.
+
+    Args:
+        config: the IndexedPixelSamplerConfig used to instantiate class
+    """
+
+    config: IndexedPixelSamplerConfig
+
+    def __init__(self, config: IndexedPixelSamplerConfig, **kwargs) -> None:
+        super().__init__(config, **kwargs)
+        self._pixel_index: Optional[PixelIndex] = None
+        self._pixel_index_source: Optional[weakref.ref] = None
+
+    def __getstate__(self):
+        # The index is rebuilt from the image batch, never send it to other processes.
+        state = self.__dict__.copy()
+        state["_pixel_index"] = None
+        state["_pixel_index_source"] = None
+        return state
+
+    def build_pixel_index(self, image_batch: Dict) -> PixelIndex:
+        """Flattens an image batch and computes the index of the pixels that can be sampled.
+
+        Args:
+            image_batch: batch of images to sample from, either a stacked tensor or a list of images
+        """
+        images = image_batch["image"]
+        if isinstance(images, Tensor):
+            images = list(images.unbind(0))
+        device = images[0].device
+        heights = [image.shape[0] for image in images]
+        widths = [image.shape[1] for image in images]
+        num_image_pixels = torch.tensor([h * w for h, w in zip(heights, widths)], device=device)
+        image_offsets = torch.cumsum(num_image_pixels, dim=0) - num_image_pixels
+
+        pixels = {}
+        for key, value in image_batch.items():
+            if key == "image_idx" or value is None:
+                continue
+            if isinstance(value, Tensor):
+                pixels[key] = value.reshape(-1, *value.shape[3:])
+            else:
+                pixels[key] = torch.cat([v.reshape(-1, *v.shape[2:]) for v in value], dim=0)
+
+        valid_masks: List[Tensor] = []
+        for i, (height, width) in enumerate(zip(heights, widths)):
+            valid = torch.ones((height, width), dtype=torch.bool, device=device)
+            if "mask" in image_batch and not self.config.ignore_mask:
+                valid &= image_batch["mask"][i][..., 0].bool().to(device)
+            if self.config.fisheye_crop_radius is not None:
+                y = torch.arange(height, device=device).view(-1, 1) + 0.5 - height // 2
+                x = torch.arange(width, device=device).view(1, -1) + 0.5 - width // 2
+                valid &= x**2 + y**2 <= self.config.fisheye_crop_radius**2
+            valid_masks.append(valid)
+
+        all_valid = all(bool(valid.all()) for valid in valid_masks)
+        valid_pixels = None
+        if not all_valid:
+            valid_pixels = torch.cat([valid.flatten() for valid in valid_masks]).nonzero().squeeze(-1)
+        num_valid_pixels = int(sum(int(valid.sum()) for valid in valid_masks))
+        if num_valid_pixels == 0:
+            raise ValueError("No pixels to sample from, the masks are empty.")
+
+        pixel_index = PixelIndex(
+            pixels=pixels,
+            image_offsets=image_offsets,
+            image_heights=torch.tensor(heights, device=device),
+            image_widths=torch.tensor(widths, device=device),
+            image_idx=image_batch["image_idx"].to(device),
+            valid_pixels=valid_pixels,
+            num_valid_pixels=num_valid_pixels,
+        )
+
+        if self.config.is_equirectangular:
+            # Rows are weighted by sin(phi) so that samples are uniform on the sphere, pixels within a row uniformly.
+            row_counts = torch.cat([valid.sum(dim=1) for valid in valid_masks])
+            row_weights = torch.cat([torch.sin(torch.pi * (torch.arange(h, device=device) + 0.5) / h) for h in heights])
+            pixel_index.row_counts = row_counts
+            pixel_index.row_offsets = torch.cumsum(row_counts, dim=0) - row_counts
+            pixel_index.row_cdf = torch.cumsum(row_counts * row_weights, dim=0)
+
+        return pixel_index
+
+    def sample_pixel_positions(self, pixel_index: PixelIndex, num_rays: int) -> Int[Tensor, "num_rays"]:
+        """Draws flat positions of valid pixels.
+
+        Args:
+            pixel_index: index of the valid pixels
+            num_rays: number of pixels to draw
+        """
+        device = pixel_index.image_offsets.device
+        if pixel_index.row_cdf is None:
+            positions = torch.randint(0, pixel_index.num_valid_pixels, (num_rays,), device=device)
+        else:
+            assert pixel_index.row_offsets is not None and pixel_index.row_counts is not None
+            row_cdf = pixel_index.row_cdf
+            rows = torch.searchsorted(row_cdf, torch.rand(num_rays, device=device) * row_cdf[-1], right=True)
+            rows = rows.clamp_(max=len(row_cdf) - 1)
+            counts = pixel_index.row_counts[rows]
+            offsets = (torch.rand(num_rays, device=device) * counts).long().clamp_(max=counts - 1)
+            positions = pixel_index.row_offsets[rows] + offsets
+        if pixel_index.valid_pixels is not None:
+            positions = pixel_index.valid_pixels[positions]
+        return positions
+
+    def sample(self, image_batch: Dict):
+        """Sample an image batch and return a pixel batch.
+
+        Args:
+            image_batch: batch of images to sample from
+        """
+        # The index is rebuilt whenever the datamanager hands us a new image batch.
+        if (
+            self._pixel_index is None
+            or self._pixel_index_source is None
+            or (self._pixel_index_source() is not image_batch["image_idx"])
+        ):
+            self._pixel_index = self.build_pixel_index(image_batch)
+            self._pixel_index_source = weakref.ref(image_batch["image_idx"])
+        pixel_index = self._pixel_index
+
+        positions = self.sample_pixel_positions(pixel_index, self.num_rays_per_batch)
+        c = torch.searchsorted(pixel_index.image_offsets, positions, right=True) - 1
+        local_positions = positions - pixel_index.image_offsets[c]
+        widths = pixel_index.image_widths[c]
+        indices = torch.stack([pixel_index.image_idx[c], local_positions // widths, local_positions % widths], dim=-1)
+
+        # Per-pixel tensors stay on their own device, e.g. masks on the CPU when the images are on the GPU.
+        positions_on_device = {positions.device: positions}
+        collated_batch = {}
+        for key, value in pixel_index.pixels.items():
+            if value.device not in positions_on_device:
+                positions_on_device[value.device] = positions.to(value.device)
+            collated_batch[key] = value[positions_on_device[value.device]]
+        collated_batch["indices"] = indices  # with the abs camera indices
+        if self.config.keep_full_image:
+            collated_batch["full_image"] = image_batch["image"]
+        return collated_batch
+
+
+@dataclass
+class ErrorDrivenPixelSamplerConfig(IndexedPixelSamplerConfig):
+    """Config dataclass for ErrorDrivenPixelSampler."""
+
+    _target: Type = field(default_factory=lambda: ErrorDrivenPixelSampler)
+    """Target class to instantiate."""
+    loss_map_resolution: int = 32
+    """Number of loss map cells along each side of an image."""
+    loss_map_momentum: float = 0.9
+    """Weight of the previous value when updating a loss map cell with new losses."""
+    uniform_fraction: float = 0.25
+    """Fraction of the rays that are sampled uniformly, so that converged regions are still revisited."""
+    refresh_every: int = 100
+    """Number of steps between updates of the loss map and of the sampling distribution."""
+
+
+class ErrorDrivenPixelSampler(IndexedPixelSampler):
+    """Samples pixels in proportion to a running estimate of the training loss.
+
+    Each image is divided into a `loss_map_resolution` x `loss_map_resolution` grid of cells holding an exponential
+    moving average of the per-ray losses reported through `update_loss_map`. Rays are drawn by first picking a
+    cell from a CDF over the cells, mixing the loss-weighted distribution with the uniform one, and then a valid pixel
+    of that cell uniformly. Losses are accumulated on the training device and merged into the loss map every
+    `refresh_every` steps, at which point the CDF is rebuilt from the new loss map.
+
+    The loss map lives in shared memory, so samplers running in data loading processes follow the losses reported
+    by the main process. Sampled batches contain a "loss_map_cells" entry that must be passed back with the losses.
+
+    Args:
+        config: the ErrorDrivenPixelSamplerConfig used to instantiate class
+        num_images: number of images of the dataset. If not given, it is inferred from the first image batch.
+    """
+
+    config: ErrorDrivenPixelSamplerConfig
+
+    def __init__(self, config: ErrorDrivenPixelSamplerConfig, **kwargs) -> None:
+        super().__init__(config, **kwargs)
+        self.loss_map: Optional[SharedTensor] = None
+        if self.kwargs.get("num_images") is not None:
+            self._setup_loss_map(self.kwargs["num_images"])
+        # Per batch cell: global loss map cell, sampling weight without losses, and the pixels it contains.
+        self._cell_ids: Optional[Tensor] = None
+        self._cell_base_weights: Optional[Tensor] = None
+        self._cell_starts: Optional[Tensor] = None
+        self._cell_counts: Optional[Tensor] = None
+        self._cell_widths: Optional[Tensor] = None
+        self._cell_row_lengths: Optional[Tensor] = None
+        self._cell_cdf: Optional[Tensor] = None
+        self._last_cells: Optional[Tensor] = None
+        self._num_samples_since_refresh = 0
+        # Losses reported since the last refresh, per global loss map cell.
+        self._pending_loss_sums: Optional[Tensor] = None
+        self._pending_loss_counts: Optional[Tensor] = None
+        self._num_updates_since_flush = 0
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # The cells are rebuilt from the pixel index and pending losses are only flushed by the process reporting them.
+        for name in (
+            "_cell_ids",
+            "_cell_base_weights",
+            "_cell_starts",
+            "_cell_counts",
+            "_cell_widths",
+            "_cell_row_lengths",
+            "_cell_cdf",
+            "_last_cells",
+            "_num_samples_since_refresh",
+            "_pending_loss_sums",
+            "_pending_loss_counts",
+            "_num_updates_since_flush",
+        ):
+            # Counters restart from zero.
+            state[name] = 0 if name.startswith("_num_") else None
+        return state
+
+    def _setup_loss_map(self, num_images: int) -> None:
+        resolution = self.config.loss_map_resolution
+        self.loss_map = SharedTensor((num_images, resolution, resolution), torch.float32)
+        self.loss_map.tensor.fill_(1.0)
+
+    def build_pixel_index(self, image_batch: Dict) -> PixelIndex:
+        pixel_index = super().build_pixel_index(image_batch)
+        if self.loss_map is None:
+            self._setup_loss_map(int(image_batch["image_idx"].max()) + 1)
+        device = pixel_index.image_offsets.device
+        resolution = self.config.loss_map_resolution
+        num_cells = resolution * resolution
+        heights, widths = pixel_index.image_heights, pixel_index.image_widths
+        num_images = len(heights)
+
+        # Cell (cy, cx) of an image of height H and width W covers rows [ceil(cy * H / R), ceil((cy + 1) * H / R)).
+        cells = torch.arange(resolution, device=device)
+        y_starts = (cells.view(1, -1) * heights.view(-1, 1) + resolution - 1) // resolution
+        x_starts = (cells.view(1, -1) * widths.view(-1, 1) + resolution - 1) // resolution
+        y_counts = torch.diff(y_starts, dim=1, append=heights.view(-1, 1))
+        x_counts = torch.diff(x_starts, dim=1, append=widths.view(-1, 1))
+        cell_starts = (
+            pixel_index.image_offsets.view(-1, 1, 1)
+            + y_starts.view(num_images, resolution, 1) * widths.view(-1, 1, 1)
+            + x_starts.view(num_images, 1, resolution)
+        ).flatten()
+        cell_widths = widths.view(-1, 1, 1).expand(-1, resolution, resolution).flatten()
+        self._cell_ids = (
+            pixel_index.image_idx.view(-1, 1) * num_cells + torch.arange(num_cells, device=device)
+        ).flatten()
+
+        if pixel_index.valid_pixels is None:
+            # Every pixel is valid: a cell is a rectangle and its pixels are generated directly.
+            self._cell_starts = cell_starts
+            self._cell_counts = (
+                y_counts.view(num_images, resolution, 1) * x_counts.view(num_images, 1, resolution)
+            ).flatten()
+            self._cell_widths = cell_widths
+            self._cell_row_lengths = x_counts.view(num_images, 1, resolution).expand(-1, resolution, -1).flatten()
+            if self.config.is_equirectangular:
+                y_centers = y_starts + y_counts / 2
+                row_weights = torch.sin(torch.pi * y_centers / heights.view(-1, 1)).view(num_images, resolution, 1)
+                self._cell_base_weights = (
+                    self._cell_counts.view(num_images, resolution, resolution) * row_weights
+                ).flatten()
+            else:
+                self._cell_base_weights = self._cell_counts.float()
+        else:
+            # Sort the valid pixels by cell, so the valid pixels of a cell are contiguous.
+            positions = pixel_index.valid_pixels
+            c = torch.searchsorted(pixel_index.image_offsets, positions, right=True) - 1
+            local_positions = positions - pixel_index.image_offsets[c]
+            y = local_positions // widths[c]
+            x = local_positions % widths[c]
+            pixel_cells = c * num_cells + (y * resolution // heights[c]) * resolution + x * resolution // widths[c]
+            pixel_cells, order = torch.sort(pixel_cells, stable=True)
+            pixel_index.valid_pixels = positions[order]
+            counts = torch.bincount(pixel_cells, minlength=num_images * num_cells)
+            self._cell_starts = torch.cumsum(counts, dim=0) - counts
+            self._cell_counts = counts
+            self._cell_widths = None
+            self._cell_row_lengths = None
+            if self.config.is_equirectangular:
+                pixel_weights = torch.sin(torch.pi * (y[order] + 0.5) / heights[c[order]])
+                self._cell_base_weights = torch.zeros(len(counts), device=device).index_add_(
+                    0, pixel_cells, pixel_weights
+                )
+            else:
+                self._cell_base_weights = counts.float()
+        self._cell_cdf = None
+        return pixel_index
+
+    def refresh_cell_cdf(self) -> None:
+        """Rebuilds the sampling distribution over the cells from the current loss map."""
+        assert self.loss_map is not None and self._cell_ids is not None and self._cell_base_weights is not None
+        base_weights = self._cell_base_weights
+        losses = self.loss_map.tensor.view(-1)[self._cell_ids.cpu()].to(base_weights.device)
+        loss_weights = base_weights * losses
+        uniform = base_weights / base_weights.sum()
+        weights = self.config.uniform_fraction * uniform + (1 - self.config.uniform_fraction) * loss_weights / (
+            loss_weights.sum().clamp_min(torch.finfo(torch.float32).tiny)
+        )
+        # Cells without valid pixels must never be selected.
+        weights = torch.where(self._cell_counts > 0, weights, torch.zeros_like(weights))
+        self._cell_cdf = torch.cumsum(weights, dim=0)
+        self._num_samples_since_refresh = 0
+
+    def sample_pixel_positions(self, pixel_index: PixelIndex, num_rays: int) -> Int[Tensor, "num_rays"]:
+        if self._cell_cdf is None or self._num_samples_since_refresh >= self.config.refresh_every:
+            self.refresh_cell_cdf()
+        assert self._cell_cdf is not None and self._cell_counts is not None and self._cell_starts is not None
+        self._num_samples_since_refresh += 1
+        device = self._cell_cdf.device
+        cdf = self._cell_cdf
+        cells = torch.searchsorted(cdf, torch.rand(num_rays, device=device) * cdf[-1], right=True)
+        cells = cells.clamp_(max=len(cdf) - 1)
+        counts = self._cell_counts[cells]
+        offsets = (torch.rand(num_rays, device=device) * counts).long().clamp_(max=counts - 1)
+        if self._cell_widths is None:
+            assert pixel_index.valid_pixels is not None
+            positions = pixel_index.valid_pixels[self._cell_starts[cells] + offsets]
+        else:
+            # Pixels of a rectangular cell, row by row.
+            assert self._cell_row_lengths is not None
+            row_lengths = self._cell_row_lengths[cells]
+            positions = self._cell_starts[cells] + (offsets // row_lengths) * self._cell_widths[cells]
+            positions += offsets % row_lengths
+        self._last_cells = self._cell_ids[cells]
+        return positions
+
+    def sample(self, image_batch: Dict):
+        collated_batch = super().sample(image_batch)
+        collated_batch["loss_map_cells"] = self._last_cells
+        return collated_batch
+
+    def update_loss_map(self, loss_map_cells: Int[Tensor, "num_rays"], losses: Float[Tensor, "num_rays"]) -> None:
+        """Reports the training losses of the rays of a batch.
+
+        Args:
+            loss_map_cells: the "loss_map_cells" entry of the batch the losses were computed on
+            losses: per-ray training losses
+        """
+        assert self.loss_map is not None, "The loss map is allocated on the first call to sample"
+        losses = losses.detach().float()
+        if self._pending_loss_sums is None or self._pending_loss_counts is None:
+            self._pending_loss_sums = torch.zeros(self.loss_map.tensor.numel(), device=losses.device)
+            self._pending_loss_counts = torch.zeros(self.loss_map.tensor.numel(), device=losses.device)
+        loss_map_cells = loss_map_cells.to(losses.device)
+        self._pending_loss_sums.index_add_(0, loss_map_cells, losses)
+        self._pending_loss_counts.index_add_(0, loss_map_cells, torch.ones_like(losses))
+        self._num_updates_since_flush += 1
+        if self._num_updates_since_flush >= self.config.refresh_every:
+            self.flush_loss_map()
+
+    def update_from_outputs(self, batch: Dict, model_outputs: Dict) -> None:
+        """Reports the squared color errors of a training batch.
+
+        Args:
+            batch: batch returned by `sample`
+            model_outputs: outputs of the model for the batch
+        """
+        if "loss_map_cells" not in batch or "rgb" not in model_outputs:
+            return
+        pred_rgb = model_outputs["rgb"].detach()
+        gt_rgb = batch["image"][..., :3].to(pred_rgb)
+        self.update_loss_map(batch["loss_map_cells"], ((pred_rgb - gt_rgb) ** 2).mean(dim=-1))
+
+    def flush_loss_map(self) -> None:
+        """Merges the losses reported since the last flush into the shared loss map."""
+        if self.loss_map is None or self._pending_loss_sums is None or self._pending_loss_counts is None:
+            return
+        counts = self._pending_loss_counts.cpu()
+        touched = counts > 0
+        mean_losses = self._pending_loss_sums.cpu()[touched] / counts[touched]
+        loss_map = self.loss_map.tensor.view(-1)
+        momentum = self.config.loss_map_momentum
+        loss_map[touched] = momentum * loss_map[touched] + (1 - momentum) * mean_losses
+        self._pending_loss_sums.zero_()
+        self._pending_loss_counts.zero_()
+        self._num_updates_since_flush = 0
+
+
 @dataclass
 class PatchPixelSamplerConfig(PixelSamplerConfig):
     """Config dataclass for PatchPixelSampler."""
@@ -22,12 +22,14 @@ import numpy as np
 import torch
 from PIL import Image
 
+from nerfstudio.data.utils.dataset_archive import open_dataset_file, read_dataset_file, split_archive_path
+
 
 def get_image_mask_tensor_from_path(filepath: Path, scale_factor: float = 1.0) -> torch.Tensor:
     """
     Utility function to read a mask image from the given path and return a boolean tensor
     """
-    pil_mask = Image.open(filepath)
+    pil_mask = Image.open(open_dataset_file(filepath))
     if scale_factor != 1.0:
         width, height = pil_mask.size
         newsize = (int(width * scale_factor), int(height * scale_factor))
@@ -78,10 +80,13 @@ def get_depth_image_from_path(
         Depth image torch tensor with shape [height, width, 1].
     """
     if filepath.suffix == ".npy":
-        image = np.load(filepath).astype(np.float32) * scale_factor
+        image = np.load(open_dataset_file(filepath)).astype(np.float32) * scale_factor
         image = cv2.resize(image, (width, height), interpolation=interpolation)
     else:
-        image = cv2.imread(str(filepath.absolute()), cv2.IMREAD_ANYDEPTH)
+        if split_archive_path(filepath) is None:
+            image = cv2.imread(str(filepath.absolute()), cv2.IMREAD_ANYDEPTH)
+        else:
+            image = cv2.imdecode(read_dataset_file(filepath), cv2.IMREAD_ANYDEPTH)
         image = image.astype(np.float32) * scale_factor
         image = cv2.resize(image, (width, height), interpolation=interpolation)
     return torch.from_numpy(image[:, :, np.newaxis])
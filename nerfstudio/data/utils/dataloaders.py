@@ -46,6 +46,8 @@ class CacheDataloader(DataLoader):
         num_times_to_repeat_images: How often to collate new images. -1 to never pick new images.
         device: Device to perform computation.
         collate_fn: The function we will use to collate our training data
+        prefetch_images: Whether to load the next image subset on a background thread while the current one is used,
+            so that picking new images does not stall training. Requires memory for two subsets.
     """
 
     def __init__(
@@ -56,6 +58,7 @@ class CacheDataloader(DataLoader):
         device: Union[torch.device, str] = "cpu",
         collate_fn: Callable[[Any], Any] = nerfstudio_collate,
         exclude_batch_keys_from_device: Optional[List[str]] = None,
+        prefetch_images: bool = False,
         **kwargs,
     ):
         if exclude_batch_keys_from_device is None:
@@ -74,6 +77,9 @@ class CacheDataloader(DataLoader):
 
         self.num_repeated = self.num_times_to_repeat_images  # starting value
         self.first_time = True
+        self.prefetch_images = prefetch_images and not self.cache_all_images and self.num_times_to_repeat_images != -1
+        self._prefetch_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._next_collated_batch: Optional[concurrent.futures.Future] = None
 
         self.cached_collated_batch = None
         if self.cache_all_images:
@@ -96,8 +102,12 @@ class CacheDataloader(DataLoader):
     def __getitem__(self, idx):
         return self.dataset.__getitem__(idx)
 
-    def _get_batch_list(self):
-        """Returns a list of batches from the dataset attribute."""
+    def _get_batch_list(self, show_progress: bool = True):
+        """Returns a list of batches from the dataset attribute.
+
+        Args:
+            show_progress: Whether to display a progress bar while loading.
+        """
 
         assert isinstance(self.dataset, Sized)
         indices = random.sample(range(len(self.dataset)), k=self.num_images_to_sample_from)
@@ -113,20 +123,41 @@ class CacheDataloader(DataLoader):
                 res = executor.submit(self.dataset.__getitem__, idx)
                 results.append(res)
 
-            for res in track(results, description="Loading data batch", transient=True):
+            if show_progress:
+                results = track(results, description="Loading data batch", transient=True)
+            for res in results:
                 batch_list.append(res.result())
 
         return batch_list
 
-    def _get_collated_batch(self):
-        """Returns a collated batch."""
-        batch_list = self._get_batch_list()
+    def _get_collated_batch(self, show_progress: bool = True):
+        """Returns a collated batch.
+
+        Args:
+            show_progress: Whether to display a progress bar while loading.
+        """
+        batch_list = self._get_batch_list(show_progress=show_progress)
         collated_batch = self.collate_fn(batch_list)
         collated_batch = get_dict_to_torch(
             collated_batch, device=self.device, exclude=self.exclude_batch_keys_from_device
         )
         return collated_batch
 
+    def _get_next_collated_batch(self):
+        """Returns the next image subset, using the prefetched subset if there is one, and starts prefetching the
+        subset after it."""
+        if not self.prefetch_images:
+            return self._get_collated_batch()
+        if self._prefetch_executor is None:
+            self._prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        if self._next_collated_batch is None:
+            collated_batch = self._get_collated_batch()
+        else:
+            # Blocks only if the subset is still being loaded.
+            collated_batch = self._next_collated_batch.result()
+        self._next_collated_batch = self._prefetch_executor.submit(self._get_collated_batch, show_progress=False)
+        return collated_batch
+
     def __iter__(self):
         while True:
             if self.cache_all_images:
@@ -136,7 +167,7 @@ class CacheDataloader(DataLoader):
             ):
                 # trigger a reset
                 self.num_repeated = 0
-                collated_batch = self._get_collated_batch()
+                collated_batch = self._get_next_collated_batch()
                 # possibly save a cached item
                 self.cached_collated_batch = collated_batch if self.num_times_to_repeat_images != 0 else None
                 self.first_time = False
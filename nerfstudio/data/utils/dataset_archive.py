@@ -0,0 +1,200 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Packed datasets: a nerfstudio dataset (transforms.json and every file it references) stored in a single file.
+
+The archive uses the shard layout of `image_cache`: the files are stored back to back as raw bytes (images keep
+their original encoding), followed by an index mapping each relative path to its record and the transforms
+metadata. Reading a file is a lookup in the index and a slice of the memory-mapped archive, so loading a dataset
+costs a single open instead of one open and stat per file, which matters on network filesystems.
+
+Files inside an archive are addressed with virtual paths, e.g. `scene.nspack/images/frame_00001.jpg`. The
+helpers below accept both regular and virtual paths, so loaders don't need to know whether data is packed.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from nerfstudio.data.utils.image_cache import ImageShard, build_image_shard
+from nerfstudio.utils.io import load_from_json
+
+ARCHIVE_SUFFIX = ".nspack"
+
+# Keys of transforms.json and of its frames that reference files.
+FILE_KEYS = ("file_path", "mask_path", "depth_file_path")
+META_FILE_KEYS = ("ply_file_path",)
+# Folders with downscaled copies of the referenced files, e.g. images_2/, that dataparsers may pick instead.
+DOWNSCALED_FOLDER_PREFIXES = ("images_", "masks_", "depths_")
+
+
+class DatasetArchive:
+    """Read-only view of a packed dataset.
+
+    Args:
+        path: Location of the archive.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.shard = ImageShard(self.path)
+        self.files: Dict[str, int] = self.shard.metadata["files"]
+        self.transforms: Dict[str, Any] = self.shard.metadata["transforms"]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.files
+
+    def read(self, name: str) -> np.ndarray:
+        """Returns a zero-copy uint8 view of the content of a file.
+
+        Args:
+            name: Path of the file relative to the dataset directory.
+        """
+        if name not in self.files:
+            raise FileNotFoundError(f"{name} is not in {self.path}")
+        return self.shard.get(self.files[name], "data")
+
+    def open(self, name: str) -> BinaryIO:
+        """Returns a binary file object with the content of a file.
+
+        Args:
+            name: Path of the file relative to the dataset directory.
+        """
+        return io.BytesIO(self.read(name).tobytes())
+
+
+_ARCHIVES: Dict[Path, DatasetArchive] = {}
+
+
+def get_archive(path: Path) -> DatasetArchive:
+    """Returns the archive at `path`, opening it once per process."""
+    path = Path(path)
+    if path not in _ARCHIVES:
+        _ARCHIVES[path] = DatasetArchive(path)
+    return _ARCHIVES[path]
+
+
+def split_archive_path(filepath: Path) -> Optional[Tuple[DatasetArchive, str]]:
+    """Returns the archive containing a virtual path and the path of the file inside of it, or None if `filepath`
+    is not inside an archive."""
+    filepath = Path(filepath)
+    for parent in filepath.parents:
+        if parent.suffix == ARCHIVE_SUFFIX and parent.is_file():
+            return get_archive(parent), filepath.relative_to(parent).as_posix()
+    return None
+
+
+def open_dataset_file(filepath: Path) -> Union[Path, BinaryIO]:
+    """Returns `filepath` for regular files and a file object for files inside an archive. The result can be passed
+    to anything that accepts either, like `PIL.Image.open` and `np.load`."""
+    archived = split_archive_path(filepath)
+    if archived is None:
+        return filepath
+    archive, name = archived
+    return archive.open(name)
+
+
+def read_dataset_file(filepath: Path) -> np.ndarray:
+    """Returns the content of a regular or archived file as a uint8 array."""
+    archived = split_archive_path(filepath)
+    if archived is None:
+        return np.fromfile(filepath, dtype=np.uint8)
+    archive, name = archived
+    return archive.read(name)
+
+
+def dataset_file_exists(filepath: Path) -> bool:
+    """Returns whether a regular or archived file exists."""
+    archived = split_archive_path(filepath)
+    if archived is None:
+        return Path(filepath).exists()
+    archive, name = archived
+    return name in archive
+
+
+def extract_dataset_file(filepath: Path) -> Path:
+    """Returns a regular path with the content of `filepath`, copying archived files to a temporary file. Used for
+    libraries that can only read from paths."""
+    archived = split_archive_path(filepath)
+    if archived is None:
+        return filepath
+    archive, name = archived
+    fd, tmp_path = tempfile.mkstemp(suffix=Path(name).suffix)
+    with os.fdopen(fd, "wb") as f:
+        f.write(archive.read(name).tobytes())
+    return Path(tmp_path)
+
+
+def get_referenced_files(data_dir: Path, transforms: Dict[str, Any]) -> List[str]:
+    """Returns the relative paths of every existing file referenced by a transforms.json, including downscaled
+    copies of images, masks and depths.
+
+    Args:
+        data_dir: Directory of the dataset.
+        transforms: Content of the transforms.json.
+    """
+    names = [transforms[key] for key in META_FILE_KEYS if key in transforms]
+    for frame in transforms["frames"]:
+        names.extend(frame[key] for key in FILE_KEYS if key in frame)
+    downscaled_dirs = [
+        child.name
+        for child in sorted(data_dir.iterdir())
+        if child.is_dir() and child.name.startswith(DOWNSCALED_FOLDER_PREFIXES)
+    ]
+    files = []
+    for name in names:
+        relative_path = Path(name)
+        files.append(relative_path.as_posix())
+        for downscaled_dir in downscaled_dirs:
+            files.append(f"{downscaled_dir}/{relative_path.name}")
+    # Keep the order stable and drop duplicates and missing downscaled copies.
+    return [name for name in dict.fromkeys(files) if (data_dir / name).is_file()]
+
+
+def pack_dataset(
+    data_dir: Path,
+    output_path: Path,
+    transforms_filename: str = "transforms.json",
+    max_workers: Optional[int] = None,
+) -> DatasetArchive:
+    """Packs a nerfstudio dataset into a single archive.
+
+    Args:
+        data_dir: Directory of the dataset.
+        output_path: Location of the archive.
+        transforms_filename: Name of the transforms file in `data_dir`.
+        max_workers: Number of threads reading files.
+    """
+    transforms = load_from_json(data_dir / transforms_filename)
+    names = get_referenced_files(data_dir, transforms)
+
+    def get_record(idx: int) -> Dict[str, np.ndarray]:
+        return {"data": np.fromfile(data_dir / names[idx], dtype=np.uint8)}
+
+    build_image_shard(
+        output_path,
+        num_records=len(names),
+        get_record=get_record,
+        metadata={"files": {name: idx for idx, name in enumerate(names)}, "transforms": transforms},
+        max_workers=max_workers,
+        description="Packing dataset",
+    )
+    return DatasetArchive(output_path)
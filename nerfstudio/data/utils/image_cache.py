@@ -0,0 +1,307 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Caches of decoded images: persistent memory-mapped shards and bounded in-memory working sets.
+
+A shard is a single file holding a sequence of records, each record being a dictionary of named numeric arrays
+(e.g. "image" and "mask"). The layout is::
+
+    MAGIC | array data ... | JSON footer | footer length (uint64) | MAGIC
+
+Arrays are appended while they are decoded and the index is written last, so building a shard never needs to
+hold more than one image in memory. Reading a shard maps the file once and returns zero-copy numpy views.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+from rich.progress import track
+
+SHARD_MAGIC = b"NSSHARD1"
+SHARD_ALIGNMENT = 64
+IMAGE_CACHE_VERSION = 2
+
+
+class ImageShardWriter:
+    """Writes records of numeric arrays to a shard file.
+
+    The shard is written to a temporary file and atomically moved into place on `close`, so an interrupted
+    build never leaves a truncated shard behind.
+
+    Args:
+        path: Final location of the shard.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = path.with_name(path.name + f".tmp{os.getpid()}")
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(SHARD_MAGIC)
+        self._offset = len(SHARD_MAGIC)
+        self._records: List[Dict[str, Dict[str, Any]]] = []
+
+    def append(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Appends one record to the shard.
+
+        Args:
+            arrays: Named arrays of the record. All arrays must be of a boolean or numeric dtype.
+        """
+        record = {}
+        for name, array in arrays.items():
+            assert array.dtype.kind in "biuf", f"Only numeric arrays can be cached, got {array.dtype}"
+            padding = -self._offset % SHARD_ALIGNMENT
+            self._file.write(b"\0" * padding)
+            self._offset += padding
+            data = np.ascontiguousarray(array).view(np.uint8)
+            self._file.write(data.tobytes())
+            record[name] = {"offset": self._offset, "shape": list(array.shape), "dtype": array.dtype.str}
+            self._offset += data.nbytes
+        self._records.append(record)
+
+    def close(self, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Writes the index and moves the shard into place.
+
+        Args:
+            metadata: Any json-serializable data that should be stored alongside the arrays.
+        """
+        footer = json.dumps({"records": self._records, "metadata": metadata or {}}).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(struct.pack("<Q", len(footer)))
+        self._file.write(SHARD_MAGIC)
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discards the partially written shard."""
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class ImageShard:
+    """Read-only view of a shard written by `ImageShardWriter`.
+
+    The file is memory-mapped lazily and the mapping is dropped when pickled, so a shard can be handed to data
+    loading processes cheaply; every process maps the same pages from the OS page cache.
+
+    Args:
+        path: Location of the shard.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            f.seek(-8 - len(SHARD_MAGIC), os.SEEK_END)
+            (footer_len,) = struct.unpack("<Q", f.read(8))
+            if f.read(len(SHARD_MAGIC)) != SHARD_MAGIC:
+                raise ValueError(f"{path} is not a valid image shard")
+            f.seek(-8 - len(SHARD_MAGIC) - footer_len, os.SEEK_END)
+            footer = json.loads(f.read(footer_len).decode("utf-8"))
+        self.records: List[Dict[str, Dict[str, Any]]] = footer["records"]
+        self.metadata: Dict[str, Any] = footer["metadata"]
+        self._memmap: Optional[np.memmap] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_memmap"] = None
+        return state
+
+    def has(self, idx: int, name: str) -> bool:
+        """Returns whether record `idx` contains an array called `name`."""
+        return name in self.records[idx]
+
+    def get(self, idx: int, name: str) -> np.ndarray:
+        """Returns a zero-copy view of the array `name` of record `idx`.
+
+        The view is copy-on-write: modifying it never changes the file on disk.
+        """
+        if self._memmap is None:
+            self._memmap = np.memmap(self.path, dtype=np.uint8, mode="c")
+        entry = self.records[idx][name]
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        return self._memmap[entry["offset"] : entry["offset"] + nbytes].view(dtype).reshape(shape)
+
+
+def get_cache_key(items: List[Any]) -> str:
+    """Returns a stable hash of json-serializable items, used to name cache files.
+
+    Args:
+        items: Everything the cached content depends on.
+    """
+    return hashlib.sha1(json.dumps(items, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def get_file_signature(filepath: Path) -> List[Any]:
+    """Returns the path, size and modification time of a file, so caches are invalidated when files change.
+    For files inside a packed dataset, the size and modification time are those of the archive."""
+    from nerfstudio.data.utils.dataset_archive import split_archive_path
+
+    archived = split_archive_path(filepath)
+    stat = os.stat(filepath if archived is None else archived[0].path)
+    return [str(filepath), stat.st_size, stat.st_mtime_ns]
+
+
+def build_image_shard(
+    path: Path,
+    num_records: int,
+    get_record: Callable[[int], Dict[str, np.ndarray]],
+    metadata: Optional[Union[Dict[str, Any], Callable[[], Dict[str, Any]]]] = None,
+    max_workers: Optional[int] = None,
+    description: str = "Caching decoded images",
+) -> ImageShard:
+    """Decodes all records with a thread pool and writes them to a shard.
+
+    Args:
+        path: Location of the shard.
+        num_records: Number of records to write.
+        get_record: Returns the named arrays for a record index.
+        metadata: Json-serializable data stored alongside the arrays, or a function returning it once all the records
+            are written, for metadata that is computed while decoding.
+        max_workers: Number of decoding threads. If None, uses the ThreadPoolExecutor default.
+        description: Progress bar description.
+    """
+    writer = ImageShardWriter(path)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for record in track(
+                executor.map(get_record, range(num_records)),
+                description=description,
+                transient=True,
+                total=num_records,
+            ):
+                writer.append(record)
+        writer.close(metadata=metadata() if callable(metadata) else metadata)
+    except BaseException:
+        writer.abort()
+        raise
+    return ImageShard(path)
+
+
+class LRUImageCache:
+    """A bounded, thread-safe working set of decoded images.
+
+    Behaves like the list of image data dictionaries returned by a fully cached dataset, but only keeps the
+    `max_resident_images` most recently used images in memory. Missing images are loaded on access, and `prefetch`
+    loads images in background threads so that they are already resident when they are needed.
+
+    Args:
+        load_fn: Loads the image data dictionary of an image index.
+        num_images: Number of images in the dataset.
+        max_resident_images: Maximum number of images kept in memory.
+        max_workers: Number of background loading threads. If None, uses the ThreadPoolExecutor default.
+    """
+
+    def __init__(
+        self,
+        load_fn: Callable[[int], Dict],
+        num_images: int,
+        max_resident_images: int,
+        max_workers: Optional[int] = None,
+    ):
+        assert max_resident_images > 0, "max_resident_images must be positive"
+        self.load_fn = load_fn
+        self.num_images = num_images
+        self.max_resident_images = max_resident_images
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._resident: OrderedDict[int, Dict] = OrderedDict()
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __len__(self) -> int:
+        return self.num_images
+
+    def __iter__(self) -> Iterator[Dict]:
+        for idx in range(self.num_images):
+            yield self[idx]
+
+    def __getitem__(self, idx: int) -> Dict:
+        if idx < 0 or idx >= self.num_images:
+            raise IndexError(f"Image index {idx} out of range for {self.num_images} images")
+        with self._lock:
+            if idx in self._resident:
+                self._resident.move_to_end(idx)
+                self.hits += 1
+                return self._resident[idx]
+            self.misses += 1
+            future = self._pending.get(idx)
+            if future is None:
+                future = self._submit(idx)
+        return future.result()
+
+    def prefetch(self, indices: Iterable[int]) -> None:
+        """Starts loading images in the background unless they are already resident or being loaded.
+
+        Args:
+            indices: Image indices that will be accessed soon.
+        """
+        with self._lock:
+            for idx in indices:
+                if idx in self._resident:
+                    # Keep images that are about to be used from being evicted.
+                    self._resident.move_to_end(idx)
+                elif idx not in self._pending:
+                    self._submit(idx)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Returns the hit/miss counters of the cache."""
+        with self._lock:
+            accesses = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / accesses if accesses > 0 else 0.0,
+                "evictions": self.evictions,
+                "resident": len(self._resident),
+            }
+
+    def _submit(self, idx: int) -> Future:
+        """Schedules loading image `idx`. Must be called with the lock held."""
+        future = self._executor.submit(self._load, idx)
+        self._pending[idx] = future
+        return future
+
+    def _load(self, idx: int) -> Dict:
+        try:
+            data = self.load_fn(idx)
+        except BaseException:
+            with self._lock:
+                self._pending.pop(idx, None)
+            raise
+        with self._lock:
+            self._pending.pop(idx, None)
+            self._resident[idx] = data
+            self._resident.move_to_end(idx)
+            while len(self._resident) > self.max_resident_images:
+                self._resident.popitem(last=False)
+                self.evictions += 1
+        return data
@@ -0,0 +1,223 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Image decoding backends used by datasets.
+
+Every decoder returns the image rescaled by `scale_factor` to (int(width * scale_factor), int(height * scale_factor)).
+When downscaling JPEGs, decoders can decode directly at a reduced size (JPEG supports 1/2, 1/4 and 1/8 scaling in
+the DCT domain, which skips most of the decoding work) before resizing to the exact target size.
+"""
+
+from __future__ import annotations
+
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Literal, Optional, Tuple, Type
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from PIL import Image
+
+from nerfstudio.data.utils.dataset_archive import open_dataset_file, read_dataset_file, split_archive_path
+
+try:
+    from turbojpeg import TJPF_RGB, TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+JPEG_SUFFIXES = (".jpg", ".jpeg", ".jpe")
+
+ImageDecoderName = Literal["pil", "opencv", "turbojpeg"]
+
+
+def get_target_size(width: int, height: int, scale_factor: float) -> Tuple[int, int]:
+    """Returns the (width, height) of an image rescaled by `scale_factor`."""
+    return int(width * scale_factor), int(height * scale_factor)
+
+
+def get_jpeg_reduction(scale_factor: float) -> int:
+    """Returns the largest JPEG DCT reduction (1, 2, 4 or 8) that still decodes at least the target resolution."""
+    for reduction in (8, 4, 2):
+        if reduction * scale_factor <= 1.0:
+            return reduction
+    return 1
+
+
+def get_jpeg_size(data: npt.NDArray[np.uint8]) -> Tuple[int, int]:
+    """Returns the (width, height) stored in the frame header of a JPEG file, ignoring its EXIF orientation."""
+    buffer = data.tobytes()
+    offset = 2
+    while offset + 9 <= len(buffer):
+        if buffer[offset] != 0xFF:
+            break
+        marker = buffer[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker.
+            offset += 1
+        elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            # Start of frame, laid out as length, precision, height and width.
+            height, width = struct.unpack(">HH", buffer[offset + 5 : offset + 9])
+            return width, height
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a payload.
+            offset += 2
+        else:
+            offset += 2 + struct.unpack(">H", buffer[offset + 2 : offset + 4])[0]
+    raise ValueError("Could not find the frame header of the JPEG file")
+
+
+class ImageDecoder(ABC):
+    """Decodes image files to uint8 arrays.
+
+    Args:
+        reduced_decoding: Whether to decode JPEGs at a reduced size when downscaling.
+    """
+
+    name: str = ""
+
+    def __init__(self, reduced_decoding: bool = False):
+        self.reduced_decoding = reduced_decoding
+
+    @abstractmethod
+    def decode(self, filepath: Path, scale_factor: float = 1.0) -> npt.NDArray[np.uint8]:
+        """Returns the image of shape (H, W) or (H, W, 3 or 4).
+
+        Args:
+            filepath: Path to the image file.
+            scale_factor: The scaling factor to apply to the image.
+        """
+
+    def use_reduced_decoding(self, filepath: Path, scale_factor: float) -> bool:
+        """Returns whether a file can be decoded at a reduced size."""
+        return self.reduced_decoding and scale_factor <= 0.5 and Path(filepath).suffix.lower() in JPEG_SUFFIXES
+
+
+class PILImageDecoder(ImageDecoder):
+    """Decodes images with Pillow. When downscaling JPEGs, uses Pillow's draft mode to decode at a reduced size."""
+
+    name = "pil"
+
+    def decode(self, filepath: Path, scale_factor: float = 1.0) -> npt.NDArray[np.uint8]:
+        pil_image = Image.open(open_dataset_file(filepath))
+        if scale_factor != 1.0:
+            newsize = get_target_size(*pil_image.size, scale_factor)
+            if self.use_reduced_decoding(filepath, scale_factor) and pil_image.format == "JPEG":
+                # Picks the largest DCT reduction for which the image is still at least `newsize`.
+                pil_image.draft(pil_image.mode, newsize)
+            pil_image = pil_image.resize(newsize, resample=Image.Resampling.BILINEAR)
+        return np.array(pil_image, dtype="uint8")
+
+
+class OpenCVImageDecoder(ImageDecoder):
+    """Decodes images with OpenCV. When downscaling JPEGs, uses the IMREAD_REDUCED flags."""
+
+    name = "opencv"
+
+    _REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+    def decode(self, filepath: Path, scale_factor: float = 1.0) -> npt.NDArray[np.uint8]:
+        if self.use_reduced_decoding(filepath, scale_factor):
+            # Reduced reads always return 3 channels; ignore the EXIF orientation like the other decoders.
+            flags = self._REDUCED_FLAGS[get_jpeg_reduction(scale_factor)] | cv2.IMREAD_IGNORE_ORIENTATION
+            data = read_dataset_file(filepath)
+            # The reduced image size is rounded, so compute the target size from the original size in the header.
+            size = get_jpeg_size(data)
+            image = cv2.imdecode(data, flags)
+        else:
+            if split_archive_path(filepath) is None:
+                image = cv2.imread(str(filepath), cv2.IMREAD_UNCHANGED)
+            else:
+                image = cv2.imdecode(read_dataset_file(filepath), cv2.IMREAD_UNCHANGED)
+            size = None if image is None else (image.shape[1], image.shape[0])
+        if image is None:
+            raise ValueError(f"Could not read image {filepath}")
+        if image.dtype != np.uint8:
+            return PILImageDecoder(self.reduced_decoding).decode(filepath, scale_factor)
+        if image.ndim == 3 and image.shape[2] == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        elif image.ndim == 3 and image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+        if scale_factor != 1.0:
+            assert size is not None
+            image = resize_image(image, get_target_size(*size, scale_factor))
+        return image
+
+
+class TurboJPEGImageDecoder(ImageDecoder):
+    """Decodes JPEGs with libjpeg-turbo through PyTurboJPEG, using its scaled decoding when downscaling. Other
+    formats are decoded with Pillow."""
+
+    name = "turbojpeg"
+
+    def __init__(self, reduced_decoding: bool = False):
+        super().__init__(reduced_decoding)
+        if TurboJPEG is None:
+            raise ImportError("The turbojpeg image decoder requires PyTurboJPEG: pip install PyTurboJPEG")
+        self._turbojpeg: Optional[TurboJPEG] = None
+
+    def __getstate__(self):
+        # The library handle can't be pickled, every process opens its own.
+        state = self.__dict__.copy()
+        state["_turbojpeg"] = None
+        return state
+
+    def decode(self, filepath: Path, scale_factor: float = 1.0) -> npt.NDArray[np.uint8]:
+        if Path(filepath).suffix.lower() not in JPEG_SUFFIXES:
+            return PILImageDecoder(self.reduced_decoding).decode(filepath, scale_factor)
+        if self._turbojpeg is None:
+            self._turbojpeg = TurboJPEG()
+        data = read_dataset_file(filepath).tobytes()
+        width, height, _, _ = self._turbojpeg.decode_header(data)
+        scaling_factor = None
+        if self.use_reduced_decoding(filepath, scale_factor):
+            reduction = get_jpeg_reduction(scale_factor)
+            if (1, reduction) in self._turbojpeg.scaling_factors:
+                scaling_factor = (1, reduction)
+        image = self._turbojpeg.decode(data, pixel_format=TJPF_RGB, scaling_factor=scaling_factor)
+        if scale_factor != 1.0:
+            image = resize_image(image, get_target_size(width, height, scale_factor))
+        return image
+
+
+def resize_image(image: npt.NDArray[np.uint8], size: Tuple[int, int]) -> npt.NDArray[np.uint8]:
+    """Resizes an image to (width, height), with area interpolation when shrinking to avoid aliasing."""
+    if (image.shape[1], image.shape[0]) == size:
+        return image
+    shrinking = size[0] < image.shape[1] or size[1] < image.shape[0]
+    resized = cv2.resize(image, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+    if image.ndim == 3 and resized.ndim == 2:
+        resized = resized[:, :, None]
+    return resized
+
+
+IMAGE_DECODERS: Dict[str, Type[ImageDecoder]] = {
+    "pil": PILImageDecoder,
+    "opencv": OpenCVImageDecoder,
+    "turbojpeg": TurboJPEGImageDecoder,
+}
+
+
+def get_image_decoder(name: ImageDecoderName = "pil", reduced_decoding: bool = False) -> ImageDecoder:
+    """Returns an image decoder by name.
+
+    Args:
+        name: One of "pil", "opencv" or "turbojpeg".
+        reduced_decoding: Whether to decode JPEGs at a reduced size when downscaling.
+    """
+    if name not in IMAGE_DECODERS:
+        raise ValueError(f"Unknown image decoder {name}, expected one of {list(IMAGE_DECODERS)}")
+    return IMAGE_DECODERS[name](reduced_decoding=reduced_decoding)
@@ -0,0 +1,245 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tensors and buffers that can be shared between data loading processes without copying or pickling.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import weakref
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from pathos.helpers import mp
+from torch import Tensor
+
+_TORCH_TO_NUMPY_DTYPE = {
+    torch.bool: np.bool_,
+    torch.uint8: np.uint8,
+    torch.int16: np.int16,
+    torch.int32: np.int32,
+    torch.int64: np.int64,
+    torch.float16: np.float16,
+    torch.float32: np.float32,
+    torch.float64: np.float64,
+}
+
+
+def get_shared_memory_dir() -> Path:
+    """Returns the directory used for shared tensors. Uses the RAM-backed /dev/shm when available."""
+    if os.path.isdir("/dev/shm"):
+        return Path("/dev/shm")
+    return Path(tempfile.gettempdir())
+
+
+class SharedTensor:
+    """A tensor backed by a memory-mapped file.
+
+    Unlike tensors shared through `torch.multiprocessing`, a `SharedTensor` only pickles its file name, shape and
+    dtype, so it can be sent to processes started by any multiprocessing library (we use pathos, which pickles with
+    dill). Each process maps the same file, so the data exists once in memory no matter how many processes use it.
+    The file is removed when the `SharedTensor` that created it is garbage collected.
+
+    Args:
+        shape: Shape of the tensor.
+        dtype: Data type of the tensor.
+        path: File backing the tensor. If None, a new file is created in the shared memory directory.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype: torch.dtype, path: Optional[Path] = None):
+        assert dtype in _TORCH_TO_NUMPY_DTYPE, f"Unsupported dtype {dtype}"
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self._tensor: Optional[torch.Tensor] = None
+        if path is None:
+            fd, filename = tempfile.mkstemp(prefix="nerfstudio_", suffix=".shm", dir=get_shared_memory_dir())
+            nbytes = int(np.prod(self.shape)) * np.dtype(_TORCH_TO_NUMPY_DTYPE[dtype]).itemsize
+            os.ftruncate(fd, max(nbytes, 1))
+            os.close(fd)
+            self.path = Path(filename)
+            weakref.finalize(self, _unlink, self.path)
+        else:
+            self.path = Path(path)
+
+    @classmethod
+    def from_tensor(cls, tensor: torch.Tensor) -> SharedTensor:
+        """Creates a shared copy of `tensor`."""
+        shared = cls(tuple(tensor.shape), tensor.dtype)
+        shared.tensor.copy_(tensor)
+        return shared
+
+    @property
+    def tensor(self) -> torch.Tensor:
+        """The shared tensor. The file is mapped on first access in every process."""
+        if self._tensor is None:
+            if int(np.prod(self.shape)) == 0:
+                self._tensor = torch.empty(self.shape, dtype=self.dtype)
+            else:
+                array = np.memmap(self.path, dtype=_TORCH_TO_NUMPY_DTYPE[self.dtype], mode="r+", shape=self.shape)
+                self._tensor = torch.from_numpy(array)
+        return self._tensor
+
+    def __reduce__(self):
+        return (SharedTensor, (self.shape, self.dtype, self.path))
+
+
+class SharedTensorRing:
+    """A fixed number of slots of preallocated shared tensors, used to pass batches between processes.
+
+    Producers block until a slot is free, copy their tensors into it and mark it as filled. The consumer blocks
+    until a slot is filled and reads it. Only slot indices travel through the underlying queues, so tensors are
+    never pickled and neither side ever busy-waits. When reading onto a CUDA device, the slots are page-locked
+    (pinned) in the consumer process so the host to device copy is asynchronous; the slot is handed back to the
+    producers once that copy has finished. The consumer calls `close` when it is done with the ring to unregister
+    the pinned slots.
+
+    All batches must have the same keys, shapes and dtypes as `template`.
+
+    Args:
+        template: Example batch used to allocate the slots.
+        num_slots: Number of slots in the ring.
+    """
+
+    def __init__(self, template: Dict[str, Tensor], num_slots: int):
+        assert num_slots > 0, "The ring needs at least one slot"
+        self.specs = {key: (tuple(value.shape), value.dtype) for key, value in template.items()}
+        self.slots: List[Dict[str, SharedTensor]] = [
+            {key: SharedTensor(shape, dtype) for key, (shape, dtype) in self.specs.items()} for _ in range(num_slots)
+        ]
+        self.free_slots = mp.Queue()  # type: ignore
+        self.filled_slots = mp.Queue()  # type: ignore
+        for idx in range(num_slots):
+            self.free_slots.put(idx)
+        # Consumer-side state, not shared with producers.
+        self._pinned: Dict[int, bool] = {}
+        self._in_flight: Optional[Tuple[int, torch.cuda.Event]] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pinned"] = {}
+        state["_in_flight"] = None
+        return state
+
+    def put(self, tensors: Dict[str, Tensor]) -> None:
+        """Copies a batch into the next free slot, blocking until one is available.
+
+        Args:
+            tensors: Batch with the same layout as the template.
+        """
+        assert tensors.keys() == self.specs.keys(), f"Expected keys {list(self.specs)}, got {list(tensors)}"
+        idx = self.free_slots.get()
+        slot = self.slots[idx]
+        for key, value in tensors.items():
+            assert (
+                value.shape == self.specs[key][0]
+            ), f"Shape of {key} changed from {self.specs[key][0]} to {value.shape}"
+            slot[key].tensor.copy_(value)
+        self.filled_slots.put(idx)
+
+    def get(
+        self, device: Union[torch.device, str] = "cpu", exclude: Optional[Iterable[str]] = None
+    ) -> Dict[str, Tensor]:
+        """Returns the next filled batch, blocking until one is available.
+
+        Args:
+            device: Device to move the batch to.
+            exclude: Keys that are returned on the cpu instead of `device`.
+        """
+        self._release_in_flight()
+        exclude = set(exclude or [])
+        idx = self.filled_slots.get()
+        slot = self.slots[idx]
+        device = torch.device(device)
+        non_blocking = device.type == "cuda" and self._pin_slot(idx)
+        tensors = {}
+        for key, value in slot.items():
+            if key in exclude or device.type == "cpu":
+                tensors[key] = value.tensor.clone()
+            else:
+                tensors[key] = value.tensor.to(device, non_blocking=non_blocking)
+        if non_blocking:
+            event = torch.cuda.Event()
+            event.record()
+            self._in_flight = (idx, event)
+        else:
+            self.free_slots.put(idx)
+        return tensors
+
+    def _release_in_flight(self) -> None:
+        """Hands the slot of the previous asynchronous copy back to the producers once the copy has finished."""
+        if self._in_flight is not None:
+            idx, event = self._in_flight
+            event.synchronize()
+            self.free_slots.put(idx)
+            self._in_flight = None
+
+    def _pin_slot(self, idx: int) -> bool:
+        """Page-locks the memory of a slot in this process. Returns False if pinning is not supported."""
+        if idx not in self._pinned:
+            registered = []
+            pinned = False
+            try:
+                cudart = torch.cuda.cudart()
+                for value in self.slots[idx].values():
+                    tensor = value.tensor
+                    nbytes = tensor.numel() * tensor.element_size()
+                    if nbytes == 0:
+                        continue
+                    if int(cudart.cudaHostRegister(tensor.data_ptr(), nbytes, 0)) != 0:
+                        # A failed call leaves the CUDA error set, and the next kernel launch check would report it.
+                        _clear_cuda_error(cudart)
+                        break
+                    registered.append(tensor)
+                else:
+                    pinned = True
+                if not pinned:
+                    for tensor in registered:
+                        cudart.cudaHostUnregister(tensor.data_ptr())
+            except (AttributeError, RuntimeError):
+                pinned = False
+            self._pinned[idx] = pinned
+        return self._pinned[idx]
+
+    def close(self) -> None:
+        """Waits for the last asynchronous copy and unregisters the slots that were page-locked in this process."""
+        self._release_in_flight()
+        pinned_slots = [idx for idx, pinned in self._pinned.items() if pinned]
+        self._pinned = {}
+        if not pinned_slots:
+            return
+        cudart = torch.cuda.cudart()
+        for idx in pinned_slots:
+            for value in self.slots[idx].values():
+                tensor = value.tensor
+                if tensor.numel() > 0 and int(cudart.cudaHostUnregister(tensor.data_ptr())) != 0:
+                    _clear_cuda_error(cudart)
+
+
+def _clear_cuda_error(cudart) -> None:
+    """Resets the last CUDA runtime error after a failed call whose error we handle ourselves."""
+    get_last_error = getattr(cudart, "cudaGetLastError", None)
+    if get_last_error is not None:
+        get_last_error()
+
+
+def _unlink(path: Path) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -25,6 +25,7 @@ import torch
 import torch.nn.functional as F
 from jaxtyping import Float, Int, Shaped
 from torch import Tensor, nn
+from torch.autograd.function import once_differentiable
 
 from nerfstudio.field_components.base_field_component import FieldComponent
 from nerfstudio.utils.external import TCNN_EXISTS, tcnn
@@ -460,10 +461,106 @@ class HashEncoding(Encoding):
 
         return torch.flatten(encoded_value, start_dim=-2, end_dim=-1)  # [..., num_levels * features_per_level]
 
+    def fused_fwd(self, in_tensor: Float[Tensor, "*bs input_dim"]) -> Float[Tensor, "*bs output_dim"]:
+        """Forward pass using pytorch, with the same outputs as `pytorch_fwd`. Hashes the 8 corners of every level at
+        once, gathers their features in a single lookup and scatters the gradients straight into the hash table."""
+
+        assert in_tensor.shape[-1] == 3
+        encoded_value = _FusedHashEncodingFunction.apply(
+            in_tensor.reshape(-1, 3),
+            self.hash_table,
+            self.scalings.to(in_tensor.device),
+            self.hash_offset.to(in_tensor.device),
+            self.hash_table_size,
+        )
+        return encoded_value.view(*in_tensor.shape[:-1], self.get_out_dim())
+
     def forward(self, in_tensor: Float[Tensor, "*bs input_dim"]) -> Float[Tensor, "*bs output_dim"]:
         if self.tcnn_encoding is not None:
             return self.tcnn_encoding(in_tensor)
-        return self.pytorch_fwd(in_tensor)
+        return self.fused_fwd(in_tensor)
+
+
+# Primes of the spatial hash of Instant-NGP, as wrapped int32 values: hashes are reduced modulo a power of two, so
+# only the low bits of the products matter and they are the same in 32 bit arithmetic.
+HASH_PRIMES_INT32 = (1, 2654435761 - 2**32, 805459861)
+
+
+class _FusedHashEncodingFunction(torch.autograd.Function):
+    """Multi-resolution hash encoding, with a backward pass that scatters gradients straight into the hash table.
+
+    The 8 corners of a cell are laid out as a (2, 2, 2) grid of (floor, ceil) coordinates along x, y and z, so their
+    hashes and trilinear weights are broadcast products of per axis terms instead of 8 separate computations.
+    """
+
+    @staticmethod
+    def forward(
+        ctx,
+        in_tensor: Float[Tensor, "num_points 3"],
+        hash_table: Float[Tensor, "table_size features_per_level"],
+        scalings: Float[Tensor, "num_levels"],
+        hash_offset: Int[Tensor, "num_levels"],
+        hash_table_size: int,
+    ) -> Float[Tensor, "num_points output_dim"]:
+        index_dtype = torch.int32 if hash_table.shape[0] < 2**31 else torch.int64
+        scaled = in_tensor[:, None, :] * scalings[:, None]  # [N, L, 3]
+        scaled_f = torch.floor(scaled)
+        offset = scaled - scaled_f
+        scaled_f = scaled_f.to(index_dtype)
+        primes = torch.tensor(HASH_PRIMES_INT32, dtype=index_dtype, device=in_tensor.device)
+        # Hash terms and weights of the floored and ceiled coordinates along each axis, [N, L, 3, 2].
+        terms = torch.stack([scaled_f * primes, (scaled_f + (offset > 0)) * primes], dim=-1)
+        axis_weights = torch.stack([1 - offset, offset], dim=-1)
+        terms_x, terms_y, terms_z = terms.unbind(dim=-2)
+        hashed = terms_x[..., :, None, None] ^ terms_y[..., None, :, None] ^ terms_z[..., None, None, :]
+        hashed = (hashed & (hash_table_size - 1)) + hash_offset.to(index_dtype)[:, None, None, None]
+        hashed = hashed.view(*hashed.shape[:2], 8)  # [N, L, 8]
+        weights = _corner_weights(axis_weights)
+        features = hash_table.index_select(0, hashed.view(-1)).view(*hashed.shape, -1)  # [N, L, 8, F]
+        encoded_value = torch.matmul(weights[..., None, :], features)  # [N, L, 1, F]
+
+        ctx.save_for_backward(hashed, axis_weights, scalings, hash_table)
+        return encoded_value.view(in_tensor.shape[0], -1)
+
+    @staticmethod
+    @once_differentiable
+    def backward(ctx, grad_output: Float[Tensor, "num_points output_dim"]):
+        hashed, axis_weights, scalings, hash_table = ctx.saved_tensors
+        num_points, num_levels, _ = hashed.shape
+        grad_output = grad_output.reshape(num_points, num_levels, 1, -1)  # [N, L, 1, F]
+
+        grad_in_tensor = grad_hash_table = None
+        if ctx.needs_input_grad[1]:
+            weights = _corner_weights(axis_weights)
+            grad_hash_table = torch.zeros_like(hash_table)
+            grad_features = (weights[..., None] * grad_output).view(-1, hash_table.shape[-1])
+            # index_add_ is an order of magnitude slower with int32 indices on the CPU.
+            grad_hash_table.index_add_(0, hashed.view(-1).long(), grad_features)
+        if ctx.needs_input_grad[0]:
+            features = hash_table.index_select(0, hashed.view(-1)).view(*hashed.shape, -1)
+            corner_grads = (features * grad_output).sum(dim=-1).view(num_points, num_levels, 2, 2, 2)
+            weights_x, weights_y, weights_z = axis_weights.unbind(dim=-2)
+            # The weights of the floored and ceiled corners along an axis are 1 - offset and offset.
+            grad_x = corner_grads[:, :, 1] - corner_grads[:, :, 0]
+            grad_y = corner_grads[:, :, :, 1] - corner_grads[:, :, :, 0]
+            grad_z = corner_grads[..., 1] - corner_grads[..., 0]
+            grad_offset = torch.stack(
+                [
+                    (grad_x * weights_y[..., :, None] * weights_z[..., None, :]).sum(dim=(-2, -1)),
+                    (grad_y * weights_x[..., :, None] * weights_z[..., None, :]).sum(dim=(-2, -1)),
+                    (grad_z * weights_x[..., :, None] * weights_y[..., None, :]).sum(dim=(-2, -1)),
+                ],
+                dim=-1,
+            )  # [N, L, 3]
+            grad_in_tensor = (grad_offset * scalings[:, None]).sum(dim=1)
+        return grad_in_tensor, grad_hash_table, None, None, None
+
+
+def _corner_weights(axis_weights: Float[Tensor, "*bs 3 2"]) -> Float[Tensor, "*bs 8"]:
+    """Returns the trilinear weights of the 8 corners of a cell from the weights along each axis."""
+    weights_x, weights_y, weights_z = axis_weights.unbind(dim=-2)
+    weights = (weights_x[..., :, None] * weights_y[..., None, :])[..., None] * weights_z[..., None, None, :]
+    return weights.view(*axis_weights.shape[:-2], 8)
 
 
 class TensorCPEncoding(Encoding):
@@ -27,6 +27,7 @@ from torch import Tensor, nn
 from nerfstudio.cameras.rays import Frustums, RaySamples
 from nerfstudio.configs.base_config import InstantiateConfig
 from nerfstudio.field_components.field_heads import FieldHeadNames
+from nerfstudio.utils.cancellation import check_cancelled
 
 
 @dataclass
@@ -122,6 +123,8 @@ class Field(nn.Module):
                 density, density_embedding = self.get_density(ray_samples)
         else:
             density, density_embedding = self.get_density(ray_samples)
+        # Stop a cancelled render between the density and color heads, which cost about the same.
+        check_cancelled()
 
         field_outputs = self.get_outputs(ray_samples, density_embedding=density_embedding)
         field_outputs[FieldHeadNames.DENSITY] = density  # type: ignore
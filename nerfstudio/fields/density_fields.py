@@ -19,6 +19,7 @@ Proposal network field.
 from typing import Literal, Optional, Tuple
 
 import torch
+from jaxtyping import Float, Shaped
 from torch import Tensor, nn
 
 from nerfstudio.cameras.rays import RaySamples
@@ -91,30 +92,40 @@ class HashMLPDensityField(Field):
         else:
             self.linear = torch.nn.Linear(self.encoding.get_out_dim(), 1)
 
+    def density_fn(
+        self, positions: Shaped[Tensor, "*bs 3"], times: Optional[Shaped[Tensor, "*bs 1"]] = None
+    ) -> Shaped[Tensor, "*bs 1"]:
+        """Returns only the density, from the positions directly instead of samples around them."""
+        del times
+        return self.get_density_from_positions(positions)
+
     def get_density(self, ray_samples: RaySamples) -> Tuple[Tensor, None]:
+        return self.get_density_from_positions(ray_samples.frustums.get_positions()), None
+
+    def get_density_from_positions(self, positions: Float[Tensor, "*bs 3"]) -> Float[Tensor, "*bs 1"]:
+        """Computes and returns the densities at positions."""
+        batch_shape = positions.shape[:-1]
         if self.spatial_distortion is not None:
-            positions = self.spatial_distortion(ray_samples.frustums.get_positions())
+            positions = self.spatial_distortion(positions)
             positions = (positions + 2.0) / 4.0
         else:
-            positions = SceneBox.get_normalized_positions(ray_samples.frustums.get_positions(), self.aabb)
+            positions = SceneBox.get_normalized_positions(positions, self.aabb)
         # Make sure the tcnn gets inputs between 0 and 1.
         selector = ((positions > 0.0) & (positions < 1.0)).all(dim=-1)
         positions = positions * selector[..., None]
         positions_flat = positions.view(-1, 3)
         if not self.use_linear:
-            density_before_activation = (
-                self.mlp_base(positions_flat).view(*ray_samples.frustums.shape, -1).to(positions)
-            )
+            density_before_activation = self.mlp_base(positions_flat).view(*batch_shape, -1).to(positions)
         else:
             x = self.encoding(positions_flat).to(positions)
-            density_before_activation = self.linear(x).view(*ray_samples.frustums.shape, -1)
+            density_before_activation = self.linear(x).view(*batch_shape, -1)
 
         # Rectifying the density with an exponential is much more stable than a ReLU or
         # softplus, because it enables high post-activation (float32) density outputs
         # from smaller internal (float16) parameters.
         density = self.average_init_density * trunc_exp(density_before_activation)
         density = density * selector[..., None]
-        return density, None
+        return density
 
     def get_outputs(self, ray_samples: RaySamples, density_embedding: Optional[Tensor] = None) -> dict:
         return {}
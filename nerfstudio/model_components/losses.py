@@ -23,7 +23,7 @@ import torch
 from jaxtyping import Bool, Float
 from torch import Tensor, nn
 
-from nerfstudio.cameras.rays import RaySamples
+from nerfstudio.cameras.rays import PackedRaySamples, RaySamples
 from nerfstudio.field_components.field_heads import FieldHeadNames
 from nerfstudio.utils.math import masked_reduction, normalized_depth_scale_and_shift
 
@@ -110,22 +110,30 @@ def ray_samples_to_sdist(ray_samples):
     return sdist
 
 
+def ray_samples_to_sdist_and_weights(ray_samples, weights):
+    """Convert ray samples, dense or packed, and their weights to histograms in s space"""
+    if isinstance(ray_samples, PackedRaySamples):
+        return ray_samples.get_spacing_bins(weights)
+    return ray_samples_to_sdist(ray_samples), weights[..., 0]
+
+
 def interlevel_loss(weights_list, ray_samples_list) -> torch.Tensor:
-    """Calculates the proposal loss in the MipNeRF-360 paper.
+    """Calculates the proposal loss in the MipNeRF-360 paper. Ray samples can be dense or packed.
 
     https://github.com/kakaobrain/NeRF-Factory/blob/f61bb8744a5cb4820a4d968fb3bfbed777550f4a/src/model/mipnerf360/model.py#L515
     https://github.com/google-research/multinerf/blob/b02228160d3179300c7d499dca28cb9ca3677f32/internal/train_utils.py#L133
     """
-    c = ray_samples_to_sdist(ray_samples_list[-1]).detach()
-    w = weights_list[-1][..., 0].detach()
+    c, w = ray_samples_to_sdist_and_weights(ray_samples_list[-1], weights_list[-1])
+    c, w = c.detach(), w.detach()
+    # Packed samples have empty bins for the gaps and the padding, average over the actual samples.
+    num_samples = len(ray_samples_list[-1]) if isinstance(ray_samples_list[-1], PackedRaySamples) else w.numel()
     assert len(ray_samples_list) > 0
 
     loss_interlevel = 0.0
     for ray_samples, weights in zip(ray_samples_list[:-1], weights_list[:-1]):
-        sdist = ray_samples_to_sdist(ray_samples)
-        cp = sdist  # (num_rays, num_samples + 1)
-        wp = weights[..., 0]  # (num_rays, num_samples)
-        loss_interlevel += torch.mean(lossfun_outer(c, w, cp, wp))
+        # (num_rays, num_samples + 1), (num_rays, num_samples)
+        cp, wp = ray_samples_to_sdist_and_weights(ray_samples, weights)
+        loss_interlevel += torch.sum(lossfun_outer(c, w, cp, wp)) / max(num_samples, 1)
 
     assert isinstance(loss_interlevel, Tensor)
     return loss_interlevel
@@ -146,8 +154,20 @@ def lossfun_distortion(t, w):
     return loss_inter + loss_intra
 
 
+def lossfun_distortion_packed(ray_samples: PackedRaySamples, weights: Float[Tensor, "num_samples 1"]):
+    """lossfun_distortion for packed samples, in linear time with sums over the previous samples of each ray"""
+    starts, ends = ray_samples.ray_samples.spacing_starts, ray_samples.ray_samples.spacing_ends
+    assert starts is not None and ends is not None, "Ray samples must have spacing starts and ends"
+    ut = (starts + ends) / 2
+    loss_inter = 2 * weights * (ut * ray_samples.exclusive_sum(weights) - ray_samples.exclusive_sum(weights * ut))
+    loss_intra = weights**2 * (ends - starts) / 3
+    return ray_samples.sum_along_rays(loss_inter + loss_intra)[..., 0]
+
+
 def distortion_loss(weights_list, ray_samples_list):
-    """From mipnerf360"""
+    """From mipnerf360. Ray samples can be dense or packed."""
+    if isinstance(ray_samples_list[-1], PackedRaySamples):
+        return torch.mean(lossfun_distortion_packed(ray_samples_list[-1], weights_list[-1]))
     c = ray_samples_to_sdist(ray_samples_list[-1])
     w = weights_list[-1][..., 0]
     loss = torch.mean(lossfun_distortion(c, w))
@@ -0,0 +1,215 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Occupancy bitfield baked from trained density fields, used to skip empty space at inference.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+from typing import Callable, List, Optional
+
+import torch
+import torch.nn.functional as F
+from jaxtyping import Bool, Float
+from torch import Tensor, nn
+
+from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+from nerfstudio.model_components.ray_samplers import Sampler
+
+
+class OccupancyBitfield(nn.Module):
+    """Multi-resolution occupancy grid of a field, with one bit per cell.
+
+    The grid lives in the normalized space of the fields: the contracted space mapped to [0, 1]^3 when using a scene
+    contraction, or the scene box otherwise. Level i covers the cube of side 2^(i - num_levels + 1) around the center,
+    so the last level covers everything and each finer level doubles the resolution of the center of the scene.
+    Points are looked up in the finest level that contains them.
+
+    The grid is empty until baked, and is saved with the model. It only depends on the density fields, so it has to
+    be baked again if they change.
+
+    Args:
+        aabb: Scene box of the fields.
+        spatial_distortion: Spatial distortion of the fields.
+        resolution: Number of cells along each side of a level.
+        num_levels: Number of levels.
+    """
+
+    def __init__(
+        self,
+        aabb: Float[Tensor, "2 3"],
+        spatial_distortion: Optional[SceneContraction] = None,
+        resolution: int = 128,
+        num_levels: int = 2,
+    ) -> None:
+        super().__init__()
+        if resolution % 2 != 0:
+            raise ValueError("The resolution of the occupancy grid must be even")
+        self.spatial_distortion = spatial_distortion
+        self.resolution = resolution
+        self.num_levels = num_levels
+        self.register_buffer("aabb", aabb.clone(), persistent=False)
+        self.bitfield: Tensor
+        self.register_buffer("bitfield", torch.empty(0, dtype=torch.uint8))
+
+    @property
+    def is_baked(self) -> bool:
+        """Returns whether the grid was baked."""
+        return self.bitfield.numel() > 0
+
+    @property
+    def num_cells(self) -> int:
+        """Returns the number of cells of all levels."""
+        return self.num_levels * self.resolution**3
+
+    def normalize(self, positions: Float[Tensor, "*bs 3"]) -> Float[Tensor, "*bs 3"]:
+        """Maps world positions to the normalized space of the fields."""
+        if self.spatial_distortion is not None:
+            return (self.spatial_distortion(positions) + 2.0) / 4.0
+        return SceneBox.get_normalized_positions(positions, self.aabb)
+
+    def denormalize(self, coords: Float[Tensor, "*bs 3"]) -> Float[Tensor, "*bs 3"]:
+        """Maps normalized coordinates back to world positions, undoing the scene contraction."""
+        if self.spatial_distortion is None:
+            return self.aabb[0] + coords * (self.aabb[1] - self.aabb[0])
+        contracted = coords * 4.0 - 2.0
+        # Stay away from the boundary of the contracted space, which maps to infinity.
+        mag = torch.linalg.norm(contracted, ord=self.spatial_distortion.order, dim=-1, keepdim=True)
+        clamped_mag = mag.clamp(1.0, 2.0 - 1e-3)
+        return torch.where(mag < 1, contracted, contracted / mag.clamp_min(1e-12) / (2.0 - clamped_mag))
+
+    def _level_extents(self, level: Tensor) -> Tensor:
+        """Returns the half side of the cube covered by each level in normalized coordinates."""
+        return 0.5 * torch.pow(2.0, (level - self.num_levels + 1).to(torch.float32))
+
+    def query(self, positions: Float[Tensor, "*bs 3"]) -> Bool[Tensor, "*bs"]:
+        """Returns whether positions are in occupied cells. Positions outside of the grid are empty.
+
+        Args:
+            positions: World positions.
+        """
+        assert self.is_baked, "The occupancy grid must be baked before it is queried"
+        coords = self.normalize(positions)
+        inside = ((coords >= 0.0) & (coords <= 1.0)).all(dim=-1)
+        distance = (coords - 0.5).abs().amax(dim=-1)
+        level = torch.ceil(torch.log2(torch.clamp(2.0 * distance, min=1e-12))) + self.num_levels - 1
+        level = level.clamp(0, self.num_levels - 1).long()
+        extent = self._level_extents(level)[..., None]
+        cells = ((coords - 0.5 + extent) / (2.0 * extent) * self.resolution).long().clamp(0, self.resolution - 1)
+        index = ((level * self.resolution + cells[..., 0]) * self.resolution + cells[..., 1]) * self.resolution
+        index = index + cells[..., 2]
+        bits = (self.bitfield[index >> 3].long() >> (index & 7)) & 1
+        return (bits > 0) & inside
+
+    @torch.no_grad()
+    def bake(
+        self,
+        density_fns: List[Callable[[Tensor], Tensor]],
+        alpha_threshold: float = 0.01,
+        samples_per_cell: int = 4,
+        chunk_size: int = 1 << 18,
+        seed: int = 0,
+    ) -> None:
+        """Marks the cells in which any of the density fields is not transparent.
+
+        Each cell is probed at random points. A cell is occupied if the opacity of a segment as long as the world size
+        of the cell is above `alpha_threshold` at any of them. The occupied cells are then dilated by one cell to
+        account for the sparse probing.
+
+        Args:
+            density_fns: Functions from world positions to densities, e.g. the proposal density fields.
+            alpha_threshold: Opacity above which a cell is occupied.
+            samples_per_cell: Number of probes per cell.
+            chunk_size: Number of probes per evaluation of the density fields.
+            seed: Seed of the random probes.
+        """
+        device = self.aabb.device
+        generator = torch.Generator(device=device).manual_seed(seed)
+        grid = torch.stack(
+            torch.meshgrid(*[torch.arange(self.resolution, device=device)] * 3, indexing="ij"), dim=-1
+        ).view(-1, 3)
+        levels = []
+        for level in range(self.num_levels):
+            extent = self._level_extents(torch.tensor(level, device=device))
+            cell_size = 2.0 * extent / self.resolution
+            occupied = torch.zeros(grid.shape[0], dtype=torch.bool, device=device)
+            for start in range(0, grid.shape[0], max(chunk_size // samples_per_cell, 1)):
+                cells = grid[start : start + max(chunk_size // samples_per_cell, 1)]
+                jitter = torch.rand((cells.shape[0], samples_per_cell, 3), generator=generator, device=device)
+                coords = 0.5 - extent + (cells[:, None, :] + jitter) * cell_size
+                positions = self.denormalize(coords)
+                # World size of the cell around each probe.
+                world_size = torch.linalg.norm(
+                    self.denormalize(coords + 0.5 * cell_size) - self.denormalize(coords - 0.5 * cell_size), dim=-1
+                )
+                density = torch.stack([density_fn(positions)[..., 0] for density_fn in density_fns]).amax(dim=0)
+                alpha = 1.0 - torch.exp(-density * world_size)
+                occupied[start : start + cells.shape[0]] = (alpha > alpha_threshold).any(dim=-1)
+            occupied = occupied.view(1, 1, *[self.resolution] * 3).float()
+            levels.append(F.max_pool3d(occupied, kernel_size=3, stride=1, padding=1).view(-1) > 0)
+        occupied = torch.cat(levels)
+        bit_values = torch.pow(2, torch.arange(8, device=device))
+        self.bitfield = (occupied.view(-1, 8).long() * bit_values).sum(dim=-1).to(torch.uint8)
+
+    def occupancy(self) -> List[float]:
+        """Returns the fraction of occupied cells of each level."""
+        bits = (self.bitfield[:, None].long() >> torch.arange(8, device=self.bitfield.device)) & 1
+        return bits.view(self.num_levels, -1).float().mean(dim=-1).tolist()
+
+    @torch.no_grad()
+    def clip_ray_bundle(self, ray_bundle: RayBundle, sampler: Sampler, num_steps: int = 512) -> RayBundle:
+        """Returns the rays with their near and far planes moved to the first and last occupied cells along them.
+
+        Rays are probed at the midpoints of `num_steps` samples of `sampler`, which should be the initial sampler of
+        the model so that the probes follow its spacing. Rays that only cross empty space get an empty interval at
+        their far plane.
+
+        Args:
+            ray_bundle: Rays with near and far planes.
+            sampler: Sampler giving the probes along each ray.
+            num_steps: Number of probes per ray.
+        """
+        assert ray_bundle.nears is not None and ray_bundle.fars is not None, "Rays need near and far planes"
+        ray_samples = sampler(ray_bundle, num_samples=num_steps)
+        occupied = self.query(ray_samples.frustums.get_positions())
+        steps = torch.arange(num_steps, device=occupied.device)
+        first = torch.where(occupied, steps, num_steps).amin(dim=-1, keepdim=True)
+        last = torch.where(occupied, steps, -1).amax(dim=-1, keepdim=True)
+        empty = last < 0
+        # Keep one step of margin on each side, the occupied cells may extend past the probes.
+        first = (first - 1).clamp(0, num_steps - 1)
+        last = (last + 1).clamp(0, num_steps - 1)
+        assert ray_samples.frustums.starts is not None and ray_samples.frustums.ends is not None
+        nears = torch.gather(ray_samples.frustums.starts[..., 0], -1, first)
+        fars = torch.gather(ray_samples.frustums.ends[..., 0], -1, last)
+        nears = torch.where(empty, ray_bundle.fars, nears)
+        fars = torch.where(empty, ray_bundle.fars, fars)
+        return dataclasses.replace(ray_bundle, nears=nears, fars=fars)
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        key = prefix + "bitfield"
+        if key not in state_dict:
+            # Checkpoints from before the grid existed.
+            state_dict[key] = self.bitfield
+        elif state_dict[key].numel() not in (0, self.num_cells // 8):
+            raise ValueError(
+                "The occupancy grid of the checkpoint was baked with a different resolution or number of levels"
+            )
+        # The grid is empty until baked, so take the size of the checkpoint.
+        self.bitfield = torch.empty_like(state_dict[key], device=self.bitfield.device)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
@@ -16,27 +16,73 @@
 Ray generator.
 """
 
+from typing import Optional
+
+import torch
 from jaxtyping import Int
 from torch import Tensor, nn
 
-from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.cameras.cameras import Cameras, CameraType
+from nerfstudio.cameras.inverse_distortion import InverseDistortionApproximation
 from nerfstudio.cameras.rays import RayBundle
 
+# Camera types whose rays start at the camera center, so that a ray only depends on the pixel and the intrinsics.
+LUT_CAMERA_TYPES = (
+    CameraType.PERSPECTIVE.value,
+    CameraType.FISHEYE.value,
+    CameraType.EQUIRECTANGULAR.value,
+    CameraType.FISHEYE624.value,
+)
+# Each lookup table entry holds the camera space direction (3), the pixel area and the directions norm.
+LUT_ENTRY_SIZE = 5
+
 
 class RayGenerator(nn.Module):
     """torch.nn Module for generating rays.
     This class is the interface between the scene's cameras/camera optimizer and the ray sampler.
 
+    With `use_direction_lut`, the camera space directions of every pixel are computed once for each group of cameras
+    sharing the same intrinsics and distortion, and generating a ray is a lookup followed by the camera rotation. This
+    skips the unprojection and the iterative undistortion on every step. Groups are added to the lookup table, most
+    shared first, until `max_lut_memory_mb` is reached; rays of the remaining cameras are generated on the fly. The
+    table is built on the first call, so it is not pickled when the generator is sent to data loading processes.
+
+    With `approximate_undistortion`, rays generated on the fly use an interpolated inverse distortion fitted on the
+    first call instead of the iterative undistortion, for the camera models where it is within
+    `undistortion_tolerance` pixels of the forward distortion (see `InverseDistortionApproximation`).
+
     Args:
         cameras: Camera objects containing camera info.
+        use_direction_lut: Whether to generate rays from precomputed camera space directions.
+        max_lut_memory_mb: Memory budget of the lookup table in megabytes.
+        approximate_undistortion: Whether to approximate the inverse distortion.
+        undistortion_tolerance: Maximum reprojection error in pixels of the approximate inverse distortion.
     """
 
     image_coords: Tensor
+    direction_lut: Optional[Tensor]
+    lut_offsets: Optional[Tensor]
+    lut_widths: Optional[Tensor]
 
-    def __init__(self, cameras: Cameras) -> None:
+    def __init__(
+        self,
+        cameras: Cameras,
+        use_direction_lut: bool = False,
+        max_lut_memory_mb: float = 512.0,
+        approximate_undistortion: bool = False,
+        undistortion_tolerance: float = 0.05,
+    ) -> None:
         super().__init__()
         self.cameras = cameras
+        self.use_direction_lut = use_direction_lut
+        self.max_lut_memory_mb = max_lut_memory_mb
+        self.approximate_undistortion = approximate_undistortion
+        self.undistortion_tolerance = undistortion_tolerance
+        self.inverse_distortion: Optional[InverseDistortionApproximation] = None
         self.register_buffer("image_coords", cameras.get_image_coords(), persistent=False)
+        self.register_buffer("direction_lut", None, persistent=False)
+        self.register_buffer("lut_offsets", None, persistent=False)
+        self.register_buffer("lut_widths", None, persistent=False)
 
     def forward(self, ray_indices: Int[Tensor, "num_rays 3"]) -> RayBundle:
         """Index into the cameras to generate the rays.
@@ -47,10 +93,140 @@ class RayGenerator(nn.Module):
         c = ray_indices[:, 0]  # camera indices
         y = ray_indices[:, 1]  # row indices
         x = ray_indices[:, 2]  # col indices
+
+        if self.approximate_undistortion and self.inverse_distortion is None:
+            self.inverse_distortion = self.cameras.fit_inverse_distortion(self.undistortion_tolerance)
+            self.inverse_distortion.print_report()
+
+        if self.use_direction_lut:
+            if self.lut_offsets is None:
+                self.build_direction_lut()
+            assert self.lut_offsets is not None and self.lut_widths is not None
+            offsets = self.lut_offsets[c]
+            in_lut = offsets >= 0
+            if in_lut.any():
+                lut_indices = torch.where(in_lut, offsets + y * self.lut_widths[c] + x, 0)
+                ray_bundle = self._generate_rays_from_lut(c, lut_indices)
+                if not in_lut.all():
+                    # Overwrite the rays of cameras that didn't fit in the lookup table.
+                    fallback = ~in_lut
+                    fallback_bundle = self.cameras.generate_rays(
+                        camera_indices=c[fallback].unsqueeze(-1),
+                        coords=self.image_coords[y[fallback], x[fallback]],
+                        inverse_distortion=self.inverse_distortion,
+                    )
+                    ray_bundle.origins[fallback] = fallback_bundle.origins
+                    ray_bundle.directions[fallback] = fallback_bundle.directions
+                    ray_bundle.pixel_area[fallback] = fallback_bundle.pixel_area
+                    assert ray_bundle.metadata is not None and fallback_bundle.metadata is not None
+                    ray_bundle.metadata["directions_norm"][fallback] = fallback_bundle.metadata["directions_norm"]
+                return ray_bundle
+
         coords = self.image_coords[y, x]
 
         ray_bundle = self.cameras.generate_rays(
             camera_indices=c.unsqueeze(-1),
             coords=coords,
+            inverse_distortion=self.inverse_distortion,
         )
         return ray_bundle
+
+    @torch.no_grad()
+    def build_direction_lut(self, chunk_size: int = 1 << 18) -> None:
+        """Computes the camera space directions of every pixel for each group of cameras with the same intrinsics.
+
+        Args:
+            chunk_size: Number of pixels generated at once, to bound the peak memory of building the table.
+        """
+        cameras = self.cameras
+        device = cameras.device
+        num_cameras = cameras.shape[0]
+        distortion_params = (
+            cameras.distortion_params
+            if cameras.distortion_params is not None
+            else torch.zeros((num_cameras, 6), device=device)
+        )
+        intrinsics = torch.cat(
+            [
+                cameras.fx,
+                cameras.fy,
+                cameras.cx,
+                cameras.cy,
+                cameras.width.float(),
+                cameras.height.float(),
+                cameras.camera_type.float(),
+                distortion_params,
+            ],
+            dim=-1,
+        )
+        _, group_indices, group_counts = torch.unique(intrinsics, dim=0, return_inverse=True, return_counts=True)
+
+        lut_offsets = torch.full((num_cameras,), -1, dtype=torch.long, device=device)
+        lut_widths = cameras.width[:, 0].to(torch.long)
+        max_entries = int(self.max_lut_memory_mb * 1024**2) // (LUT_ENTRY_SIZE * 4)
+        tables = []
+        num_entries = 0
+        for group in torch.argsort(group_counts, descending=True).tolist():
+            group_cameras = torch.nonzero(group_indices == group)[:, 0]
+            camera_idx = int(group_cameras[0])
+            if int(cameras.camera_type[camera_idx]) not in LUT_CAMERA_TYPES:
+                continue
+            num_pixels = int(cameras.height[camera_idx]) * int(cameras.width[camera_idx])
+            if num_entries + num_pixels > max_entries:
+                continue
+            tables.append(self._compute_direction_table(camera_idx, chunk_size))
+            lut_offsets[group_cameras] = num_entries
+            num_entries += num_pixels
+
+        self.direction_lut = (
+            torch.cat(tables) if tables else torch.empty((0, LUT_ENTRY_SIZE), dtype=torch.float32, device=device)
+        )
+        self.lut_offsets = lut_offsets
+        self.lut_widths = lut_widths
+
+    def _compute_direction_table(self, camera_idx: int, chunk_size: int) -> Tensor:
+        """Returns the lookup table entries of all pixels of a camera, in row major order."""
+        camera = self.cameras[camera_idx : camera_idx + 1]
+        # With an identity pose, the generated rays are in camera space.
+        camera.camera_to_worlds = torch.eye(3, 4, device=camera.device)[None].expand(1, 3, 4)
+        coords = camera.get_image_coords(index=(0,)).reshape(-1, 2).to(camera.device)
+        table = []
+        for start in range(0, coords.shape[0], chunk_size):
+            chunk = coords[start : start + chunk_size]
+            ray_bundle = camera.generate_rays(
+                camera_indices=torch.zeros((chunk.shape[0], 1), dtype=torch.long, device=camera.device),
+                coords=chunk,
+            )
+            assert ray_bundle.pixel_area is not None and ray_bundle.metadata is not None
+            table.append(
+                torch.cat(
+                    [ray_bundle.directions, ray_bundle.pixel_area, ray_bundle.metadata["directions_norm"]], dim=-1
+                )
+            )
+        return torch.cat(table)
+
+    def _generate_rays_from_lut(self, c: Int[Tensor, "num_rays"], lut_indices: Int[Tensor, "num_rays"]) -> RayBundle:
+        """Generates rays by rotating the camera space directions stored in the lookup table.
+
+        The pixel areas and direction norms are invariant to the rotation, so they are read from the table as is.
+        """
+        assert self.direction_lut is not None
+        entries = self.direction_lut[lut_indices]
+        c2w = self.cameras.camera_to_worlds[c]
+        directions = torch.sum(entries[:, None, :3] * c2w[:, :3, :3], dim=-1)
+        camera_indices = c.unsqueeze(-1)
+        times = self.cameras.times[camera_indices, 0] if self.cameras.times is not None else None
+        metadata = (
+            self.cameras._apply_fn_to_dict(self.cameras.metadata, lambda x: x[c])
+            if self.cameras.metadata is not None
+            else {}
+        )
+        metadata["directions_norm"] = entries[:, 4:5]
+        return RayBundle(
+            origins=c2w[:, :3, 3],
+            directions=directions,
+            pixel_area=entries[:, 3:4],
+            camera_indices=camera_indices,
+            times=times,
+            metadata=metadata,
+        )
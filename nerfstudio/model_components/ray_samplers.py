@@ -25,6 +25,7 @@ from nerfacc import OccGridEstimator
 from torch import Tensor, nn
 
 from nerfstudio.cameras.rays import Frustums, RayBundle, RaySamples
+from nerfstudio.utils.cancellation import check_cancelled
 
 
 class Sampler(nn.Module):
@@ -302,7 +303,8 @@ class PDFSampler(Sampler):
         assert num_samples is not None
         num_bins = num_samples + 1
 
-        weights = weights[..., 0] + self.histogram_padding
+        # The samples don't carry gradients, so the weights don't need to be tracked either.
+        weights = weights[..., 0].detach() + self.histogram_padding
 
         # Add small offset to rays with zero weight to prevent NaNs
         weights_sum = torch.sum(weights, dim=-1, keepdim=True)
@@ -311,8 +313,10 @@ class PDFSampler(Sampler):
         weights_sum += padding
 
         pdf = weights / weights_sum
-        cdf = torch.min(torch.ones_like(pdf), torch.cumsum(pdf, dim=-1))
-        cdf = torch.cat([torch.zeros_like(cdf[..., :1]), cdf], dim=-1)
+        # the cdf is written after a leading zero, without concatenating
+        cdf = pdf.new_zeros((*pdf.shape[:-1], pdf.shape[-1] + 1))
+        torch.cumsum(pdf, dim=-1, out=cdf[..., 1:])
+        cdf[..., 1:].clamp_(max=1.0)
 
         if self.train_stratified and self.training:
             # Stratified samples between 0 and 1
@@ -342,19 +346,31 @@ class PDFSampler(Sampler):
             dim=-1,
         )
 
+        # Nothing here is differentiated, so the intermediate tensors are updated in place.
         inds = torch.searchsorted(cdf, u, side="right")
         below = torch.clamp(inds - 1, 0, existing_bins.shape[-1] - 1)
-        above = torch.clamp(inds, 0, existing_bins.shape[-1] - 1)
+        above = inds.clamp_(0, existing_bins.shape[-1] - 1)
         cdf_g0 = torch.gather(cdf, -1, below)
         bins_g0 = torch.gather(existing_bins, -1, below)
         cdf_g1 = torch.gather(cdf, -1, above)
         bins_g1 = torch.gather(existing_bins, -1, above)
 
-        t = torch.clip(torch.nan_to_num((u - cdf_g0) / (cdf_g1 - cdf_g0), 0), 0, 1)
-        bins = bins_g0 + t * (bins_g1 - bins_g0)
+        t = (u - cdf_g0).div_(cdf_g1.sub_(cdf_g0)).nan_to_num_(0).clamp_(0, 1)
+        bins = bins_g1.sub_(bins_g0).mul_(t).add_(bins_g0)
 
         if self.include_original:
-            bins, _ = torch.sort(torch.cat([existing_bins, bins], -1), -1)
+            # Both sets of bins are sorted, so they are merged with their ranks in each other instead of sorted.
+            num_existing, num_new = existing_bins.shape[-1], bins.shape[-1]
+            merged = bins.new_empty((*bins.shape[:-1], num_existing + num_new))
+            existing_ranks = torch.arange(num_existing, device=bins.device) + torch.searchsorted(
+                bins, existing_bins.contiguous(), side="left"
+            )
+            new_ranks = torch.arange(num_new, device=bins.device) + torch.searchsorted(
+                existing_bins.contiguous(), bins, side="right"
+            )
+            merged.scatter_(-1, existing_ranks, existing_bins)
+            merged.scatter_(-1, new_ranks, bins)
+            bins = merged
 
         # Stop gradients
         bins = bins.detach()
@@ -530,6 +546,8 @@ class ProposalNetworkSampler(Sampler):
         update_sched: A function that takes the iteration number of steps between updates.
         initial_sampler: Sampler to use for the first iteration. Uses UniformLinDispPiecewise if not set.
         pdf_sampler: PDFSampler to use after the first iteration. Uses PDFSampler if not set.
+        use_inference_pipeline: Use a pipeline without autograd that shares the buffers of the levels, in eval mode
+            when gradients are disabled.
     """
 
     def __init__(
@@ -541,12 +559,14 @@ class ProposalNetworkSampler(Sampler):
         update_sched: Callable = lambda x: 1,
         initial_sampler: Optional[Sampler] = None,
         pdf_sampler: Optional[PDFSampler] = None,
+        use_inference_pipeline: bool = True,
     ) -> None:
         super().__init__()
         self.num_proposal_samples_per_ray = num_proposal_samples_per_ray
         self.num_nerf_samples_per_ray = num_nerf_samples_per_ray
         self.num_proposal_network_iterations = num_proposal_network_iterations
         self.update_sched = update_sched
+        self.use_inference_pipeline = use_inference_pipeline
         if self.num_proposal_network_iterations < 1:
             raise ValueError("num_proposal_network_iterations must be >= 1")
 
@@ -580,6 +600,8 @@ class ProposalNetworkSampler(Sampler):
     ) -> Tuple[RaySamples, List, List]:
         assert ray_bundle is not None
         assert density_fns is not None
+        if self.use_inference_pipeline and not self.training and not torch.is_grad_enabled():
+            return self._generate_ray_samples_inference(ray_bundle, density_fns)
 
         weights_list = []
         ray_samples_list = []
@@ -616,6 +638,42 @@ class ProposalNetworkSampler(Sampler):
         assert ray_samples is not None
         return ray_samples, weights_list, ray_samples_list
 
+    def _generate_ray_samples_inference(
+        self, ray_bundle: RayBundle, density_fns: List[Callable]
+    ) -> Tuple[RaySamples, List, List]:
+        """Same as generate_ray_samples for inference, when no gradients are needed.
+
+        The positions of all the proposal levels are written to a single buffer with one fused kernel, instead of
+        the chain of broadcast operations of Frustums.get_positions.
+        """
+        weights_list = []
+        ray_samples_list = []
+
+        n = self.num_proposal_network_iterations
+        num_samples_per_level = [*self.num_proposal_samples_per_ray[:n], self.num_nerf_samples_per_ray]
+        positions_buffer = ray_bundle.origins.new_empty(len(ray_bundle) * max(num_samples_per_level[:n]) * 3)
+        origins = ray_bundle.origins[..., None, :]
+        directions = ray_bundle.directions[..., None, :]
+        ray_samples = self.initial_sampler(ray_bundle, num_samples=num_samples_per_level[0])
+        for i_level in range(n):
+            # each level is a checkpoint of a cancellable render, e.g. of the viewer
+            check_cancelled()
+            frustums = ray_samples.frustums
+            if frustums.offsets is None:
+                positions = positions_buffer[: frustums.origins.numel()].view(frustums.origins.shape)
+                torch.addcmul(origins, directions, (frustums.starts + frustums.ends) * 0.5, out=positions)
+            else:
+                positions = frustums.get_positions()
+            weights = ray_samples.get_weights(density_fns[i_level](positions))
+            weights_list.append(weights)  # (num_rays, num_samples)
+            ray_samples_list.append(ray_samples)
+
+            annealed_weights = weights if self._anneal == 1.0 else torch.pow(weights, self._anneal)
+            ray_samples = self.pdf_sampler(
+                ray_bundle, ray_samples, annealed_weights, num_samples=num_samples_per_level[i_level + 1]
+            )
+        return ray_samples, weights_list, ray_samples_list
+
 
 class NeuSSampler(Sampler):
     """NeuS sampler that uses a sdf network to generate samples with fixed variance value in each iterations."""
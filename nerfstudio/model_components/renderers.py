@@ -36,7 +36,7 @@ import torch
 from jaxtyping import Float, Int
 from torch import Tensor, nn
 
-from nerfstudio.cameras.rays import RaySamples
+from nerfstudio.cameras.rays import PackedRaySamples, RaySamples
 from nerfstudio.utils import colors
 from nerfstudio.utils.math import components_from_spherical_harmonics, safe_normalize
 
@@ -75,6 +75,7 @@ class RGBRenderer(nn.Module):
         background_color: BackgroundColor = "random",
         ray_indices: Optional[Int[Tensor, "num_samples"]] = None,
         num_rays: Optional[int] = None,
+        packed_samples: Optional[PackedRaySamples] = None,
     ) -> Float[Tensor, "*bs 3"]:
         """Composite samples along ray and render color image.
         If background color is random, no BG color is added - as if the background was black!
@@ -85,14 +86,15 @@ class RGBRenderer(nn.Module):
             background_color: Background color as RGB.
             ray_indices: Ray index for each sample, used when samples are packed.
             num_rays: Number of rays, used when samples are packed.
+            packed_samples: Packed samples, instead of ray_indices and num_rays.
 
         Returns:
             Outputs rgb values.
         """
+        if packed_samples is not None:
+            ray_indices, num_rays = packed_samples.ray_indices, packed_samples.num_rays
         if ray_indices is not None and num_rays is not None:
             # Necessary for packed samples from volumetric ray sampler
-            if background_color == "last_sample":
-                raise NotImplementedError("Background color 'last_sample' not implemented for packed samples.")
             comp_rgb = nerfacc.accumulate_along_rays(
                 weights[..., 0], values=rgb, ray_indices=ray_indices, n_rays=num_rays
             )
@@ -109,8 +111,17 @@ class RGBRenderer(nn.Module):
             # as if the background color was black.
             return comp_rgb
         elif background_color == "last_sample":
-            # Note, this is only supported for non-packed samples.
-            background_color = rgb[..., -1, :]
+            if ray_indices is not None and num_rays is not None:
+                # Color of the last sample of each ray, black for rays without samples.
+                sample_indices = torch.arange(len(ray_indices), device=ray_indices.device)
+                last_indices = ray_indices.new_full((num_rays,), -1).scatter_reduce(
+                    0, ray_indices, sample_indices, reduce="amax"
+                )
+                has_samples = last_indices >= 0
+                background_color = rgb.new_zeros((num_rays, 3))
+                background_color[has_samples] = rgb[last_indices[has_samples]]
+            else:
+                background_color = rgb[..., -1, :]
         background_color = cls.get_background_color(background_color, shape=comp_rgb.shape, device=comp_rgb.device)
 
         assert isinstance(background_color, torch.Tensor)
@@ -204,6 +215,7 @@ class RGBRenderer(nn.Module):
         ray_indices: Optional[Int[Tensor, "num_samples"]] = None,
         num_rays: Optional[int] = None,
         background_color: Optional[BackgroundColor] = None,
+        packed_samples: Optional[PackedRaySamples] = None,
     ) -> Float[Tensor, "*bs 3"]:
         """Composite samples along ray and render color image
 
@@ -213,6 +225,7 @@ class RGBRenderer(nn.Module):
             ray_indices: Ray index for each sample, used when samples are packed.
             num_rays: Number of rays, used when samples are packed.
             background_color: The background color to use for rendering.
+            packed_samples: Packed samples, instead of ray_indices and num_rays.
 
         Returns:
             Outputs of rgb values.
@@ -224,7 +237,12 @@ class RGBRenderer(nn.Module):
         if not self.training:
             rgb = torch.nan_to_num(rgb)
         rgb = self.combine_rgb(
-            rgb, weights, background_color=background_color, ray_indices=ray_indices, num_rays=num_rays
+            rgb,
+            weights,
+            background_color=background_color,
+            ray_indices=ray_indices,
+            num_rays=num_rays,
+            packed_samples=packed_samples,
         )
         if not self.training:
             torch.clamp_(rgb, min=0.0, max=1.0)
@@ -294,6 +312,7 @@ class AccumulationRenderer(nn.Module):
         weights: Float[Tensor, "*bs num_samples 1"],
         ray_indices: Optional[Int[Tensor, "num_samples"]] = None,
         num_rays: Optional[int] = None,
+        packed_samples: Optional[PackedRaySamples] = None,
     ) -> Float[Tensor, "*bs 1"]:
         """Composite samples along ray and calculate accumulation.
 
@@ -301,10 +320,13 @@ class AccumulationRenderer(nn.Module):
             weights: Weights for each sample
             ray_indices: Ray index for each sample, used when samples are packed.
             num_rays: Number of rays, used when samples are packed.
+            packed_samples: Packed samples, instead of ray_indices and num_rays.
 
         Returns:
             Outputs of accumulated values.
         """
+        if packed_samples is not None:
+            ray_indices, num_rays = packed_samples.ray_indices, packed_samples.num_rays
 
         if ray_indices is not None and num_rays is not None:
             # Necessary for packed samples from volumetric ray sampler
@@ -334,7 +356,7 @@ class DepthRenderer(nn.Module):
     def forward(
         self,
         weights: Float[Tensor, "*batch num_samples 1"],
-        ray_samples: RaySamples,
+        ray_samples: Union[RaySamples, PackedRaySamples],
         ray_indices: Optional[Int[Tensor, "num_samples"]] = None,
         num_rays: Optional[int] = None,
     ) -> Float[Tensor, "*batch 1"]:
@@ -342,19 +364,34 @@ class DepthRenderer(nn.Module):
 
         Args:
             weights: Weights for each sample.
-            ray_samples: Set of ray samples.
+            ray_samples: Set of ray samples, dense or packed.
             ray_indices: Ray index for each sample, used when samples are packed.
             num_rays: Number of rays, used when samples are packed.
 
         Returns:
             Outputs of depth values.
         """
+        if isinstance(ray_samples, PackedRaySamples):
+            ray_samples, ray_indices, num_rays = ray_samples.ray_samples, ray_samples.ray_indices, ray_samples.num_rays
 
         if self.method == "median":
             steps = (ray_samples.frustums.starts + ray_samples.frustums.ends) / 2
 
             if ray_indices is not None and num_rays is not None:
-                raise NotImplementedError("Median depth calculation is not implemented for packed samples.")
+                packed_samples = PackedRaySamples(ray_samples=ray_samples, ray_indices=ray_indices, num_rays=num_rays)
+                cumulative_weights = packed_samples.exclusive_sum(weights)[..., 0] + weights[..., 0]
+                sample_indices = torch.arange(len(packed_samples), device=weights.device)
+                # first sample of each ray past half of the weight, or its last sample like the dense case
+                median_index = torch.where(cumulative_weights >= 0.5, sample_indices, len(packed_samples))
+                median_index = median_index.new_full((num_rays,), len(packed_samples)).scatter_reduce(
+                    0, ray_indices, median_index, reduce="amin"
+                )
+                last_index = median_index.new_zeros((num_rays,)).scatter_reduce(
+                    0, ray_indices, sample_indices, reduce="amax"
+                )
+                median_index = torch.where(median_index < len(packed_samples), median_index, last_index)
+                median_depth = steps[median_index]
+                return median_depth * (packed_samples.get_num_samples_per_ray()[:, None] > 0)
             cumulative_weights = torch.cumsum(weights[..., 0], dim=-1)  # [..., num_samples]
             split = torch.ones((*weights.shape[:-2], 1), device=weights.device) * 0.5  # [..., 1]
             median_index = torch.searchsorted(cumulative_weights, split, side="left")  # [..., 1]
@@ -414,8 +451,11 @@ class SemanticRenderer(nn.Module):
         weights: Float[Tensor, "*bs num_samples 1"],
         ray_indices: Optional[Int[Tensor, "num_samples"]] = None,
         num_rays: Optional[int] = None,
+        packed_samples: Optional[PackedRaySamples] = None,
     ) -> Float[Tensor, "*bs num_classes"]:
         """Calculate semantics along the ray."""
+        if packed_samples is not None:
+            ray_indices, num_rays = packed_samples.ray_indices, packed_samples.num_rays
         if ray_indices is not None and num_rays is not None:
             # Necessary for packed samples from volumetric ray sampler
             return nerfacc.accumulate_along_rays(
@@ -434,6 +474,9 @@ class NormalsRenderer(nn.Module):
         normals: Float[Tensor, "*bs num_samples 3"],
         weights: Float[Tensor, "*bs num_samples 1"],
         normalize: bool = True,
+        ray_indices: Optional[Int[Tensor, "num_samples"]] = None,
+        num_rays: Optional[int] = None,
+        packed_samples: Optional[PackedRaySamples] = None,
     ) -> Float[Tensor, "*bs 3"]:
         """Calculate normals along the ray.
 
@@ -441,8 +484,16 @@ class NormalsRenderer(nn.Module):
             normals: Normals for each sample.
             weights: Weights of each sample.
             normalize: Normalize normals.
+            ray_indices: Ray index for each sample, used when samples are packed.
+            num_rays: Number of rays, used when samples are packed.
+            packed_samples: Packed samples, instead of ray_indices and num_rays.
         """
-        n = torch.sum(weights * normals, dim=-2)
+        if packed_samples is not None:
+            ray_indices, num_rays = packed_samples.ray_indices, packed_samples.num_rays
+        if ray_indices is not None and num_rays is not None:
+            n = nerfacc.accumulate_along_rays(weights[..., 0], values=normals, ray_indices=ray_indices, n_rays=num_rays)
+        else:
+            n = torch.sum(weights * normals, dim=-2)
         if normalize:
             n = safe_normalize(n)
         return n
@@ -19,12 +19,12 @@ Base Model implementation which takes in RayBundles or Cameras
 from __future__ import annotations
 
 from abc import abstractmethod
-from collections import defaultdict
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple, Type, Union
 
 import torch
-from torch import nn
+from jaxtyping import Int
+from torch import Tensor, nn
 from torch.nn import Parameter
 
 from nerfstudio.cameras.cameras import Cameras
@@ -34,6 +34,8 @@ from nerfstudio.configs.config_utils import to_immutable_dict
 from nerfstudio.data.scene_box import OrientedBox, SceneBox
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.model_components.scene_colliders import NearFarCollider
+from nerfstudio.utils.cancellation import check_cancelled, is_cancellable
+from nerfstudio.utils.chunking import AdaptiveChunkSize, is_out_of_memory_error
 
 
 # Model related configs
@@ -51,6 +53,12 @@ class ModelConfig(InstantiateConfig):
     """parameters to instantiate density field with"""
     eval_num_rays_per_chunk: int = 4096
     """specifies number of rays per chunk during eval"""
+    eval_adaptive_num_rays_per_chunk: bool = False
+    """Whether to grow the number of rays per chunk during eval, starting from eval_num_rays_per_chunk, while there is
+    free GPU memory, and to retry chunks with fewer rays after running out of memory. Cancellable renders, e.g. of
+    the viewer, keep chunks of eval_num_rays_per_chunk rays, as they can only stop between chunks."""
+    eval_max_num_rays_per_chunk: int = 1 << 18
+    """Maximum number of rays per chunk during eval when it is adaptive."""
     prompt: Optional[str] = None
     """A prompt to be used in text to NeRF models"""
 
@@ -81,6 +89,7 @@ class Model(nn.Module):
         self.num_train_data = num_train_data
         self.kwargs = kwargs
         self.collider = None
+        self.eval_chunk_size: Optional[AdaptiveChunkSize] = None
 
         self.populate_modules()  # populate the modules
         self.callbacks = None
@@ -182,26 +191,119 @@ class Model(nn.Module):
             camera_ray_bundle: ray bundle to calculate outputs over
         """
         input_device = camera_ray_bundle.directions.device
-        num_rays_per_chunk = self.config.eval_num_rays_per_chunk
         image_height, image_width = camera_ray_bundle.origins.shape[:2]
-        num_rays = len(camera_ray_bundle)
-        outputs_lists = defaultdict(list)
-        for i in range(0, num_rays, num_rays_per_chunk):
-            start_idx = i
-            end_idx = i + num_rays_per_chunk
-            ray_bundle = camera_ray_bundle.get_row_major_sliced_ray_bundle(start_idx, end_idx)
-            # move the chunk inputs to the model device
-            ray_bundle = ray_bundle.to(self.device)
-            outputs = self.forward(ray_bundle=ray_bundle)
-            for output_name, output in outputs.items():  # type: ignore
+        outputs = self.get_outputs_for_rays(camera_ray_bundle.flatten(), output_device=input_device)
+        return {output_name: output.view(image_height, image_width, -1) for output_name, output in outputs.items()}
+
+    @torch.no_grad()
+    def get_outputs_for_cameras(
+        self,
+        cameras: Cameras,
+        camera_indices: Optional[Int[Tensor, "num_images num_cameras_batch_dims"]] = None,
+        num_rays_per_pass: Optional[int] = None,
+    ) -> List[Dict[str, torch.Tensor]]:
+        """Renders several cameras at once. The rays of all cameras are rendered back to back, so a pass can hold
+        the last rays of one image and the first rays of the next, and small images share passes. Models that
+        override get_outputs_for_camera, e.g. to rasterize whole images, render one camera at a time with it.
+
+        Args:
+            cameras: Cameras to render, of any sizes.
+            camera_indices: Indices of the cameras to render, with shape (num_images, num_cameras_batch_dims).
+                Defaults to all cameras.
+            num_rays_per_pass: Maximum number of rays per forward pass. Defaults to eval_num_rays_per_chunk.
+
+        Returns:
+            The outputs of each image, with shape (height, width, ...), on the device of the cameras.
+        """
+        input_device = cameras.device
+        if type(self).get_outputs_for_camera is not Model.get_outputs_for_camera:
+            cameras = cameras.reshape((1,)) if not cameras.shape else cameras
+            if camera_indices is None:
+                camera_indices = torch.stack(
+                    torch.meshgrid(*[torch.arange(size) for size in cameras.shape], indexing="ij"), dim=-1
+                ).reshape(-1, len(cameras.shape))
+            return [
+                {
+                    output_name: output.to(input_device)
+                    for output_name, output in self.get_outputs_for_camera(cameras[tuple(index)].reshape((1,))).items()
+                }
+                for index in camera_indices.tolist()
+            ]
+        ray_bundle, offsets = cameras.generate_packed_rays(camera_indices=camera_indices)
+        # The images are views into the outputs of all the rays.
+        outputs = self.get_outputs_for_rays(ray_bundle, num_rays_per_pass, output_device=input_device)
+        return cameras.split_packed_outputs(outputs, offsets.to(input_device), camera_indices)
+
+    @torch.no_grad()
+    def get_outputs_for_rays(
+        self,
+        ray_bundle: RayBundle,
+        num_rays_per_pass: Optional[int] = None,
+        output_device: Optional[Union[torch.device, str]] = None,
+    ) -> Dict[str, torch.Tensor]:
+        """Renders a flat ray bundle in passes of at most `num_rays_per_pass` rays.
+
+        The outputs of each pass are written into buffers on `output_device`, allocated after the first pass, so the
+        model device only holds the outputs of one pass when rendering to another device.
+
+        Args:
+            ray_bundle: Rays to render, with shape (num_rays,).
+            num_rays_per_pass: Maximum number of rays per forward pass. Defaults to eval_num_rays_per_chunk, or to
+                an adaptive size if eval_adaptive_num_rays_per_chunk is set.
+            output_device: Device of the returned outputs. Defaults to the model device.
+
+        Returns:
+            The outputs of the model with one row per ray. Outputs that are not tensors are dropped.
+        """
+        num_rays = len(ray_bundle)
+        chunk_size = None
+        if num_rays_per_pass is None and self.config.eval_adaptive_num_rays_per_chunk:
+            if self.eval_chunk_size is None:
+                self.eval_chunk_size = AdaptiveChunkSize(
+                    self.config.eval_num_rays_per_chunk, self.config.eval_max_num_rays_per_chunk
+                )
+            chunk_size = self.eval_chunk_size
+            # Renders of the same number of rays, i.e. of the same resolution, share their chunk size.
+            num_rays_per_pass = chunk_size.get(num_rays)
+        num_rays_per_pass = num_rays_per_pass or self.config.eval_num_rays_per_chunk
+        max_rays_per_pass = num_rays
+        if chunk_size is not None and is_cancellable():
+            # Cancellable renders, e.g. of the viewer, only stop between passes, so keep them short.
+            max_rays_per_pass = self.config.eval_num_rays_per_chunk
+        if ray_bundle.directions.device != self.device:
+            # Packing makes moving each pass to the model device one copy per dtype instead of one per field.
+            ray_bundle = ray_bundle.pack()
+        outputs: Dict[str, torch.Tensor] = {}
+        start_idx = 0
+        while start_idx < num_rays:
+            # Stop between passes if the render was cancelled, e.g. by the viewer.
+            check_cancelled()
+            num_rays_per_pass = min(num_rays_per_pass, max_rays_per_pass)
+            end_idx = min(start_idx + num_rays_per_pass, num_rays)
+            allocated_before = chunk_size.start_chunk(self.device) if chunk_size is not None else 0
+            try:
+                # move the chunk inputs to the model device
+                chunk_outputs = self.forward(ray_bundle=ray_bundle[start_idx:end_idx].to(self.device))
+            except RuntimeError as e:
+                if chunk_size is None or not is_out_of_memory_error(e):
+                    raise
+                retry_num_rays = chunk_size.backoff(num_rays, end_idx - start_idx, self.device)
+                if retry_num_rays is None:
+                    raise
+                num_rays_per_pass = retry_num_rays
+                continue
+            for output_name, output in chunk_outputs.items():  # type: ignore
                 if not isinstance(output, torch.Tensor):
                     # TODO: handle lists of tensors as well
                     continue
-                # move the chunk outputs from the model device back to the device of the inputs.
-                outputs_lists[output_name].append(output.to(input_device))
-        outputs = {}
-        for output_name, outputs_list in outputs_lists.items():
-            outputs[output_name] = torch.cat(outputs_list).view(image_height, image_width, -1)  # type: ignore
+                if output_name not in outputs:
+                    outputs[output_name] = output.new_empty(
+                        (num_rays, *output.shape[1:]), device=output_device or output.device
+                    )
+                outputs[output_name][start_idx:end_idx] = output
+            if chunk_size is not None:
+                num_rays_per_pass = chunk_size.grow(num_rays, end_idx - start_idx, self.device, allocated_before)
+            start_idx = end_idx
         return outputs
 
     def get_rgba_image(self, outputs: Dict[str, torch.Tensor], output_name: str = "rgb") -> torch.Tensor:
@@ -19,14 +19,15 @@ NeRF implementation that combines many recent advancements.
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Literal, Tuple, Type
+from typing import Dict, List, Literal, Optional, Tuple, Type
 
 import numpy as np
 import torch
+from torch import Tensor
 from torch.nn import Parameter
 
 from nerfstudio.cameras.camera_optimizers import CameraOptimizer, CameraOptimizerConfig
-from nerfstudio.cameras.rays import RayBundle, RaySamples
+from nerfstudio.cameras.rays import PackedRaySamples, RayBundle, RaySamples
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes, TrainingCallbackLocation
 from nerfstudio.field_components.field_heads import FieldHeadNames
 from nerfstudio.field_components.spatial_distortions import SceneContraction
@@ -40,12 +41,14 @@ from nerfstudio.model_components.losses import (
     pred_normal_loss,
     scale_gradients_by_distance_squared,
 )
+from nerfstudio.model_components.occupancy_grid import OccupancyBitfield
 from nerfstudio.model_components.ray_samplers import ProposalNetworkSampler, UniformSampler
 from nerfstudio.model_components.renderers import AccumulationRenderer, DepthRenderer, NormalsRenderer, RGBRenderer
 from nerfstudio.model_components.scene_colliders import NearFarCollider
 from nerfstudio.model_components.shaders import NormalsShader
 from nerfstudio.models.base_model import Model, ModelConfig
 from nerfstudio.utils import colormaps
+from nerfstudio.utils.cancellation import check_cancelled
 
 
 @dataclass
@@ -130,6 +133,26 @@ class NerfactoModelConfig(ModelConfig):
     """Average initial density output from MLP. """
     camera_optimizer: CameraOptimizerConfig = field(default_factory=lambda: CameraOptimizerConfig(mode="SO3xR3"))
     """Config of the camera optimizer to use"""
+    use_occupancy_grid: bool = True
+    """Whether to clip rays to the occupied space of the occupancy grid at inference. Has no effect until the grid is
+    baked with ns-bake-occupancy-grid."""
+    occupancy_grid_resolution: int = 128
+    """Number of cells along each side of a level of the occupancy grid."""
+    occupancy_grid_num_levels: int = 2
+    """Number of levels of the occupancy grid, each one covering twice the extent of the previous one."""
+    occupancy_grid_num_steps: int = 512
+    """Number of points per ray at which the occupancy grid is probed."""
+    use_sample_culling: bool = False
+    """Whether to only evaluate the samples that contribute to the render at inference. Rays stop being evaluated
+    once their transmittance falls below `sample_culling_weight_threshold`, and the color head only runs on samples
+    whose weight is above it."""
+    sample_culling_weight_threshold: float = 1e-4
+    """Weight below which samples are dropped when culling samples. Each dropped sample, and the transmittance left
+    after the last evaluated sample, weighs less than the threshold, so the color and accumulation of a ray are off
+    by at most about (number of samples + 1) times the threshold."""
+    sample_culling_num_segments: int = 4
+    """Number of segments along the rays in which densities are evaluated when culling samples. Rays whose
+    transmittance fell below the threshold are not evaluated in the next segments."""
 
 
 class NerfactoModel(Model):
@@ -204,6 +227,14 @@ class NerfactoModel(Model):
                 self.proposal_networks.append(network)
             self.density_fns.extend([network.density_fn for network in self.proposal_networks])
 
+        # Occupancy grid for empty space skipping at inference, baked after training.
+        self.occupancy_grid = OccupancyBitfield(
+            self.scene_box.aabb,
+            spatial_distortion=scene_contraction,
+            resolution=self.config.occupancy_grid_resolution,
+            num_levels=self.config.occupancy_grid_num_levels,
+        )
+
         # Samplers
         def update_schedule(step):
             return np.clip(
@@ -295,21 +326,120 @@ class NerfactoModel(Model):
             )
         return callbacks
 
+    @torch.no_grad()
+    def bake_occupancy_grid(self, alpha_threshold: float = 0.01) -> None:
+        """Bakes the occupancy grid from the proposal density fields.
+
+        Args:
+            alpha_threshold: Opacity of a cell above which it is occupied.
+        """
+        self.occupancy_grid.bake(
+            [network.density_fn for network in self.proposal_networks], alpha_threshold=alpha_threshold
+        )
+
+    def get_culled_field_outputs(
+        self, ray_samples: RaySamples
+    ) -> Tuple[Dict[FieldHeadNames, Tensor], Tensor, PackedRaySamples, Dict[FieldHeadNames, Tensor]]:
+        """Evaluates the field on the samples that contribute to the render, for inference.
+
+        Densities are evaluated segment by segment along the rays, and rays stop being evaluated once their
+        transmittance falls below the culling threshold. The samples whose weight is above the threshold are then
+        packed for the color head. Rendering the packed samples differs from rendering all of them by at most the
+        weights of the dropped samples and the transmittance left after the last evaluated sample: each one is below
+        the threshold, so the error of a ray is at most about (number of samples + 1) times the threshold.
+
+        Args:
+            ray_samples: Samples to evaluate the field on.
+
+        Returns:
+            Density (and normals) of all the samples and their weights, and the packed samples that contribute to the
+            render with the outputs of the color head.
+        """
+        assert ray_samples.deltas is not None
+        threshold = self.config.sample_culling_weight_threshold
+        num_rays, num_samples = ray_samples.shape
+        density = ray_samples.deltas.new_zeros((num_rays, num_samples, 1))
+        density_embedding = ray_samples.deltas.new_zeros((num_rays, num_samples, self.field.geo_feat_dim))
+        normals = ray_samples.deltas.new_zeros((num_rays, num_samples, 3))
+        evaluated = torch.zeros((num_rays, num_samples), dtype=torch.bool, device=density.device)
+        optical_depth = density.new_zeros((num_rays,))
+        ray_indices = torch.arange(num_rays, device=density.device)
+        for segment in torch.arange(num_samples).tensor_split(self.config.sample_culling_num_segments):
+            if ray_indices.numel() == 0 or segment.numel() == 0:
+                continue
+            check_cancelled()
+            start, end = int(segment[0]), int(segment[-1]) + 1
+            segment_samples = ray_samples[ray_indices, start:end]
+            if self.config.predict_normals:
+                with torch.enable_grad():
+                    segment_density, segment_embedding = self.field.get_density(segment_samples)
+                    normals[ray_indices, start:end] = self.field.get_normals()
+                segment_density = segment_density.detach()
+            else:
+                segment_density, segment_embedding = self.field.get_density(segment_samples)
+            density[ray_indices, start:end] = segment_density
+            density_embedding[ray_indices, start:end] = segment_embedding.to(density_embedding)
+            evaluated[ray_indices, start:end] = True
+            # early ray termination
+            assert segment_samples.deltas is not None
+            optical_depth[ray_indices] += (segment_density * segment_samples.deltas).sum(dim=(-2, -1))
+            ray_indices = ray_indices[torch.exp(-optical_depth[ray_indices]) > threshold]
+
+        weights = ray_samples.get_weights(density)
+        keep = weights[..., 0] > threshold
+        if self.renderer_rgb.background_color == "last_sample":
+            keep[..., -1] = evaluated[..., -1]
+        check_cancelled()
+        packed_samples = PackedRaySamples.from_dense(ray_samples, keep)
+        if len(packed_samples) > 0:
+            packed_outputs = self.field.get_outputs(
+                packed_samples.ray_samples, density_embedding=packed_samples.pack_values(density_embedding)
+            )
+        else:
+            # every sample is dropped, e.g. a chunk of empty space, and the field can't be evaluated on no samples
+            packed_outputs = {FieldHeadNames.RGB: density.new_zeros((0, 3))}
+            if self.config.predict_normals:
+                packed_outputs[FieldHeadNames.PRED_NORMALS] = density.new_zeros((0, 3))
+        field_outputs = {FieldHeadNames.DENSITY: density}
+        if self.config.predict_normals:
+            field_outputs[FieldHeadNames.NORMALS] = normals
+        return field_outputs, weights, packed_samples, packed_outputs
+
     def get_outputs(self, ray_bundle: RayBundle):
         # apply the camera optimizer pose tweaks
         if self.training:
             self.camera_optimizer.apply_to_raybundle(ray_bundle)
+        elif self.config.use_occupancy_grid and self.occupancy_grid.is_baked:
+            # skip the empty space in front of and behind the scene
+            ray_bundle = self.occupancy_grid.clip_ray_bundle(
+                ray_bundle, self.proposal_sampler.initial_sampler, self.config.occupancy_grid_num_steps
+            )
         ray_samples: RaySamples
         ray_samples, weights_list, ray_samples_list = self.proposal_sampler(ray_bundle, density_fns=self.density_fns)
-        field_outputs = self.field.forward(ray_samples, compute_normals=self.config.predict_normals)
-        if self.config.use_gradient_scaling:
-            field_outputs = scale_gradients_by_distance_squared(field_outputs, ray_samples)
-
-        weights = ray_samples.get_weights(field_outputs[FieldHeadNames.DENSITY])
+        if not self.training:
+            # stop a cancelled render between the proposal sampling and the field, which cost about the same
+            check_cancelled()
+        # samples that have colors, when only the ones contributing to the render are colored
+        packed_samples: Optional[PackedRaySamples] = None
+        packed_outputs: Dict[FieldHeadNames, Tensor] = {}
+        if not self.training and self.config.use_sample_culling:
+            field_outputs, weights, packed_samples, packed_outputs = self.get_culled_field_outputs(ray_samples)
+        else:
+            field_outputs = self.field.forward(ray_samples, compute_normals=self.config.predict_normals)
+            if self.config.use_gradient_scaling:
+                field_outputs = scale_gradients_by_distance_squared(field_outputs, ray_samples)
+            weights = ray_samples.get_weights(field_outputs[FieldHeadNames.DENSITY])
         weights_list.append(weights)
         ray_samples_list.append(ray_samples)
 
-        rgb = self.renderer_rgb(rgb=field_outputs[FieldHeadNames.RGB], weights=weights)
+        if packed_samples is not None:
+            rgb = self.renderer_rgb(
+                rgb=packed_outputs[FieldHeadNames.RGB],
+                weights=packed_samples.pack_values(weights),
+                packed_samples=packed_samples,
+            )
+        else:
+            rgb = self.renderer_rgb(rgb=field_outputs[FieldHeadNames.RGB], weights=weights)
         with torch.no_grad():
             depth = self.renderer_depth(weights=weights, ray_samples=ray_samples)
         expected_depth = self.renderer_expected_depth(weights=weights, ray_samples=ray_samples)
@@ -324,7 +454,14 @@ class NerfactoModel(Model):
 
         if self.config.predict_normals:
             normals = self.renderer_normals(normals=field_outputs[FieldHeadNames.NORMALS], weights=weights)
-            pred_normals = self.renderer_normals(field_outputs[FieldHeadNames.PRED_NORMALS], weights=weights)
+            if packed_samples is not None:
+                pred_normals = self.renderer_normals(
+                    packed_outputs[FieldHeadNames.PRED_NORMALS],
+                    weights=packed_samples.pack_values(weights),
+                    packed_samples=packed_samples,
+                )
+            else:
+                pred_normals = self.renderer_normals(field_outputs[FieldHeadNames.PRED_NORMALS], weights=weights)
             outputs["normals"] = self.normals_shader(normals)
             outputs["pred_normals"] = self.normals_shader(pred_normals)
         # These use a lot of GPU memory, so we avoid storing them for eval.
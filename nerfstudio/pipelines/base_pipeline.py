@@ -34,11 +34,13 @@ from torch.cuda.amp.grad_scaler import GradScaler
 from torch.nn import Parameter
 from torch.nn.parallel import DistributedDataParallel as DDP
 
+from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.configs.base_config import InstantiateConfig
 from nerfstudio.data.datamanagers.base_datamanager import DataManager, DataManagerConfig
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.models.base_model import Model, ModelConfig
 from nerfstudio.utils import profiler
+from nerfstudio.utils.chunking import group_cameras_by_num_rays
 
 
 def module_wrapper(ddp_or_model: Union[DDP, Model]) -> Model:
@@ -140,6 +142,7 @@ class Pipeline(nn.Module):
         model_outputs = self.model(ray_bundle, batch)
         metrics_dict = self.model.get_metrics_dict(model_outputs, batch)
         loss_dict = self.model.get_loss_dict(model_outputs, batch, metrics_dict)
+        self.datamanager.update_train_losses(batch, model_outputs)
 
         return model_outputs, loss_dict, metrics_dict
 
@@ -300,6 +303,7 @@ class VanillaPipeline(Pipeline):
         model_outputs = self._model(ray_bundle)  # train distributed data parallel model if world_size > 1
         metrics_dict = self.model.get_metrics_dict(model_outputs, batch)
         loss_dict = self.model.get_loss_dict(model_outputs, batch, metrics_dict)
+        self.datamanager.update_train_losses(batch, model_outputs)
 
         return model_outputs, loss_dict, metrics_dict
 
@@ -378,28 +382,35 @@ class VanillaPipeline(Pipeline):
         ) as progress:
             task = progress.add_task("[green]Evaluating all images...", total=num_images)
             idx = 0
-            for camera, batch in data_loader:
+            # Consecutive images are rendered together, so that small images share forward passes.
+            for group in group_cameras_by_num_rays(data_loader, self.model.config.eval_num_rays_per_chunk):
                 # time this the following line
-                inner_start = time()
-                outputs = self.model.get_outputs_for_camera(camera=camera)
-                height, width = camera.height, camera.width
-                num_rays = height * width
-                metrics_dict, image_dict = self.model.get_image_metrics_and_images(outputs, batch)
-                if output_path is not None:
-                    for key in image_dict.keys():
-                        image = image_dict[key]  # [H, W, C] order
-                        vutils.save_image(
-                            image.permute(2, 0, 1).cpu(), output_path / f"{image_prefix}_{key}_{idx:04d}.png"
-                        )
-
-                assert "num_rays_per_sec" not in metrics_dict
-                metrics_dict["num_rays_per_sec"] = (num_rays / (time() - inner_start)).item()
-                fps_str = "fps"
-                assert fps_str not in metrics_dict
-                metrics_dict[fps_str] = (metrics_dict["num_rays_per_sec"] / (height * width)).item()
-                metrics_dict_list.append(metrics_dict)
-                progress.advance(task)
-                idx = idx + 1
+                group_start = time()
+                group_outputs = self.model.get_outputs_for_cameras(Cameras.cat([camera for camera, _ in group]))
+                group_time = time() - group_start
+                group_num_rays = sum(int((camera.height * camera.width).item()) for camera, _ in group)
+                for (camera, batch), outputs in zip(group, group_outputs):
+                    inner_start = time()
+                    height, width = camera.height, camera.width
+                    num_rays = height * width
+                    metrics_dict, image_dict = self.model.get_image_metrics_and_images(outputs, batch)
+                    if output_path is not None:
+                        for key in image_dict.keys():
+                            image = image_dict[key]  # [H, W, C] order
+                            vutils.save_image(
+                                image.permute(2, 0, 1).cpu(), output_path / f"{image_prefix}_{key}_{idx:04d}.png"
+                            )
+
+                    # The images of a group share its render time in proportion to their number of rays.
+                    image_time = time() - inner_start + group_time * num_rays / group_num_rays
+                    assert "num_rays_per_sec" not in metrics_dict
+                    metrics_dict["num_rays_per_sec"] = (num_rays / image_time).item()
+                    fps_str = "fps"
+                    assert fps_str not in metrics_dict
+                    metrics_dict[fps_str] = (metrics_dict["num_rays_per_sec"] / (height * width)).item()
+                    metrics_dict_list.append(metrics_dict)
+                    progress.advance(task)
+                    idx = idx + 1
 
         metrics_dict = {}
         for key in metrics_dict_list[0].keys():
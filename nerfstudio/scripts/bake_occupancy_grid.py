@@ -0,0 +1,75 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+"""
+bake_occupancy_grid.py
+"""
+
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import torch
+import tyro
+
+from nerfstudio.utils.eval_utils import eval_setup
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+@dataclass
+class BakeOccupancyGrid:
+    """Bake the occupancy grid of a trained model and save it in its checkpoint. Rendering, evaluation and the viewer
+    then skip the empty space of the scene."""
+
+    # Path to config YAML file.
+    load_config: Path
+    # Opacity of a cell of the grid above which it is occupied. Lower values skip less space.
+    alpha_threshold: float = 0.01
+
+    def main(self) -> None:
+        """Main function."""
+        _, pipeline, checkpoint_path, _ = eval_setup(self.load_config, test_mode="inference")
+        model = pipeline.model
+        if not hasattr(model, "bake_occupancy_grid"):
+            CONSOLE.print(f"[bold red]{type(model).__name__} does not support occupancy grids.")
+            sys.exit(1)
+
+        with CONSOLE.status("[bold green]Baking occupancy grid..."):
+            model.bake_occupancy_grid(alpha_threshold=self.alpha_threshold)
+        for level, occupancy in enumerate(model.occupancy_grid.occupancy()):
+            CONSOLE.print(f"Level {level}: {occupancy * 100:.1f}% of the cells are occupied")
+
+        # Only replace the grid, the checkpoint keeps the optimizers to resume training.
+        checkpoint = torch.load(checkpoint_path, map_location="cpu")
+        for key, value in pipeline.state_dict().items():
+            if ".occupancy_grid." in key:
+                checkpoint["pipeline"][key] = value.cpu()
+        torch.save(checkpoint, checkpoint_path)
+        CONSOLE.print(f"Saved the occupancy grid to {checkpoint_path}")
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BakeOccupancyGrid).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BakeOccupancyGrid)  # noqa
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+benchmark_hash_encoding.py
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+import torch
+import tyro
+from rich.table import Table
+
+from nerfstudio.field_components.encodings import HashEncoding
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+@dataclass
+class BenchmarkHashEncoding:
+    """Compare the fused torch hash encoding with the reference implementation, forward only and forward and
+    backward."""
+
+    # Numbers of points to encode.
+    batch_sizes: Tuple[int, ...] = (4096, 65536, 262144)
+    # Number of timed iterations per configuration.
+    num_iters: int = 5
+    # Number of levels of the hash grid.
+    num_levels: int = 16
+    # Size of each hash table is 2^log2_hashmap_size.
+    log2_hashmap_size: int = 19
+    # Device to run on. Defaults to cuda if available.
+    device: Optional[str] = None
+
+    def main(self) -> None:
+        """Main function."""
+        device = torch.device(self.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        encoding = HashEncoding(
+            num_levels=self.num_levels, log2_hashmap_size=self.log2_hashmap_size, implementation="torch"
+        ).to(device)
+
+        def time_fn(fn: Callable[[], object]) -> float:
+            fn()
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+            start = time.perf_counter()
+            for _ in range(self.num_iters):
+                fn()
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+            return (time.perf_counter() - start) / self.num_iters * 1e3
+
+        table = Table(title=f"Hash encoding on {device}")
+        table.add_column("Points", justify="right")
+        table.add_column("Pass")
+        table.add_column("Reference (ms)", justify="right")
+        table.add_column("Fused (ms)", justify="right")
+        table.add_column("Speedup", justify="right")
+        table.add_column("Max abs. diff.", justify="right")
+        for batch_size in self.batch_sizes:
+            positions = torch.rand((batch_size, 3), device=device)
+            with torch.no_grad():
+                max_diff = (encoding.pytorch_fwd(positions) - encoding.fused_fwd(positions)).abs().max().item()
+            for name, grad in (("forward", False), ("forward + backward", True)):
+
+                def run(fwd: Callable[[torch.Tensor], torch.Tensor]) -> Callable[[], None]:
+                    def fn() -> None:
+                        with torch.set_grad_enabled(grad):
+                            encoded = fwd(positions)
+                            if grad:
+                                encoded.sum().backward()
+
+                    return fn
+
+                reference_ms = time_fn(run(encoding.pytorch_fwd))
+                fused_ms = time_fn(run(encoding.fused_fwd))
+                table.add_row(
+                    str(batch_size),
+                    name,
+                    f"{reference_ms:.2f}",
+                    f"{fused_ms:.2f}",
+                    f"{reference_ms / fused_ms:.2f}x",
+                    f"{max_diff:.1e}",
+                )
+        CONSOLE.print(table)
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkHashEncoding).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkHashEncoding)  # noqa
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+benchmark_image_decoders.py
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import tyro
+from rich.table import Table
+
+from nerfstudio.data.utils.image_decoders import IMAGE_DECODERS, ImageDecoderName, get_image_decoder
+from nerfstudio.utils.rich_utils import CONSOLE
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".jpe", ".png")
+
+
+@dataclass
+class BenchmarkImageDecoders:
+    """Measure how many images per second each image decoder loads from a folder of images."""
+
+    # Folder with the images, e.g. the images folder of a processed dataset.
+    data: Path
+    # Number of images to decode per configuration.
+    num_images: int = 20
+    # Scale factors to benchmark.
+    scale_factors: Tuple[float, ...] = (1.0, 0.5, 0.25)
+    # Decoders to benchmark. Decoders that are not installed are skipped.
+    decoders: Tuple[ImageDecoderName, ...] = tuple(IMAGE_DECODERS)  # type: ignore
+
+    def main(self) -> None:
+        """Main function."""
+        filepaths = sorted(p for p in self.data.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)[: self.num_images]
+        if len(filepaths) == 0:
+            CONSOLE.print(f"[bold red]No images found in {self.data}")
+            return
+
+        table = Table(title=f"Decoding {len(filepaths)} images from {self.data}")
+        table.add_column("Decoder")
+        table.add_column("Scale factor", justify="right")
+        table.add_column("Reduced decoding")
+        table.add_column("Images/s", justify="right")
+        table.add_column("Mean abs. diff. to PIL", justify="right")
+        for scale_factor in self.scale_factors:
+            # Reference images from the full resolution decode with Pillow.
+            reference_decoder = get_image_decoder("pil", reduced_decoding=False)
+            references = [reference_decoder.decode(filepath, scale_factor) for filepath in filepaths]
+            for name in self.decoders:
+                for reduced_decoding in (False, True):
+                    try:
+                        decoder = get_image_decoder(name, reduced_decoding=reduced_decoding)
+                    except ImportError as e:
+                        CONSOLE.print(f"[bold yellow]Skipping {name}: {e}")
+                        break
+                    start = time.perf_counter()
+                    images = [decoder.decode(filepath, scale_factor) for filepath in filepaths]
+                    images_per_second = len(filepaths) / (time.perf_counter() - start)
+                    diffs = [
+                        np.abs(image.astype(np.float32) - reference.astype(np.float32)).mean()
+                        if image.shape == reference.shape
+                        else np.nan
+                        for image, reference in zip(images, references)
+                    ]
+                    table.add_row(
+                        name,
+                        f"{scale_factor:g}",
+                        str(reduced_decoding),
+                        f"{images_per_second:.1f}",
+                        f"{np.mean(diffs):.2f}",
+                    )
+        CONSOLE.print(table)
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkImageDecoders).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkImageDecoders)  # noqa
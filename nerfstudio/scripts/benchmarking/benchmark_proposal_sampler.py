@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+benchmark_proposal_sampler.py
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import torch
+import tyro
+from rich.table import Table
+from torch import Tensor
+
+from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+from nerfstudio.fields.density_fields import HashMLPDensityField
+from nerfstudio.model_components.ray_samplers import ProposalNetworkSampler
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+@dataclass
+class BenchmarkProposalSampler:
+    """Compare the inference pipeline of the proposal network sampler with the training one under no_grad, with
+    nerfacto's default sampling."""
+
+    # Number of rays to sample.
+    num_rays: int = 4096
+    # Number of samples per ray of each proposal level.
+    num_proposal_samples_per_ray: Tuple[int, ...] = (256, 96)
+    # Number of samples per ray of the nerf.
+    num_nerf_samples_per_ray: int = 48
+    # Number of timed iterations per configuration.
+    num_iters: int = 10
+    # Device to run on. Defaults to cuda if available.
+    device: Optional[str] = None
+
+    def main(self) -> None:
+        """Main function."""
+        device = torch.device(self.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        num_levels = len(self.num_proposal_samples_per_ray)
+        sampler = ProposalNetworkSampler(
+            num_proposal_samples_per_ray=self.num_proposal_samples_per_ray,
+            num_nerf_samples_per_ray=self.num_nerf_samples_per_ray,
+            num_proposal_network_iterations=num_levels,
+            single_jitter=True,
+        ).eval()
+        ray_bundle = RayBundle(
+            origins=torch.zeros((self.num_rays, 3), device=device),
+            directions=torch.nn.functional.normalize(torch.randn((self.num_rays, 3), device=device), dim=-1),
+            pixel_area=torch.ones((self.num_rays, 1), device=device),
+            camera_indices=torch.zeros((self.num_rays, 1), dtype=torch.int64, device=device),
+            nears=torch.full((self.num_rays, 1), 0.05, device=device),
+            fars=torch.full((self.num_rays, 1), 1000.0, device=device),
+        )
+
+        def sphere_density(positions: Tensor) -> Tensor:
+            return 50.0 * torch.exp(-20.0 * (torch.linalg.norm(positions, dim=-1, keepdim=True) - 1.0) ** 2)
+
+        aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]], device=device)
+        implementation = "tcnn" if device.type == "cuda" else "torch"
+        networks = [
+            HashMLPDensityField(
+                aabb, spatial_distortion=SceneContraction(order=float("inf")), implementation=implementation
+            ).to(device)
+            for _ in range(num_levels)
+        ]
+        density_fns_list: List[Tuple[str, List[Callable]]] = [
+            ("analytic", [sphere_density] * num_levels),
+            ("hash grid", [network.density_fn for network in networks]),
+        ]
+
+        def time_fn(density_fns: List[Callable]) -> float:
+            with torch.no_grad():
+                sampler(ray_bundle, density_fns=density_fns)
+                if device.type == "cuda":
+                    torch.cuda.synchronize(device)
+                start = time.perf_counter()
+                for _ in range(self.num_iters):
+                    sampler(ray_bundle, density_fns=density_fns)
+                if device.type == "cuda":
+                    torch.cuda.synchronize(device)
+            return (time.perf_counter() - start) / self.num_iters * 1e3
+
+        table = Table(title=f"Proposal sampling of {self.num_rays} rays on {device}")
+        table.add_column("Density")
+        table.add_column("Training pipeline (ms)", justify="right")
+        table.add_column("Inference pipeline (ms)", justify="right")
+        table.add_column("Speedup", justify="right")
+        for name, density_fns in density_fns_list:
+            sampler.use_inference_pipeline = False
+            reference_ms = time_fn(density_fns)
+            sampler.use_inference_pipeline = True
+            inference_ms = time_fn(density_fns)
+            table.add_row(name, f"{reference_ms:.2f}", f"{inference_ms:.2f}", f"{reference_ms / inference_ms:.2f}x")
+        CONSOLE.print(table)
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkProposalSampler).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkProposalSampler)  # noqa
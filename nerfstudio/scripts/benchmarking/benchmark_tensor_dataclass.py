@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+benchmark_tensor_dataclass.py
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import torch
+import tyro
+from rich.table import Table
+
+from nerfstudio.cameras.rays import Frustums, RayBundle, RaySamples
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+def _time(fn: Callable[[], object], num_iters: int, device: torch.device) -> float:
+    """Returns the mean time of a call in microseconds."""
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(num_iters):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return (time.perf_counter() - start) / num_iters * 1e6
+
+
+@dataclass
+class BenchmarkTensorDataclass:
+    """Measure the overhead of constructing, slicing and moving ray bundles and ray samples."""
+
+    # Number of rays in the ray bundle.
+    num_rays: int = 4096
+    # Number of samples per ray.
+    num_samples: int = 48
+    # Number of rays per slice, like the chunks rendered by get_outputs_for_camera_ray_bundle.
+    chunk_size: int = 1024
+    # Number of timed iterations per operation.
+    num_iters: int = 100
+    # Device to move the ray bundle to. Defaults to cuda if available.
+    device: Optional[str] = None
+
+    def main(self) -> None:
+        """Main function."""
+        device = torch.device(self.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        ones = torch.ones((self.num_rays, 1))
+        ray_bundle = RayBundle(
+            origins=torch.rand((self.num_rays, 3)),
+            directions=torch.rand((self.num_rays, 3)),
+            pixel_area=ones,
+            camera_indices=torch.zeros((self.num_rays, 1), dtype=torch.int64),
+            nears=ones * 0.05,
+            fars=ones * 1000.0,
+            metadata={"directions_norm": ones},
+        )
+        packed_ray_bundle = ray_bundle.pack()
+        bins = torch.linspace(0.0, 1.0, self.num_samples + 1).expand(self.num_rays, -1)[..., None]
+
+        def construct_ray_bundle(constructor: Callable[..., RayBundle]) -> Callable[[], RayBundle]:
+            return lambda: constructor(
+                origins=ray_bundle.origins,
+                directions=ray_bundle.directions,
+                pixel_area=ray_bundle.pixel_area,
+                camera_indices=ray_bundle.camera_indices,
+            )
+
+        def construct_ray_samples(unchecked: bool) -> Callable[[], RaySamples]:
+            shape = (self.num_rays, self.num_samples)
+
+            def construct() -> RaySamples:
+                fields = dict(
+                    origins=ray_bundle.origins[:, None].expand(*shape, 3),
+                    directions=ray_bundle.directions[:, None].expand(*shape, 3),
+                    starts=bins[:, :-1],
+                    ends=bins[:, 1:],
+                    pixel_area=ray_bundle.pixel_area[:, None].expand(*shape, 1),
+                )
+                if unchecked:
+                    frustums = Frustums.construct_unchecked(shape, **fields)
+                    return RaySamples.construct_unchecked(shape, frustums=frustums)
+                return RaySamples(frustums=Frustums(**fields))
+
+            return construct
+
+        num_chunks = (self.num_rays + self.chunk_size - 1) // self.chunk_size
+        ray_indices = torch.randint(0, self.num_rays, (self.chunk_size,))
+
+        def slice_chunks(bundle: RayBundle) -> Callable[[], None]:
+            def run() -> None:
+                for i in range(0, self.num_rays, self.chunk_size):
+                    bundle[i : i + self.chunk_size]
+
+            return run
+
+        def slice_and_move_chunks(bundle: RayBundle) -> Callable[[], None]:
+            def run() -> None:
+                for i in range(0, self.num_rays, self.chunk_size):
+                    bundle[i : i + self.chunk_size].to(device)
+
+            return run
+
+        rows = [
+            ("Construct RayBundle", construct_ray_bundle(RayBundle), None),
+            (
+                "Construct RayBundle",
+                construct_ray_bundle(lambda **fields: RayBundle.construct_unchecked((self.num_rays,), **fields)),
+                "construct_unchecked",
+            ),
+            ("Construct RaySamples", construct_ray_samples(False), None),
+            ("Construct RaySamples", construct_ray_samples(True), "construct_unchecked"),
+            (f"Slice {num_chunks} chunks", slice_chunks(ray_bundle), None),
+            (f"Slice {num_chunks} chunks", slice_chunks(packed_ray_bundle), "packed"),
+            (f"Gather {self.chunk_size} random rays", lambda: ray_bundle[ray_indices], None),
+            (f"Gather {self.chunk_size} random rays", lambda: packed_ray_bundle[ray_indices], "packed"),
+            (f"Slice {num_chunks} chunks and move to {device}", slice_and_move_chunks(ray_bundle), None),
+            (f"Slice {num_chunks} chunks and move to {device}", slice_and_move_chunks(packed_ray_bundle), "packed"),
+            ("Pack RayBundle", ray_bundle.pack, None),
+        ]
+
+        table = Table(title=f"TensorDataclass operations on {self.num_rays} rays")
+        table.add_column("Operation")
+        table.add_column("Variant")
+        table.add_column("Time (us)", justify="right")
+        for name, fn, variant in rows:
+            table.add_row(name, variant or "default", f"{_time(fn, self.num_iters, device):.1f}")
+        CONSOLE.print(table)
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkTensorDataclass).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkTensorDataclass)  # noqa
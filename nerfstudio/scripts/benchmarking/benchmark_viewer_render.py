@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+benchmark_viewer_render.py
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, ContextManager, Optional, Tuple
+
+import torch
+import tyro
+from rich.table import Table
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.models.base_model import Model
+from nerfstudio.models.nerfacto import NerfactoModelConfig
+from nerfstudio.utils.cancellation import CancellationToken, RenderCancelledException, cancellation_context
+from nerfstudio.utils.eval_utils import eval_setup
+from nerfstudio.utils.rich_utils import CONSOLE
+from nerfstudio.viewer_legacy.server import viewer_utils
+
+
+@dataclass
+class BenchmarkViewerRender:
+    """Compare the frame times of viewer renders interruptible by line tracing, as the viewer used to do, and by
+    cancellation tokens checked between chunks of rays, and how long each takes to stop a cancelled render."""
+
+    # Path to the config YAML file of a trained model. Defaults to an untrained nerfacto model.
+    load_config: Optional[Path] = None
+    # Heights of the rendered frames, with an aspect ratio of 16:9.
+    image_heights: Tuple[int, ...] = (90, 180)
+    # Number of timed frames per configuration.
+    num_iters: int = 3
+    # Device to run on. Defaults to cuda if available.
+    device: Optional[str] = None
+
+    def main(self) -> None:
+        """Main function."""
+        if self.load_config is not None:
+            _, pipeline, _, _ = eval_setup(self.load_config, test_mode="inference")
+            model = pipeline.model
+        else:
+            device = torch.device(self.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+            implementation = "tcnn" if device.type == "cuda" else "torch"
+            model = NerfactoModelConfig(implementation=implementation).setup(
+                scene_box=SceneBox(aabb=torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])), num_train_data=1
+            )
+            model.to(device)
+        model.eval()
+        device = model.device
+        token = CancellationToken()
+
+        def check_interrupt(frame, event, arg):
+            # Same work per line as the trace function the viewer used to install.
+            if event == "line" and token.cancelled:
+                raise RenderCancelledException
+            return check_interrupt
+
+        interruptions: Tuple[Tuple[str, Callable[[], ContextManager]], ...] = (
+            ("none", contextlib.nullcontext),
+            ("line tracing", lambda: viewer_utils.SetTrace(check_interrupt)),
+            ("cancellation token", lambda: cancellation_context(token)),
+        )
+
+        def render(model: Model, camera: Cameras, interruption: Callable[[], ContextManager]) -> None:
+            with torch.no_grad(), interruption():
+                model.get_outputs_for_camera(camera)
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+
+        def time_cancel(model: Model, camera: Cameras, interruption: Callable[[], ContextManager], delay: float):
+            """Returns the time between cancelling a render after `delay` seconds and the render stopping."""
+            token.reset()
+            stopped = []
+
+            def target() -> None:
+                try:
+                    render(model, camera, interruption)
+                except RenderCancelledException:
+                    pass
+                stopped.append(time.perf_counter())
+
+            thread = threading.Thread(target=target)
+            thread.start()
+            time.sleep(delay)
+            cancelled = time.perf_counter()
+            token.cancel()
+            thread.join()
+            token.reset()
+            return max(stopped[0] - cancelled, 0.0)
+
+        table = Table(title=f"Viewer renders on {device}")
+        table.add_column("Resolution")
+        table.add_column("Interruption")
+        table.add_column("Frame time (ms)", justify="right")
+        table.add_column("Overhead", justify="right")
+        table.add_column("Cancel latency (ms)", justify="right")
+        for image_height in self.image_heights:
+            image_width = image_height * 16 // 9
+            camera = Cameras(
+                camera_to_worlds=torch.eye(4)[None, :3],
+                fx=float(image_height),
+                fy=float(image_height),
+                cx=image_width / 2.0,
+                cy=image_height / 2.0,
+                width=image_width,
+                height=image_height,
+            ).to(device)
+            reference_ms = None
+            for name, interruption in interruptions:
+                render(model, camera, interruption)
+                start = time.perf_counter()
+                for _ in range(self.num_iters):
+                    render(model, camera, interruption)
+                frame_ms = (time.perf_counter() - start) / self.num_iters * 1e3
+                reference_ms = reference_ms or frame_ms
+                latency = "-"
+                if name != "none":
+                    # Cancel halfway through the frame, as when the camera moves during a render.
+                    latency_ms = time_cancel(model, camera, interruption, frame_ms / 2e3) * 1e3
+                    latency = f"{latency_ms:.1f}"
+                table.add_row(
+                    f"{image_width}x{image_height}",
+                    name,
+                    f"{frame_ms:.1f}",
+                    f"{frame_ms / reference_ms:.2f}x",
+                    latency,
+                )
+        CONSOLE.print(table)
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkViewerRender).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BenchmarkViewerRender)  # noqa
@@ -40,10 +40,15 @@ class ComputePSNR:
     output_path: Path = Path("output.json")
     # Optional path to save rendered outputs to.
     render_output_path: Optional[Path] = None
+    # Whether to grow the number of rays per chunk while there is free GPU memory and to shrink it after running out
+    # of memory. If None, use the value in the config file.
+    adaptive_eval_num_rays_per_chunk: Optional[bool] = None
 
     def main(self) -> None:
         """Main function."""
-        config, pipeline, checkpoint_path, _ = eval_setup(self.load_config)
+        config, pipeline, checkpoint_path, _ = eval_setup(
+            self.load_config, adaptive_eval_num_rays_per_chunk=self.adaptive_eval_num_rays_per_chunk
+        )
         assert self.output_path.suffix == ".json"
         if self.render_output_path is not None:
             self.render_output_path.mkdir(parents=True, exist_ok=True)
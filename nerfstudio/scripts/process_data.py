@@ -25,6 +25,7 @@ import numpy as np
 import tyro
 from typing_extensions import Annotated
 
+from nerfstudio.data.utils.dataset_archive import ARCHIVE_SUFFIX, pack_dataset
 from nerfstudio.process_data import (
     metashape_utils,
     odm_utils,
@@ -504,6 +505,38 @@ class ProcessODM(BaseConverterToNerfstudioDataset):
         CONSOLE.rule()
 
 
+@dataclass
+class PackDataset:
+    """Pack a processed nerfstudio dataset into a single file.
+
+    This script does the following:
+
+    1. Collects the transforms.json and every image, mask, depth and point cloud file it references, including
+       downscaled copies.
+    2. Writes them to one indexed archive, which can be used as the `--data` of the nerfstudio dataparser.
+    """
+
+    data: Path
+    """Path to the nerfstudio dataset directory."""
+    output_path: Optional[Path] = None
+    """Path of the archive. Defaults to the dataset directory with a .nspack suffix."""
+    transforms_filename: str = "transforms.json"
+    """Name of the transforms file in the dataset directory."""
+    max_workers: Optional[int] = None
+    """Number of threads reading files."""
+
+    def main(self) -> None:
+        """Pack the dataset."""
+        if not (self.data / self.transforms_filename).exists():
+            raise ValueError(f"{self.data / self.transforms_filename} doesn't exist")
+        output_path = self.output_path or self.data.with_suffix(ARCHIVE_SUFFIX)
+        archive = pack_dataset(self.data, output_path, self.transforms_filename, max_workers=self.max_workers)
+
+        CONSOLE.rule("[bold green]:tada: :tada: :tada: All DONE :tada: :tada: :tada:")
+        CONSOLE.print(f"Packed {len(archive.files)} files into {output_path}", justify="center")
+        CONSOLE.rule()
+
+
 @dataclass
 class NotInstalled:
     def main(self) -> None: ...
@@ -517,6 +550,7 @@ Commands = Union[
     Annotated[ProcessRealityCapture, tyro.conf.subcommand(name="realitycapture")],
     Annotated[ProcessRecord3D, tyro.conf.subcommand(name="record3d")],
     Annotated[ProcessODM, tyro.conf.subcommand(name="odm")],
+    Annotated[PackDataset, tyro.conf.subcommand(name="pack")],
 ]
 
 # Add aria subcommand if projectaria_tools is installed.
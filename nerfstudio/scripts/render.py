@@ -56,6 +56,7 @@ from nerfstudio.engine.trainer import TrainerConfig
 from nerfstudio.model_components import renderers
 from nerfstudio.pipelines.base_pipeline import Pipeline
 from nerfstudio.utils import colormaps, install_checks
+from nerfstudio.utils.chunking import group_cameras_by_num_rays
 from nerfstudio.utils.eval_utils import eval_setup
 from nerfstudio.utils.rich_utils import CONSOLE, ItersPerSecColumn
 from nerfstudio.utils.scripts import run_command
@@ -423,6 +424,9 @@ class BaseRender:
     """Scaling factor to apply to the camera image resolution."""
     eval_num_rays_per_chunk: Optional[int] = None
     """Specifies number of rays per chunk during eval. If None, use the value in the config file."""
+    adaptive_eval_num_rays_per_chunk: Optional[bool] = None
+    """Whether to grow the number of rays per chunk while there is free GPU memory and to shrink it after running out
+    of memory. If None, use the value in the config file."""
     rendered_output_names: List[str] = field(default_factory=lambda: ["rgb"])
     """Name of the renderer outputs to use. rgb, depth, etc. concatenates them along y axis"""
     depth_near_plane: Optional[float] = None
@@ -437,6 +441,15 @@ class BaseRender:
     """If true, checks line-of-sight occlusions when computing camera distance and rejects cameras not visible to each other"""
     camera_idx: Optional[int] = None
     """Index of the training camera to render."""
+    use_occupancy_grid: Optional[bool] = None
+    """Whether to skip empty space with the baked occupancy grid of models that have one. If None, use the value in
+    the config file."""
+
+    def update_model_config(self, config: TrainerConfig) -> TrainerConfig:
+        """Applies the render options that override the model config."""
+        if self.use_occupancy_grid is not None and hasattr(config.pipeline.model, "use_occupancy_grid"):
+            setattr(config.pipeline.model, "use_occupancy_grid", self.use_occupancy_grid)
+        return config
 
 
 @dataclass
@@ -453,7 +466,9 @@ class RenderCameraPath(BaseRender):
         _, pipeline, _, _ = eval_setup(
             self.load_config,
             eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+            adaptive_eval_num_rays_per_chunk=self.adaptive_eval_num_rays_per_chunk,
             test_mode="inference",
+            update_config_callback=self.update_model_config,
         )
 
         install_checks.check_ffmpeg_installed()
@@ -608,7 +623,9 @@ class RenderInterpolated(BaseRender):
         _, pipeline, _, _ = eval_setup(
             self.load_config,
             eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+            adaptive_eval_num_rays_per_chunk=self.adaptive_eval_num_rays_per_chunk,
             test_mode="test",
+            update_config_callback=self.update_model_config,
         )
 
         install_checks.check_ffmpeg_installed()
@@ -665,7 +682,9 @@ class SpiralRender(BaseRender):
         _, pipeline, _, _ = eval_setup(
             self.load_config,
             eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+            adaptive_eval_num_rays_per_chunk=self.adaptive_eval_num_rays_per_chunk,
             test_mode="test",
+            update_config_callback=self.update_model_config,
         )
 
         install_checks.check_ffmpeg_installed()
@@ -747,11 +766,12 @@ class DatasetRender(BaseRender):
             if self.downscale_factor is not None:
                 assert hasattr(data_manager_config.dataparser, "downscale_factor")
                 setattr(data_manager_config.dataparser, "downscale_factor", self.downscale_factor)
-            return config
+            return self.update_model_config(config)
 
         config, pipeline, _, _ = eval_setup(
             self.load_config,
             eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+            adaptive_eval_num_rays_per_chunk=self.adaptive_eval_num_rays_per_chunk,
             test_mode="inference",
             update_config_callback=update_config,
         )
@@ -781,6 +801,16 @@ class DatasetRender(BaseRender):
                 num_workers=datamanager.world_size * 4,
             )
             images_root = Path(os.path.commonpath(dataparser_outputs.image_filenames))
+
+            def render_images(dataloader: FixedIndicesEvalDataloader):
+                # Consecutive images are rendered together, so that small images share forward passes.
+                for group in group_cameras_by_num_rays(dataloader, pipeline.model.config.eval_num_rays_per_chunk):
+                    with torch.no_grad():
+                        cameras = Cameras.cat([camera for camera, _ in group])
+                        group_outputs = pipeline.model.get_outputs_for_cameras(cameras)
+                    for (_, batch), outputs in zip(group, group_outputs):
+                        yield batch, outputs
+
             with Progress(
                 TextColumn(f":movie_camera: Rendering split {split} :movie_camera:"),
                 BarColumn(),
@@ -792,9 +822,10 @@ class DatasetRender(BaseRender):
                 TimeRemainingColumn(elapsed_when_finished=False, compact=False),
                 TimeElapsedColumn(),
             ) as progress:
-                for camera_idx, (camera, batch) in enumerate(progress.track(dataloader, total=len(dataset))):
+                for camera_idx, (batch, outputs) in enumerate(
+                    progress.track(render_images(dataloader), total=len(dataset))
+                ):
                     with torch.no_grad():
-                        outputs = pipeline.model.get_outputs_for_camera(camera)
                         if self.rendered_output_names is not None and "rgba" in self.rendered_output_names:
                             rgba = pipeline.model.get_rgba_image(outputs=outputs, output_name="rgb")
                             outputs["rgba"] = rgba
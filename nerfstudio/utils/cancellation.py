@@ -0,0 +1,82 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cooperative cancellation of renders, e.g. of the viewer when the camera moves.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+from typing import Generator, Optional
+
+
+class RenderCancelledException(Exception):
+    """Raised at a checkpoint of a render whose token was cancelled."""
+
+
+class CancellationToken:
+    """Flag that another thread sets to stop a render at its next checkpoint."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """Returns whether the render was cancelled."""
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """Asks the render to stop at its next checkpoint."""
+        self._event.set()
+
+    def reset(self) -> None:
+        """Clears the flag before the next render."""
+        self._event.clear()
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def cancellation_context(token: CancellationToken) -> Generator[CancellationToken, None, None]:
+    """Context manager making `check_cancelled` raise once `token` is cancelled, in the current thread only, so that
+    renders of other threads, e.g. evaluations of the trainer, are not stopped.
+
+    Args:
+        token: Token of the render.
+    """
+    old_token = getattr(_local, "token", None)
+    try:
+        _local.token = token
+        yield token
+    finally:
+        _local.token = old_token
+
+
+def is_cancellable() -> bool:
+    """Returns whether the render of the current thread can be cancelled, i.e. runs in a `cancellation_context`."""
+    return getattr(_local, "token", None) is not None
+
+
+def check_cancelled() -> None:
+    """Checkpoint of a render: raises RenderCancelledException if the token of the current thread was cancelled.
+
+    Call it between units of work, e.g. chunks of rays or the density and color heads of a field, it only reads a
+    flag.
+    """
+    token: Optional[CancellationToken] = getattr(_local, "token", None)
+    if token is not None and token.cancelled:
+        raise RenderCancelledException
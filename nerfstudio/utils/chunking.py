@@ -0,0 +1,166 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Chunk sizes and camera groups for rendering rays in several forward passes.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import torch
+
+from nerfstudio.utils.rich_utils import CONSOLE
+
+if TYPE_CHECKING:
+    from nerfstudio.cameras.cameras import Cameras
+
+T = TypeVar("T")
+
+
+def is_out_of_memory_error(error: BaseException) -> bool:
+    """Returns whether an error was raised by an allocator running out of memory, on the GPU or the CPU."""
+    if isinstance(error, torch.cuda.OutOfMemoryError):
+        return True
+    message = str(error)
+    return isinstance(error, RuntimeError) and ("out of memory" in message or "can't allocate memory" in message)
+
+
+def group_cameras_by_num_rays(
+    cameras_and_data: Iterable[Tuple[Cameras, T]], num_rays_per_group: int
+) -> Iterator[List[Tuple[Cameras, T]]]:
+    """Groups consecutive cameras, e.g. the images of an eval dataloader, to render them in one call to
+    `Model.get_outputs_for_cameras`. A group is complete once it holds `num_rays_per_group` rays, so small images
+    share forward passes while large images are rendered on their own and the outputs of a group stay small.
+
+    Args:
+        cameras_and_data: Cameras with any data that goes with them, such as the ground truth batch.
+        num_rays_per_group: Number of rays after which a group is complete.
+
+    Yields:
+        Lists of consecutive cameras with their data, in order.
+    """
+    group: List[Tuple[Cameras, T]] = []
+    num_rays = 0
+    for camera, data in cameras_and_data:
+        group.append((camera, data))
+        num_rays += int((camera.height * camera.width).sum().item())
+        if num_rays >= num_rays_per_group:
+            yield group
+            group = []
+            num_rays = 0
+    if group:
+        yield group
+
+
+@dataclass
+class ChunkSizeState:
+    """What is known about the chunk sizes for one key."""
+
+    num_rays: int
+    """Largest number of rays per chunk that rendered without running out of memory."""
+    limit: Optional[int] = None
+    """Smallest number of rays per chunk that ran out of memory."""
+
+
+class AdaptiveChunkSize:
+    """Picks the number of rays per forward pass, separately for each key (e.g. each resolution).
+
+    Chunks start at `initial_num_rays` and grow geometrically after every full chunk, as long as the free memory of
+    the device is enough for the next size. The memory used by a chunk is estimated from the memory the caching
+    allocator keeps reserved after it, which is an upper bound of its peak. After an out of memory error, the
+    failed chunk is retried at half the size and sizes from the failed one up are never tried again for that key.
+    On devices without memory statistics, chunks don't grow but still back off.
+
+    Args:
+        initial_num_rays: Number of rays of the first chunk of each key.
+        max_num_rays: Largest number of rays per chunk.
+        min_num_rays: Smallest number of rays per chunk. Running out of memory at this size raises the error.
+        growth_factor: Factor by which chunks grow.
+        memory_fraction: Fraction of the free memory that a chunk may use.
+    """
+
+    def __init__(
+        self,
+        initial_num_rays: int,
+        max_num_rays: int,
+        min_num_rays: int = 64,
+        growth_factor: int = 2,
+        memory_fraction: float = 0.8,
+    ):
+        self.initial_num_rays = initial_num_rays
+        self.max_num_rays = max(max_num_rays, initial_num_rays)
+        self.min_num_rays = min(min_num_rays, initial_num_rays)
+        self.growth_factor = growth_factor
+        self.memory_fraction = memory_fraction
+        self.states: Dict[Hashable, ChunkSizeState] = {}
+
+    def get(self, key: Hashable) -> int:
+        """Returns the number of rays per chunk to start rendering `key` with."""
+        if key not in self.states:
+            self.states[key] = ChunkSizeState(num_rays=self.initial_num_rays)
+        return self.states[key].num_rays
+
+    def start_chunk(self, device: torch.device) -> int:
+        """Returns the memory allocated on the device before a chunk, to pass to `grow`."""
+        return torch.cuda.memory_allocated(device) if device.type == "cuda" else 0
+
+    def grow(self, key: Hashable, num_rays: int, device: torch.device, allocated_before: int) -> int:
+        """Records that a chunk of `num_rays` rays rendered and returns the size of the next chunk.
+
+        Args:
+            key: Key of the render.
+            num_rays: Number of rays of the chunk that rendered.
+            device: Device the chunk was rendered on.
+            allocated_before: Value returned by `start_chunk` before the chunk.
+        """
+        state = self.states[key]
+        if num_rays < state.num_rays:
+            # A partial chunk at the end of the rays says nothing about larger ones.
+            return state.num_rays
+        state.num_rays = num_rays
+        if device.type != "cuda":
+            return num_rays
+        next_num_rays = min(num_rays * self.growth_factor, self.max_num_rays)
+        if state.limit is not None:
+            next_num_rays = min(next_num_rays, state.limit - 1)
+        chunk_memory = max(torch.cuda.memory_reserved(device) - allocated_before, 1)
+        free_memory, _ = torch.cuda.mem_get_info(device)
+        available_memory = free_memory + torch.cuda.memory_reserved(device) - torch.cuda.memory_allocated(device)
+        affordable_num_rays = int(self.memory_fraction * available_memory / chunk_memory * num_rays)
+        state.num_rays = max(num_rays, min(next_num_rays, affordable_num_rays))
+        return state.num_rays
+
+    def backoff(self, key: Hashable, num_rays: int, device: torch.device) -> Optional[int]:
+        """Records that a chunk of `num_rays` rays ran out of memory and returns the size to retry it with, or None
+        if chunks can't get any smaller.
+
+        Args:
+            key: Key of the render.
+            num_rays: Number of rays of the chunk that failed.
+            device: Device the chunk was rendered on.
+        """
+        if device.type == "cuda":
+            torch.cuda.empty_cache()
+        if num_rays <= self.min_num_rays:
+            return None
+        state = self.states[key]
+        state.limit = num_rays if state.limit is None else min(state.limit, num_rays)
+        state.num_rays = max(num_rays // self.growth_factor, self.min_num_rays)
+        CONSOLE.print(
+            f"[bold yellow]Ran out of memory rendering {num_rays} rays per chunk, retrying with {state.num_rays}."
+        )
+        return state.num_rays
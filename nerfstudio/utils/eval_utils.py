@@ -68,6 +68,7 @@ def eval_load_checkpoint(config: TrainerConfig, pipeline: Pipeline) -> Tuple[Pat
 def eval_setup(
     config_path: Path,
     eval_num_rays_per_chunk: Optional[int] = None,
+    adaptive_eval_num_rays_per_chunk: Optional[bool] = None,
     test_mode: Literal["test", "val", "inference"] = "test",
     update_config_callback: Optional[Callable[[TrainerConfig], TrainerConfig]] = None,
 ) -> Tuple[TrainerConfig, Pipeline, Path, int]:
@@ -76,6 +77,8 @@ def eval_setup(
     Args:
         config_path: Path to config YAML file.
         eval_num_rays_per_chunk: Number of rays per forward pass
+        adaptive_eval_num_rays_per_chunk: Whether to adapt the number of rays per forward pass to the free memory.
+            If None, use the value in the config file.
         test_mode:
             'val': loads train/val datasets into memory
             'test': loads train/test dataset into memory
@@ -93,6 +96,8 @@ def eval_setup(
     config.pipeline.datamanager._target = all_methods[config.method_name].pipeline.datamanager._target
     if eval_num_rays_per_chunk:
         config.pipeline.model.eval_num_rays_per_chunk = eval_num_rays_per_chunk
+    if adaptive_eval_num_rays_per_chunk is not None:
+        config.pipeline.model.eval_adaptive_num_rays_per_chunk = adaptive_eval_num_rays_per_chunk
 
     if update_config_callback is not None:
         config = update_config_callback(config)
@@ -16,13 +16,17 @@
 
 import dataclasses
 from copy import deepcopy
-from typing import Callable, Dict, List, NoReturn, Optional, Tuple, TypeVar, Union
+from typing import Any, Callable, Dict, List, NoReturn, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 import numpy as np
 import torch
 
 TensorDataclassT = TypeVar("TensorDataclassT", bound="TensorDataclass")
 
+# Location of a tensor in a packed tensor dataclass, by path of field names and dictionary keys:
+# (buffer key, first channel, last channel, shape after the batch dimensions, view handed out for the tensor).
+PackedLayout = Dict[Tuple[str, ...], Tuple[torch.dtype, int, int, Tuple[int, ...], torch.Tensor]]
+
 
 class TensorDataclass:
     """@dataclass of tensors with the same size batch. Allows indexing and standard tensor ops.
@@ -54,6 +58,11 @@ class TensorDataclass:
 
         test[..., 0].shape  # [2, 3]
         test[:, 0, :].shape  # [2, 4]
+
+    Fields are validated and broadcast once, when the dataclass is created. Dataclasses derived from it by indexing,
+    reshaping or moving it are built without repeating that work, and `construct_unchecked` creates a dataclass from
+    fields that already have the batch shape. `pack` copies all tensors into one buffer per dtype, after which
+    indexing, reshaping and `to` are a single operation per buffer instead of one per field.
     """
 
     _shape: tuple
@@ -93,6 +102,87 @@ class TensorDataclass:
 
         object.__setattr__(self, "_shape", batch_shape)
 
+    @classmethod
+    def construct_unchecked(
+        cls: Type[TensorDataclassT], batch_shape: Union[torch.Size, Tuple[int, ...]], **fields: Any
+    ) -> TensorDataclassT:
+        """Creates a tensor dataclass without checking or broadcasting its fields.
+
+        This skips the work of __post_init__ in hot paths. The caller guarantees that every tensor field already
+        has the batch shape `batch_shape` (expanded views are fine), as __post_init__ would have broadcast it.
+
+        Args:
+            batch_shape: The batch shape of the fields.
+            fields: The fields of the dataclass. Missing fields take their default value.
+
+        Returns:
+            The new tensor dataclass.
+        """
+        instance = cls.__new__(cls)
+        for f in dataclasses.fields(cls):  # type: ignore
+            if f.name in fields:
+                value = fields[f.name]
+            elif f.default is not dataclasses.MISSING:
+                value = f.default
+            elif f.default_factory is not dataclasses.MISSING:
+                value = f.default_factory()
+            else:
+                raise TypeError(f"{cls.__name__} missing required field {f.name}")
+            object.__setattr__(instance, f.name, value)
+        object.__setattr__(instance, "_shape", torch.Size(batch_shape))
+        return instance
+
+    @classmethod
+    def cat(cls: Type[TensorDataclassT], tensor_dataclasses: Sequence[TensorDataclassT]) -> TensorDataclassT:
+        """Concatenates tensor dataclasses along their first batch dimension.
+
+        The other batch dimensions must match, and so must the fields that are None. Values that are not tensors or
+        tensor dataclasses are taken from the first tensor dataclass.
+
+        Args:
+            tensor_dataclasses: The tensor dataclasses to concatenate.
+
+        Returns:
+            The concatenated tensor dataclass.
+        """
+        assert len(tensor_dataclasses) > 0, "Need at least one tensor dataclass to concatenate"
+        first = tensor_dataclasses[0]
+        assert all(
+            x.shape[1:] == first.shape[1:] for x in tensor_dataclasses
+        ), "Only the first batch dimension can differ"
+
+        def cat_dicts(dicts: List[Dict]) -> Dict:
+            new_dict = {}
+            for k, v in dicts[0].items():
+                values = [dict_[k] for dict_ in dicts]
+                if isinstance(v, torch.Tensor):
+                    new_dict[k] = torch.cat(values)
+                elif isinstance(v, TensorDataclass):
+                    new_dict[k] = type(v).cat(values)
+                elif isinstance(v, dict):
+                    new_dict[k] = cat_dicts(values)
+                else:
+                    assert all(
+                        not isinstance(value, (torch.Tensor, TensorDataclass)) for value in values
+                    ), f"Field {k} is a tensor in some of the tensor dataclasses only"
+                    new_dict[k] = v
+            return new_dict
+
+        new_fields = cat_dicts(
+            [{f.name: getattr(x, f.name) for f in dataclasses.fields(x)} for x in tensor_dataclasses]
+        )
+        batch_shape = torch.Size((sum(x.shape[0] for x in tensor_dataclasses), *first.shape[1:]))
+        return first._replace_unchecked(new_fields, batch_shape)
+
+    def _replace_unchecked(self: TensorDataclassT, new_fields: Dict, batch_shape: torch.Size) -> TensorDataclassT:
+        """Returns a copy of the dataclass with some fields replaced, without checking or broadcasting them."""
+        instance = self.__class__.__new__(self.__class__)
+        state = {k: v for k, v in self.__dict__.items() if k not in ("_packed_buffers", "_packed_layout")}
+        state.update(new_fields)
+        state["_shape"] = batch_shape
+        instance.__dict__.update(state)
+        return instance
+
     def _get_dict_batch_shapes(self, dict_: Dict) -> List:
         """Returns batch shapes of all tensors in a dictionary
 
@@ -147,6 +237,9 @@ class TensorDataclass:
         return new_dict
 
     def __getitem__(self: TensorDataclassT, indices) -> TensorDataclassT:
+        if self.is_packed:
+            batch_indices = (indices,) if not isinstance(indices, tuple) else indices
+            return self._apply_fn_to_packed(lambda buffer: buffer[batch_indices + (slice(None),)])
         if isinstance(indices, (torch.Tensor)):
             return self._apply_fn_to_fields(lambda x: x[indices])
         if isinstance(indices, (int, slice, type(Ellipsis))):
@@ -212,6 +305,9 @@ class TensorDataclass:
         if isinstance(shape, int):
             shape = (shape,)
 
+        if self.is_packed:
+            return self._apply_fn_to_packed(lambda buffer: buffer.reshape((*shape, buffer.shape[-1])))
+
         def tensor_fn(x):
             return x.reshape((*shape, x.shape[-1]))
 
@@ -245,6 +341,9 @@ class TensorDataclass:
             A new TensorDataclass with the same data but with a new shape.
         """
 
+        if self.is_packed:
+            return self._apply_fn_to_packed(lambda buffer: buffer.broadcast_to((*shape, buffer.shape[-1])))
+
         def custom_tensor_dims_fn(k, v):
             custom_dims = self._field_custom_dimensions[k]
             return v.broadcast_to((*shape, *v.shape[-custom_dims:]))
@@ -262,6 +361,8 @@ class TensorDataclass:
         Returns:
             A new TensorDataclass with the same data but on the specified device.
         """
+        if self.is_packed:
+            return self._apply_fn_to_packed(lambda buffer: buffer.to(device))
         return self._apply_fn_to_fields(lambda x: x.to(device))
 
     def pin_memory(self: TensorDataclassT) -> TensorDataclassT:
@@ -270,8 +371,121 @@ class TensorDataclass:
         Returns:
             TensorDataclass: A new TensorDataclass with the same data but pinned.
         """
+        if self.is_packed:
+            return self._apply_fn_to_packed(lambda buffer: buffer.pin_memory())
         return self._apply_fn_to_fields(lambda x: x.pin_memory())
 
+    @property
+    def is_packed(self) -> bool:
+        """Returns whether the tensors are views into packed buffers, and still the ones created by `pack`.
+
+        Assigning a new tensor to a field (or to a key of a dictionary field) unpacks the dataclass: the next
+        operation goes through the fields one by one and returns a regular dataclass.
+        """
+        layout: Optional[PackedLayout] = self.__dict__.get("_packed_layout")
+        if layout is None:
+            return False
+        tensors = self._get_tensors_by_path()
+        return len(tensors) == len(layout) and all(
+            path in layout and layout[path][4] is tensor for path, tensor in tensors.items()
+        )
+
+    def pack(self: TensorDataclassT) -> TensorDataclassT:
+        """Returns a copy whose tensors, including the ones in nested dataclasses and dictionaries, are views into
+        one contiguous buffer per dtype.
+
+        Buffers have shape (*batch_shape, num_channels), with the channels of every field side by side, so fields
+        keep a row major layout along the batch and can still be viewed or reshaped like regular tensors. Indexing,
+        reshaping, broadcasting, `to` and `pin_memory` then apply a single operation to each buffer instead of one
+        to each field. Broadcast (expanded) fields are materialized.
+
+        Returns:
+            The packed tensor dataclass.
+        """
+        tensors = self._get_tensors_by_path()
+        if len(tensors) == 0:
+            raise ValueError("TensorDataclass must have at least one tensor")
+        batch_ndim = len(self._shape)
+        chunks: Dict[torch.dtype, List[torch.Tensor]] = {}
+        layout: PackedLayout = {}
+        num_channels: Dict[torch.dtype, int] = {}
+        for path, tensor in tensors.items():
+            trailing_shape = tuple(tensor.shape[batch_ndim:])
+            channels = int(np.prod(trailing_shape))
+            start = num_channels.get(tensor.dtype, 0)
+            layout[path] = (tensor.dtype, start, start + channels, trailing_shape, tensor)
+            num_channels[tensor.dtype] = start + channels
+            chunks.setdefault(tensor.dtype, []).append(tensor.reshape(*self._shape, channels))
+        buffers = {dtype: torch.cat(dtype_chunks, dim=-1) for dtype, dtype_chunks in chunks.items()}
+        return self._from_packed(buffers, layout)
+
+    def _apply_fn_to_packed(self: TensorDataclassT, fn: Callable) -> TensorDataclassT:
+        """Applies a function to every packed buffer and returns the dataclass viewing the results."""
+        buffers = {key: fn(buffer) for key, buffer in self.__dict__["_packed_buffers"].items()}
+        return self._from_packed(buffers, self.__dict__["_packed_layout"])
+
+    def _from_packed(
+        self: TensorDataclassT, buffers: Dict[torch.dtype, torch.Tensor], layout: PackedLayout
+    ) -> TensorDataclassT:
+        """Returns a copy of the dataclass with its tensors replaced by views into `buffers`."""
+        batch_shape = next(iter(buffers.values())).shape[:-1]
+        new_layout: PackedLayout = {}
+
+        def get_view(path: Tuple[str, ...]) -> torch.Tensor:
+            key, start, end, trailing_shape, _ = layout[path]
+            view = buffers[key][..., start:end]
+            if trailing_shape != (end - start,):
+                view = view.reshape(*batch_shape, *trailing_shape)
+            new_layout[path] = (key, start, end, trailing_shape, view)
+            return view
+
+        packed = self._replace_views(get_view, batch_shape, ())
+        object.__setattr__(packed, "_packed_buffers", buffers)
+        object.__setattr__(packed, "_packed_layout", new_layout)
+        return packed
+
+    def _replace_views(
+        self: TensorDataclassT, get_view: Callable, batch_shape: torch.Size, prefix: Tuple[str, ...]
+    ) -> TensorDataclassT:
+        """Returns a copy of the dataclass with each tensor replaced by `get_view(path)`."""
+
+        def replace_dict(dict_: Dict, dict_prefix: Tuple[str, ...]) -> Dict:
+            new_dict = {}
+            for k, v in dict_.items():
+                if isinstance(v, torch.Tensor):
+                    new_dict[k] = get_view(dict_prefix + (k,))
+                elif isinstance(v, TensorDataclass):
+                    new_dict[k] = v._replace_views(get_view, batch_shape, dict_prefix + (k,))
+                elif isinstance(v, Dict):
+                    new_dict[k] = replace_dict(v, dict_prefix + (k,))
+                else:
+                    new_dict[k] = v
+            return new_dict
+
+        self_dc = self
+        assert dataclasses.is_dataclass(self_dc)
+        new_fields = replace_dict({f.name: getattr(self, f.name) for f in dataclasses.fields(self_dc)}, prefix)
+        return self._replace_unchecked(new_fields, batch_shape)
+
+    def _get_tensors_by_path(self) -> Dict[Tuple[str, ...], torch.Tensor]:
+        """Returns all tensors of the dataclass, nested dataclasses and dictionaries, by path of names and keys."""
+        tensors: Dict[Tuple[str, ...], torch.Tensor] = {}
+
+        def collect(dict_: Dict, prefix: Tuple[str, ...]) -> None:
+            for k, v in dict_.items():
+                if isinstance(v, torch.Tensor):
+                    tensors[prefix + (k,)] = v
+                elif isinstance(v, TensorDataclass):
+                    assert dataclasses.is_dataclass(v)
+                    collect({f.name: getattr(v, f.name) for f in dataclasses.fields(v)}, prefix + (k,))
+                elif isinstance(v, Dict):
+                    collect(v, prefix + (k,))
+
+        self_dc = self
+        assert dataclasses.is_dataclass(self_dc)
+        collect({f.name: getattr(self, f.name) for f in dataclasses.fields(self_dc)}, ())
+        return tensors
+
     def _apply_fn_to_fields(
         self: TensorDataclassT,
         fn: Callable,
@@ -307,7 +521,12 @@ class TensorDataclass:
             custom_tensor_dims_fn,
         )
 
-        return dataclasses.replace(self_dc, **new_fields)
+        # The fields were broadcast when this dataclass was created and fn transforms all of them alike, so they
+        # still share a batch shape and don't need to go through __post_init__ again.
+        batch_shapes = self._get_dict_batch_shapes(new_fields)
+        if len(batch_shapes) == 0:
+            raise ValueError("TensorDataclass must have at least one tensor")
+        return self._replace_unchecked(new_fields, torch.Size(batch_shapes[0]))
 
     def _apply_fn_to_dict(
         self,
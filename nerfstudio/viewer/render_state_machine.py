@@ -19,21 +19,27 @@ from __future__ import annotations
 import contextlib
 import threading
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Dict, Literal, Optional, Tuple, get_args
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List, Literal, Optional, Tuple, Union, get_args
 
 import numpy as np
 import torch
 import torch.nn.functional as F
+from jaxtyping import Float, Int
+from torch import Tensor
 from viser import ClientHandle
 
 from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.data.scene_box import OrientedBox
 from nerfstudio.model_components.renderers import background_color_override_context
+from nerfstudio.models.base_model import Model
 from nerfstudio.models.splatfacto import SplatfactoModel
 from nerfstudio.utils import colormaps, writer
+from nerfstudio.utils.cancellation import CancellationToken, RenderCancelledException, cancellation_context
 from nerfstudio.utils.writer import GLOBAL_BUFFER, EventName, TimeWriter
+from nerfstudio.viewer.reprojection import ReprojectionCache
 from nerfstudio.viewer.utils import CameraState, get_camera
-from nerfstudio.viewer_legacy.server import viewer_utils
 
 if TYPE_CHECKING:
     from nerfstudio.viewer.viewer import Viewer
@@ -52,6 +58,102 @@ class RenderAction:
     """The current camera state """
 
 
+class ProgressiveRender:
+    """Pixels rendered so far by a progressive render, kept to resume it after an interruption.
+
+    The image is rendered in passes over grids of pixels whose spacing halves at each pass, down to every pixel.
+    Each pass only renders the pixels of its grid that previous passes didn't.
+
+    Args:
+        key: the render cache key of the render
+        image_height: the height of the image
+        image_width: the width of the image
+        device: the device of the outputs
+    """
+
+    def __init__(self, key: Hashable, image_height: int, image_width: int, device: Union[torch.device, str]):
+        self.key = key
+        self.resolution = (image_height, image_width)
+        self.ys = torch.arange(image_height, device=device)
+        self.xs = torch.arange(image_width, device=device)
+        self.rendered = torch.zeros(image_height * image_width, dtype=torch.bool, device=device)
+        self.outputs: Dict[str, Tensor] = {}
+
+    def get_strides(self, num_rays_per_pass: float) -> List[int]:
+        """Returns the spacings of the grids of the passes, starting from the grid with at most `num_rays_per_pass`
+        pixels."""
+        image_height, image_width = self.resolution
+        stride = 1
+        while stride < max(image_height, image_width) and image_height * image_width / stride**2 > num_rays_per_pass:
+            stride *= 2
+        return [stride // 2**i for i in range(stride.bit_length())]
+
+    def get_pass_indices(self, stride: int) -> Int[Tensor, "num_rays"]:
+        """Returns the indices of the pixels of the flattened image that the pass of a grid has to render."""
+        on_grid = ((self.ys % stride == 0)[:, None] & (self.xs % stride == 0)[None, :]).view(-1)
+        return torch.nonzero(on_grid & ~self.rendered).squeeze(-1)
+
+    def add_pass(self, indices: Int[Tensor, "num_rays"], outputs: Dict[str, Tensor]) -> None:
+        """Stores the outputs of the model for the pixels of a pass."""
+        for output_name, output in outputs.items():
+            if output_name not in self.outputs:
+                self.outputs[output_name] = output.new_zeros((self.rendered.shape[0], *output.shape[1:]))
+            self.outputs[output_name][indices] = output
+        self.rendered[indices] = True
+
+    def get_outputs(self, stride: int) -> Dict[str, Tensor]:
+        """Returns the image after the pass of a grid, filling each pixel with the pixel of the grid at the top left
+        corner of its cell."""
+        image_height, image_width = self.resolution
+        nearest = (self.ys // stride * stride)[:, None] * image_width + (self.xs // stride * stride)[None, :]
+        return {
+            output_name: output[nearest.view(-1)].view(image_height, image_width, -1)
+            for output_name, output in self.outputs.items()
+        }
+
+
+class RenderOutputCache:
+    """Least recently used cache of the outputs of the last renders.
+
+    Entries are keyed by everything that changes the outputs of the model except the resolution, and keep the
+    resolution they were rendered at. A render is served from an entry rendered at least at the requested resolution,
+    so that changing the output type, the colormap or the split outputs doesn't run the model again.
+
+    Args:
+        max_size: Number of renders to keep. Zero disables the cache.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[Hashable, Tuple[Tuple[int, int], Dict[str, Any]]] = OrderedDict()
+
+    def get(self, key: Hashable, image_height: int, image_width: int) -> Optional[Dict[str, Any]]:
+        """Returns the outputs of a render of `key` at least as large as the requested resolution, if any."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        (height, width), outputs = entry
+        if height < image_height or width < image_width:
+            return None
+        self.entries.move_to_end(key)
+        return outputs
+
+    def put(self, key: Hashable, image_height: int, image_width: int, outputs: Dict[str, Any]) -> None:
+        """Stores the outputs of a render, unless a larger render of the same key is already cached."""
+        if self.max_size <= 0:
+            return
+        entry = self.entries.get(key)
+        if entry is None or entry[0][0] < image_height or entry[0][1] < image_width:
+            self.entries[key] = ((image_height, image_width), outputs)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops all renders, e.g. when the model changed."""
+        self.entries.clear()
+
+
 class RenderStateMachine(threading.Thread):
     """The render state machine is responsible for deciding how to render the image.
     It decides the resolution and whether to interrupt the current render.
@@ -81,12 +183,15 @@ class RenderStateMachine(threading.Thread):
         self.render_trigger = threading.Event()
         self.target_fps = 30
         self.viewer = viewer
-        self.interrupt_render_flag = False
+        self.cancellation_token = CancellationToken()
         self.daemon = True
         self.output_keys = {}
         self.viser_scale_ratio = viser_scale_ratio
         self.client = client
         self.running = True
+        self.render_cache = RenderOutputCache(self.viewer.config.render_cache_size)
+        self.progressive_render: Optional[ProgressiveRender] = None
+        self.reprojection_cache = ReprojectionCache()
 
     def action(self, action: RenderAction):
         """Takes an action and updates the state machine
@@ -113,7 +218,7 @@ class RenderStateMachine(threading.Thread):
 
         # handle interrupt logic
         if self.state == "high" and self.next_action.action in ("move", "rerender"):
-            self.interrupt_render_flag = True
+            self.cancellation_token.cancel()
         self.render_trigger.set()
 
     def _render_img(self, camera_state: CameraState):
@@ -134,45 +239,19 @@ class RenderStateMachine(threading.Thread):
         # When outside of render preview, it will use the control panel's time.
         if not self.viewer.render_tab_state.preview_render and self.viewer.include_time:
             camera_state.time = self.viewer.control_panel.time
+        # Renders that only differ in how the outputs are displayed are served from the cache.
+        cache_key = self._get_render_cache_key(camera_state)
+        cached_outputs = self.render_cache.get(cache_key, image_height, image_width)
+        if cached_outputs is not None:
+            return cached_outputs
+
         camera = get_camera(camera_state, image_height, image_width)
         camera = camera.to(self.viewer.get_model().device)
         assert isinstance(camera, Cameras)
         assert camera is not None, "render called before viewer connected"
 
         with TimeWriter(None, None, write=False) as vis_t:
-            with self.viewer.train_lock if self.viewer.train_lock is not None else contextlib.nullcontext():
-                if isinstance(self.viewer.get_model(), SplatfactoModel):
-                    color = self.viewer.control_panel.background_color
-                    background_color = torch.tensor(
-                        [color[0] / 255.0, color[1] / 255.0, color[2] / 255.0],
-                        device=self.viewer.get_model().device,
-                    )
-                    self.viewer.get_model().set_background(background_color)
-                was_training = self.viewer.get_model().training
-                self.viewer.get_model().eval()
-                step = self.viewer.step
-                try:
-                    if self.viewer.control_panel.crop_viewport:
-                        color = self.viewer.control_panel.background_color
-                        if color is None:
-                            background_color = torch.tensor([0.0, 0.0, 0.0], device=self.viewer.pipeline.model.device)
-                        else:
-                            background_color = torch.tensor(
-                                [color[0] / 255.0, color[1] / 255.0, color[2] / 255.0],
-                                device=self.viewer.get_model().device,
-                            )
-                        with background_color_override_context(
-                            background_color
-                        ), torch.no_grad(), viewer_utils.SetTrace(self.check_interrupt):
-                            outputs = self.viewer.get_model().get_outputs_for_camera(camera, obb_box=obb)
-                    else:
-                        with torch.no_grad(), viewer_utils.SetTrace(self.check_interrupt):
-                            outputs = self.viewer.get_model().get_outputs_for_camera(camera, obb_box=obb)
-                except viewer_utils.IOChangeException:
-                    raise
-                finally:
-                    if was_training:
-                        self.viewer.get_model().train()
+            outputs, step = self._run_model(lambda model: model.get_outputs_for_camera(camera, obb_box=obb))
             num_rays = (camera.height * camera.width).item()
             if self.viewer.control_panel.layer_depth:
                 if isinstance(self.viewer.get_model(), SplatfactoModel):
@@ -192,19 +271,190 @@ class RenderStateMachine(threading.Thread):
                         mode="bilinear",
                     )[0, 0, :, :, None]
                 else:
-                    # Convert to z_depth if depth compositing is enabled.
-                    R = camera.camera_to_worlds[0, 0:3, 0:3].T
-                    camera_ray_bundle = camera.generate_rays(camera_indices=0, obb_box=obb)
-                    pts = camera_ray_bundle.directions * outputs["depth"]
-                    pts = (R @ (pts.view(-1, 3).T)).T.view(*camera_ray_bundle.directions.shape)
-                    outputs["gl_z_buf_depth"] = -pts[..., 2:3]  # negative z axis is the coordinate convention
+                    outputs["gl_z_buf_depth"] = self._get_gl_z_buf_depth(camera, outputs["depth"], obb)
         render_time = vis_t.duration
         if writer.is_initialized() and render_time != 0:
             writer.put_time(
                 name=EventName.VIS_RAYS_PER_SEC, duration=num_rays / render_time, step=step, avg_over_steps=True
             )
+        self.render_cache.put(cache_key, image_height, image_width, outputs)
+        if self.state == "high" and self._use_reprojection():
+            self.reprojection_cache.store(self._get_reprojection_key(camera_state), camera, outputs)
         return outputs
 
+    def _render_img_reprojected(self, camera_state: CameraState) -> Dict[str, Any]:
+        """Renders the image at the usual resolution while moving, and shows the last high resolution frame
+        reprojected to the current camera where it is still valid.
+
+        Args:
+            camera_state: the current camera state
+        """
+        fill_outputs = self._render_img(camera_state)
+        image_height, image_width = self._calculate_image_res(camera_state.aspect, state="high")
+        camera = get_camera(camera_state, image_height, image_width)
+        outputs = self.reprojection_cache.reproject(self._get_reprojection_key(camera_state), camera, fill_outputs)
+        if outputs is None:
+            return fill_outputs
+        if self.viewer.control_panel.layer_depth:
+            obb = self.viewer.control_panel.crop_obb if self.viewer.control_panel.crop_viewport else None
+            outputs["gl_z_buf_depth"] = self._get_gl_z_buf_depth(
+                camera.to(outputs["depth"].device), outputs["depth"], obb
+            )
+        return outputs
+
+    def _render_img_progressive(self, camera_state: CameraState) -> None:
+        """Renders the image in passes over finer and finer grids of pixels, and sends each pass to the viewer.
+
+        The first pass renders about as many rays as a low resolution render, so the first image arrives as fast
+        whatever the cost of the model. Each pass then halves the spacing of the grid, reusing the pixels of the
+        previous ones, and pixels that were not rendered yet show their nearest rendered pixel. The rendered pixels
+        are kept when the render is interrupted, so that rendering the same view again resumes it.
+
+        Args:
+            camera_state: the current camera state
+        """
+        if self.viewer.control_panel.crop_viewport:
+            obb = self.viewer.control_panel.crop_obb
+        else:
+            obb = None
+
+        image_height, image_width = self._calculate_image_res(camera_state.aspect)
+        if not self.viewer.render_tab_state.preview_render and self.viewer.include_time:
+            camera_state.time = self.viewer.control_panel.time
+        cache_key = self._get_render_cache_key(camera_state)
+        cached_outputs = self.render_cache.get(cache_key, image_height, image_width)
+        if cached_outputs is not None:
+            self._send_output_to_viewer(cached_outputs, static_render=True)
+            return
+
+        camera = get_camera(camera_state, image_height, image_width)
+        camera = camera.to(self.viewer.get_model().device)
+        ray_bundle = camera.generate_rays(camera_indices=0, keep_shape=True, obb_box=obb).flatten()
+        progress = self.progressive_render
+        if progress is None or progress.key != cache_key or progress.resolution != (image_height, image_width):
+            progress = ProgressiveRender(cache_key, image_height, image_width, camera.device)
+            self.progressive_render = progress
+
+        # The first pass renders about the rays of one frame at the measured ray rate.
+        strides = progress.get_strides(self._get_vis_rays_per_sec() / self.target_fps)
+        outputs = {}
+        for stride in strides:
+            indices = progress.get_pass_indices(stride)
+            if indices.numel() > 0:
+                with TimeWriter(None, None, write=False) as vis_t:
+                    pass_outputs, step = self._run_model(lambda model: model.get_outputs_for_rays(ray_bundle[indices]))
+                progress.add_pass(indices, pass_outputs)
+                if writer.is_initialized() and vis_t.duration != 0:
+                    writer.put_time(
+                        name=EventName.VIS_RAYS_PER_SEC,
+                        duration=indices.numel() / vis_t.duration,
+                        step=step,
+                        avg_over_steps=True,
+                    )
+            outputs = progress.get_outputs(stride)
+            if self.viewer.control_panel.layer_depth:
+                outputs["gl_z_buf_depth"] = self._get_gl_z_buf_depth(camera, outputs["depth"], obb)
+            self._send_output_to_viewer(outputs, static_render=stride == 1)
+        self.progressive_render = None
+        self.render_cache.put(cache_key, image_height, image_width, outputs)
+        if self._use_reprojection():
+            self.reprojection_cache.store(self._get_reprojection_key(camera_state), camera, outputs)
+
+    def _run_model(self, render_fn: Callable[[Model], Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+        """Runs a render of the model in eval mode, holding the train lock, and returns its outputs and the step of
+        the model. The render is cancelled when the camera moves.
+
+        Args:
+            render_fn: function rendering the outputs of the model
+        """
+        model = self.viewer.get_model()
+        with self.viewer.train_lock if self.viewer.train_lock is not None else contextlib.nullcontext():
+            if isinstance(model, SplatfactoModel):
+                color = self.viewer.control_panel.background_color
+                background_color = torch.tensor(
+                    [color[0] / 255.0, color[1] / 255.0, color[2] / 255.0],
+                    device=model.device,
+                )
+                model.set_background(background_color)
+            was_training = model.training
+            model.eval()
+            step = self.viewer.step
+            try:
+                if self.viewer.control_panel.crop_viewport:
+                    color = self.viewer.control_panel.background_color
+                    if color is None:
+                        background_color = torch.tensor([0.0, 0.0, 0.0], device=model.device)
+                    else:
+                        background_color = torch.tensor(
+                            [color[0] / 255.0, color[1] / 255.0, color[2] / 255.0],
+                            device=model.device,
+                        )
+                    with background_color_override_context(background_color), torch.no_grad(), cancellation_context(
+                        self.cancellation_token
+                    ):
+                        outputs = render_fn(model)
+                else:
+                    with torch.no_grad(), cancellation_context(self.cancellation_token):
+                        outputs = render_fn(model)
+            finally:
+                if was_training:
+                    model.train()
+        return outputs, step
+
+    def _get_gl_z_buf_depth(
+        self, camera: Cameras, depth: Float[Tensor, "height width 1"], obb: Optional[OrientedBox]
+    ) -> Float[Tensor, "height width 1"]:
+        """Converts the depth along the rays of a camera to z depth, for depth compositing.
+
+        Args:
+            camera: the rendered camera
+            depth: the depth output of the model
+            obb: the crop box the rays were generated with
+        """
+        R = camera.camera_to_worlds[0, 0:3, 0:3].T
+        camera_ray_bundle = camera.generate_rays(camera_indices=0, obb_box=obb)
+        pts = camera_ray_bundle.directions * depth
+        pts = (R @ (pts.view(-1, 3).T)).T.view(*camera_ray_bundle.directions.shape)
+        return -pts[..., 2:3]  # negative z axis is the coordinate convention
+
+    def _get_render_cache_key(self, camera_state: CameraState) -> Hashable:
+        """Returns the key of a render in the cache, made of everything but the resolution that changes the outputs.
+
+        Args:
+            camera_state: the current camera state, with the time of the render
+        """
+        return (
+            tuple(camera_state.c2w.flatten().tolist()),
+            camera_state.fov,
+            camera_state.aspect,
+            camera_state.camera_type,
+            self.viewer.step,
+            self.viewer.control_panel.layer_depth,
+            self._get_reprojection_key(camera_state),
+        )
+
+    def _get_reprojection_key(self, camera_state: CameraState) -> Hashable:
+        """Returns the key of the frames that can be reprojected to each other, made of everything but the camera
+        and the step of the model that changes the outputs. Frames of earlier steps are close enough while moving.
+
+        Args:
+            camera_state: the current camera state, with the time of the render
+        """
+        control_panel = self.viewer.control_panel
+        crop = None
+        if control_panel.crop_viewport:
+            obb = control_panel.crop_obb
+            crop = (tuple(obb.R.flatten().tolist()), tuple(obb.T.tolist()), tuple(obb.S.tolist()))
+        background_color = None
+        if control_panel.crop_viewport or isinstance(self.viewer.get_model(), SplatfactoModel):
+            background_color = control_panel.background_color
+        return (
+            camera_state.time,
+            camera_state.idx,
+            crop,
+            None if background_color is None else tuple(background_color),
+        )
+
     def run(self):
         """Main loop for the render thread"""
         while self.running:
@@ -219,27 +469,26 @@ class RenderStateMachine(threading.Thread):
             if action is None:
                 continue
             self.next_action = None
+            # A cancellation only applies to the render that was running when it was requested.
+            self.cancellation_token.reset()
             if self.state == "high" and action.action == "static":
                 # if we are in high res and we get a static action, we don't need to do anything
                 continue
             self.state = self.transitions[self.state][action.action]
             try:
-                outputs = self._render_img(action.camera_state)
-            except viewer_utils.IOChangeException:
+                if self.state == "high" and self._use_progressive_render():
+                    # the passes are sent to the viewer as they are rendered
+                    self._render_img_progressive(action.camera_state)
+                    continue
+                if self.state == "low_move" and self._use_reprojection():
+                    outputs = self._render_img_reprojected(action.camera_state)
+                else:
+                    outputs = self._render_img(action.camera_state)
+            except RenderCancelledException:
                 # if we got interrupted, don't send the output to the viewer
                 continue
             self._send_output_to_viewer(outputs, static_render=(action.action in ["static", "step"]))
 
-    def check_interrupt(self, frame, event, arg):
-        """Raises interrupt when flag has been set and not already on lowest resolution.
-        Used in conjunction with SetTrace.
-        """
-        if event == "line":
-            if self.interrupt_render_flag:
-                self.interrupt_render_flag = False
-                raise viewer_utils.IOChangeException
-        return self.check_interrupt
-
     def _send_output_to_viewer(self, outputs: Dict[str, Any], static_render: bool = True):
         """Chooses the correct output and sends it to the viewer
 
@@ -314,30 +563,27 @@ class RenderStateMachine(threading.Thread):
         res = f"{selected_output.shape[1]}x{selected_output.shape[0]}px"
         self.viewer.stats_markdown.content = self.viewer.make_stats_markdown(None, res)
 
-    def _calculate_image_res(self, aspect_ratio: float) -> Tuple[int, int]:
+    def _calculate_image_res(self, aspect_ratio: float, state: Optional[RenderStates] = None) -> Tuple[int, int]:
         """Calculate the maximum image height that can be rendered in the time budget
 
         Args:
             apect_ratio: the aspect ratio of the current view
+            state: the state to calculate the resolution of, defaults to the current state
         Returns:
             image_height: the maximum image height that can be rendered in the time budget
             image_width: the maximum image width that can be rendered in the time budget
         """
         max_res = self.viewer.control_panel.max_res
-        if self.state == "high":
+        state = state or self.state
+        if state == "high":
             # high res is always static
             image_height = max_res
             image_width = int(image_height * aspect_ratio)
             if image_width > max_res:
                 image_width = max_res
                 image_height = int(image_width / aspect_ratio)
-        elif self.state in ("low_move", "low_static"):
-            if writer.is_initialized() and EventName.VIS_RAYS_PER_SEC.value in GLOBAL_BUFFER["events"]:
-                vis_rays_per_sec = GLOBAL_BUFFER["events"][EventName.VIS_RAYS_PER_SEC.value]["avg"]
-            else:
-                vis_rays_per_sec = 100000
-            target_fps = self.target_fps
-            num_vis_rays = vis_rays_per_sec / target_fps
+        elif state in ("low_move", "low_static"):
+            num_vis_rays = self._get_vis_rays_per_sec() / self.target_fps
             image_height = (num_vis_rays / aspect_ratio) ** 0.5
             image_height = int(round(image_height, -1))
             image_height = max(min(max_res, image_height), 30)
@@ -346,6 +592,26 @@ class RenderStateMachine(threading.Thread):
                 image_width = max_res
                 image_height = int(image_width / aspect_ratio)
         else:
-            raise ValueError(f"Invalid state: {self.state}")
+            raise ValueError(f"Invalid state: {state}")
 
         return image_height, image_width
+
+    def _get_vis_rays_per_sec(self) -> float:
+        """Returns the average number of rays rendered per second by the viewer"""
+        if writer.is_initialized() and EventName.VIS_RAYS_PER_SEC.value in GLOBAL_BUFFER["events"]:
+            return GLOBAL_BUFFER["events"][EventName.VIS_RAYS_PER_SEC.value]["avg"]
+        return 100000
+
+    def _renders_rays(self) -> bool:
+        """Returns whether the model renders rays, models that render whole images at once, like splatfacto,
+        override get_outputs_for_camera."""
+        return type(self.viewer.get_model()).get_outputs_for_camera is Model.get_outputs_for_camera
+
+    def _use_progressive_render(self) -> bool:
+        """Returns whether high resolution renders are progressive. Only renders of rays are."""
+        return self.viewer.config.progressive_render and self._renders_rays()
+
+    def _use_reprojection(self) -> bool:
+        """Returns whether the last high resolution frame is reprojected while moving. Only renders of rays are,
+        their depth is along the rays."""
+        return self.viewer.config.reproject_on_move and self._renders_rays()
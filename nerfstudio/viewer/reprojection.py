@@ -0,0 +1,145 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reprojection of the last high resolution frame of the viewer to new camera poses, to show sharp images while the
+camera moves."""
+
+from __future__ import annotations
+
+from typing import Dict, Hashable, Optional
+
+import torch
+import torch.nn.functional as F
+from jaxtyping import Float
+from torch import Tensor
+
+from nerfstudio.cameras.cameras import Cameras, CameraType
+
+
+def _is_perspective(camera: Cameras) -> bool:
+    """Returns whether a camera is a perspective camera without distortion."""
+    return camera.camera_type.view(-1)[0].item() == CameraType.PERSPECTIVE.value and (
+        camera.distortion_params is None or not torch.any(camera.distortion_params != 0)
+    )
+
+
+class ReprojectionCache:
+    """Last high resolution frame of the viewer, warped to new camera poses while the camera moves.
+
+    The pixels of the frame are lifted to world points with the depth output, and splatted into the new camera with
+    a z-buffer. The pixels that no point lands on, the disocclusions and the gaps left when the camera gets closer,
+    and the pixels whose point lies clearly behind the surface of a low resolution render of the new pose, which the
+    frame didn't see, are filled with that low resolution render. Only the rgb and depth outputs are reprojected,
+    the other outputs are taken from the low resolution render.
+
+    Args:
+        depth_tolerance: Relative difference of depth above which a reprojected point is hidden by the surface of
+            the low resolution render.
+    """
+
+    def __init__(self, depth_tolerance: float = 0.1):
+        self.depth_tolerance = depth_tolerance
+        self.key: Optional[Hashable] = None
+        self.points: Optional[Float[Tensor, "num_pixels 3"]] = None
+        self.rgb: Optional[Float[Tensor, "num_pixels 3"]] = None
+
+    def store(self, key: Hashable, camera: Cameras, outputs: Dict[str, Tensor]) -> None:
+        """Keeps a frame to reproject, if it is a perspective render with rgb and depth outputs.
+
+        Args:
+            key: everything but the camera that changes the outputs, frames are only reprojected for the same key
+            camera: the camera of the frame
+            outputs: the outputs of the model for the frame, with shape (height, width, ...)
+        """
+        self.clear()
+        if "rgb" not in outputs or "depth" not in outputs or not _is_perspective(camera):
+            return
+        ray_bundle = camera.generate_rays(camera_indices=0, keep_shape=True)
+        if outputs["rgb"].shape[:2] != ray_bundle.shape or outputs["depth"].shape[:2] != ray_bundle.shape:
+            return
+        depth = outputs["depth"].to(ray_bundle.origins)
+        points = ray_bundle.origins + ray_bundle.directions * depth.view(*ray_bundle.shape, 1)
+        self.key = key
+        self.points = points.view(-1, 3)
+        self.rgb = outputs["rgb"][..., :3].reshape(-1, 3).to(ray_bundle.origins)
+
+    def clear(self) -> None:
+        """Drops the frame."""
+        self.key = None
+        self.points = None
+        self.rgb = None
+
+    def reproject(self, key: Hashable, camera: Cameras, fill_outputs: Dict[str, Tensor]) -> Optional[Dict[str, Tensor]]:
+        """Returns the frame warped to a new camera, filled with a render of the new camera where it is missing, or
+        None if no frame of `key` can be reprojected to this camera.
+
+        Args:
+            key: everything but the camera that changes the outputs
+            camera: the new camera, at the resolution of the reprojected image
+            fill_outputs: outputs of the model for the new camera, at any resolution, with rgb and depth outputs
+        """
+        if self.key != key or self.points is None or self.rgb is None or not _is_perspective(camera):
+            return None
+        if "rgb" not in fill_outputs or "depth" not in fill_outputs:
+            return None
+        device = self.points.device
+        image_height, image_width = int(camera.height.view(-1)[0]), int(camera.width.view(-1)[0])
+        camera = camera.to(device)
+        c2w = camera.camera_to_worlds.view(-1, 3, 4)[0]
+        fx, fy = camera.fx.view(-1)[0], camera.fy.view(-1)[0]
+        cx, cy = camera.cx.view(-1)[0], camera.cy.view(-1)[0]
+
+        # Project the points to the new camera, which looks along its negative z axis.
+        offsets = self.points - c2w[:, 3]
+        points_camera = offsets @ c2w[:, :3]
+        z_depth = -points_camera[:, 2]
+        in_front = z_depth > 1e-6
+        z_depth = torch.where(in_front, z_depth, torch.ones_like(z_depth))
+        u = torch.floor(cx + fx * points_camera[:, 0] / z_depth).long()
+        v = torch.floor(cy - fy * points_camera[:, 1] / z_depth).long()
+        visible = in_front & (u >= 0) & (u < image_width) & (v >= 0) & (v < image_height)
+        pixels = (v * image_width + u)[visible]
+        z_depth = z_depth[visible]
+
+        # Keep the closest point of each pixel.
+        z_buffer = torch.full((image_height * image_width,), float("inf"), device=device)
+        z_buffer.scatter_reduce_(0, pixels, z_depth, reduce="amin")
+        closest = z_depth <= z_buffer[pixels]
+        pixels = pixels[closest]
+        rgb = torch.zeros((image_height * image_width, 3), device=device)
+        rgb[pixels] = self.rgb[visible][closest]
+        depth = torch.full((image_height * image_width, 1), float("inf"), device=device)
+        depth[pixels] = torch.linalg.norm(offsets[visible][closest], dim=-1, keepdim=True)
+
+        outputs = {
+            output_name: self._resize(output, image_height, image_width).to(device)
+            for output_name, output in fill_outputs.items()
+            if output.dim() == 3
+        }
+        fill_depth = outputs["depth"].reshape(-1, 1)
+        valid = depth < fill_depth * (1.0 + self.depth_tolerance)
+        outputs["rgb"] = torch.where(valid, rgb, outputs["rgb"][..., :3].reshape(-1, 3)).view(
+            image_height, image_width, 3
+        )
+        outputs["depth"] = torch.where(valid, depth, fill_depth).view(image_height, image_width, 1)
+        return outputs
+
+    @staticmethod
+    def _resize(output: Tensor, image_height: int, image_width: int) -> Tensor:
+        """Resizes an output of shape (height, width, channels) with nearest neighbor interpolation."""
+        if output.shape[:2] == (image_height, image_width):
+            return output
+        dtype = output.dtype
+        resized = F.interpolate(output.permute(2, 0, 1)[None].float(), size=(image_height, image_width))
+        return resized[0].permute(1, 2, 0).to(dtype)
@@ -234,7 +234,11 @@ class Viewer:
                 element.install(self.viser_server)
                 # also rewire the hook to rerender
                 prev_cb = element.cb_hook
-                element.cb_hook = lambda element: [prev_cb_wrapper(prev_cb)(element), self._trigger_rerender()]
+                element.cb_hook = lambda element: [
+                    prev_cb_wrapper(prev_cb)(element),
+                    self._clear_render_caches(),
+                    self._trigger_rerender(),
+                ]
             else:
                 # recursively create folders
                 # If the folder name is "Custom Elements/a/b", then:
@@ -401,6 +405,12 @@ class Viewer:
             camera_state = self.get_camera_state(clients[id])
             self.render_statemachines[id].action(RenderAction("move", camera_state))
 
+    def _clear_render_caches(self) -> None:
+        """Drops the cached renders of all clients, when a custom element may have changed the outputs."""
+        for render_statemachine in self.render_statemachines.values():
+            render_statemachine.render_cache.clear()
+            render_statemachine.reprojection_cache.clear()
+
     def _toggle_training_state(self, _) -> None:
         """Toggle the trainer's training state."""
         if self.trainer is not None:
@@ -342,6 +342,45 @@ def check_generate_rays_shape():
         assert shape == output_size
 
 
+def test_generate_packed_rays():
+    """Test that packed rays of cameras with different sizes match the rays of each camera."""
+    c2w = torch.eye(4)[None, :3, :].repeat(3, 1, 1)
+    c2w[:, :3, 3] = torch.arange(9.0).reshape(3, 3)
+    distortion_params = torch.zeros(3, 6)
+    distortion_params[:, 0] = 0.05
+    cameras = Cameras(
+        camera_to_worlds=c2w,
+        fx=torch.tensor([10.0, 12.0, 8.0])[:, None],
+        fy=torch.tensor([10.0, 12.0, 8.0])[:, None],
+        cx=torch.tensor([4.0, 3.0, 5.0])[:, None],
+        cy=torch.tensor([3.0, 4.0, 5.0])[:, None],
+        width=torch.tensor([8, 6, 10])[:, None],
+        height=torch.tensor([6, 8, 10])[:, None],
+        distortion_params=distortion_params,
+    )
+    assert cameras.is_jagged
+
+    camera_indices = torch.tensor([[2], [0], [2]])
+    ray_bundle, offsets = cameras.generate_packed_rays(camera_indices)
+    assert offsets.tolist() == [0, 100, 148, 248]
+    assert ray_bundle.shape == (248,)
+
+    outputs = {"origins": ray_bundle.origins, "directions": ray_bundle.directions}
+    images = cameras.split_packed_outputs(outputs, offsets, camera_indices)
+    for image, camera_idx in zip(images, camera_indices[:, 0].tolist()):
+        expected = cameras.generate_rays(camera_indices=camera_idx, keep_shape=True)
+        assert image["directions"].shape == expected.directions.shape
+        assert torch.allclose(image["origins"], expected.origins)
+        assert torch.allclose(image["directions"], expected.directions)
+
+    # The jagged path of generate_rays concatenates the same rays.
+    ray_bundle, offsets = cameras.generate_packed_rays()
+    assert torch.allclose(
+        cameras.generate_rays(camera_indices=torch.tensor([[0], [1], [2]])).directions, ray_bundle.directions
+    )
+    assert len(cameras.split_packed_outputs({"directions": ray_bundle.directions}, offsets)) == 3
+
+
 def _check_dataclass_allclose(ipt, other):
     for field in dataclasses.fields(ipt):
         if getattr(ipt, field.name) is not None:
@@ -378,3 +417,4 @@ if __name__ == "__main__":
     test_camera_as_tensordataclass()
     test_orthophoto_camera()
     test_multi_camera_type()
+    test_generate_packed_rays()
@@ -0,0 +1,75 @@
+"""
+Test the approximate inverse distortion.
+"""
+
+import torch
+
+from nerfstudio.cameras import camera_utils
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.cameras.inverse_distortion import InverseDistortionApproximation
+
+
+def _get_ray_inputs(num_rays: int = 1000):
+    camera_indices = torch.randint(0, 2, (num_rays, 1))
+    coords = torch.rand(num_rays, 2) * torch.tensor([48.0, 64.0])
+    return camera_indices, coords
+
+
+def test_opencv_inverse_distortion():
+    """Rays generated with the approximate inverse distortion match the exact rays."""
+    torch.manual_seed(0)
+    distortion_params = torch.tensor([[-0.1, 0.02, 0.0, 0.0, 0.001, -0.002], [0.2, 0.0, 0.0, 0.0, 0.0, 0.0]])
+    cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3, :].repeat(2, 1, 1),
+        fx=50.0,
+        fy=50.0,
+        cx=32.0,
+        cy=24.0,
+        width=64,
+        height=48,
+        distortion_params=distortion_params,
+    )
+    inverse_distortion = cameras.fit_inverse_distortion(tolerance=0.01)
+    assert len(inverse_distortion.reports) == 2
+    assert all(report.accepted and report.max_error <= 0.01 for report in inverse_distortion.reports)
+
+    camera_indices, coords = _get_ray_inputs()
+    expected = cameras.generate_rays(camera_indices=camera_indices, coords=coords)
+    rays = cameras.generate_rays(camera_indices=camera_indices, coords=coords, inverse_distortion=inverse_distortion)
+    assert torch.allclose(rays.directions, expected.directions, atol=1e-4)
+
+    # Unfitted distortion parameters fall back to the exact solver.
+    delta = torch.zeros(len(coords), 6)
+    delta[:, 0] = 0.01
+    expected = cameras.generate_rays(camera_indices=camera_indices, coords=coords, distortion_params_delta=delta)
+    rays = cameras.generate_rays(
+        camera_indices=camera_indices,
+        coords=coords,
+        distortion_params_delta=delta,
+        inverse_distortion=inverse_distortion,
+    )
+    assert torch.allclose(rays.directions, expected.directions)
+
+    # A tolerance that can't be met keeps the exact solver.
+    inverse_distortion = cameras.fit_inverse_distortion(tolerance=0.0, max_grid_size=64)
+    assert not any(report.accepted for report in inverse_distortion.reports)
+    assert len(inverse_distortion.grids["opencv"]) == 0
+
+
+def test_fisheye624_inverse_distortion():
+    """The approximate Fisheye624 unprojection matches the exact unprojection."""
+    torch.manual_seed(0)
+    camera_params = torch.tensor(
+        [30.0, 30.0, 32.0, 24.0, 0.03, -0.01, 0.002, 0.0, 0.0, 0.0, 0.0005, -0.0003, 0.0001, 0.0, 0.0001, 0.0]
+    )
+    inverse_distortion = InverseDistortionApproximation(tolerance=0.01)
+    report = inverse_distortion.fit_fisheye624(camera_params, (64, 48), num_cameras=2)
+    assert report.model == "fisheye624" and report.accepted and report.max_error <= 0.01
+
+    coords = torch.rand(1000, 2) * torch.tensor([64.0, 48.0])
+    expected = camera_utils.fisheye624_unproject(coords, camera_params[None])
+    directions = inverse_distortion.fisheye624_unproject(coords, camera_params[None])
+    assert directions.shape == expected.shape
+    # Reprojecting the directions, switching back to the OpenCV convention, gives back the pixels.
+    reprojected = camera_utils.fisheye624_project(directions * torch.tensor([1.0, -1.0, -1.0]), camera_params[None])
+    assert (reprojected[0] - coords).norm(dim=-1).max() <= 0.01
@@ -0,0 +1,29 @@
+"""
+Test the image dataloaders
+"""
+
+from pathlib import Path
+
+from torch.utils.data import ConcatDataset
+
+from nerfstudio.data.dataparsers.blender_dataparser import BlenderDataParserConfig
+from nerfstudio.data.datasets.base_dataset import InputDataset
+from nerfstudio.data.utils.dataloaders import CacheDataloader
+
+LEGO_DATA_PATH = Path(__file__).parent / "lego_test"
+
+
+def test_cache_dataloader_prefetch_images():
+    """New image subsets are loaded in the background"""
+    dataparser = BlenderDataParserConfig(data=LEGO_DATA_PATH).setup()
+    dataset = InputDataset(dataparser.get_dataparser_outputs(split="train"))
+    dataset = ConcatDataset([dataset, dataset])
+    dataloader = CacheDataloader(
+        dataset, num_images_to_sample_from=1, num_times_to_repeat_images=1, prefetch_images=True
+    )
+    batches = iter(dataloader)
+    first = next(batches)
+    assert next(batches) is first
+    assert dataloader._next_collated_batch is not None
+    second = next(batches)
+    assert second is not first and second["image"].shape == first["image"].shape
@@ -1,6 +1,6 @@
 import pickle
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, Optional, Type
 
 import pytest
 import torch
@@ -13,8 +13,17 @@ from nerfstudio.data.datamanagers.base_datamanager import (
     VanillaDataManager,
     VanillaDataManagerConfig,
 )
+from nerfstudio.data.datamanagers.full_images_datamanager import (
+    FullImageDatamanager,
+    FullImageDatamanagerConfig,
+    LazyEvalImages,
+)
+from nerfstudio.data.dataparsers.blender_dataparser import BlenderDataParserConfig
 from nerfstudio.data.datasets.base_dataset import InputDataset
 from nerfstudio.data.datasets.depth_dataset import DepthDataset
+from nerfstudio.data.utils.image_cache import LRUImageCache
+
+LEGO_DATA_PATH = Path(__file__).parent / "lego_test"
 
 
 class DummyDataParser:
@@ -153,3 +162,165 @@ def test_deserialize_config2():
         config_str = f.read()
     obj = yaml.load(config_str, Loader=yaml.Loader)
     obj.pipeline.datamanager.collate_fn([1, 2, 3])
+
+
+def test_full_image_datamanager_undistorted_cache(tmp_path: Path):
+    """Undistorted images and intrinsics are restored from the cache"""
+
+    def setup_datamanager() -> FullImageDatamanager:
+        config = FullImageDatamanagerConfig(
+            dataparser=BlenderDataParserConfig(data=LEGO_DATA_PATH),
+            undistorted_cache_dir=tmp_path,
+            cache_images_type="uint8",
+        )
+        datamanager = config.setup(device="cpu")
+        datamanager.train_dataset.cameras.distortion_params = torch.tensor([[0.1, 0.01, 0.0, 0.0, 0.001, 0.001]])
+        return datamanager
+
+    undistorted = setup_datamanager()
+    reference = undistorted.cached_train
+    assert len(list(tmp_path.glob("undistorted_*.shard"))) == 1
+
+    cached = setup_datamanager()
+    assert torch.equal(cached.cached_train[0]["image"], reference[0]["image"])
+    for name in ("fx", "fy", "cx", "cy", "width", "height"):
+        assert torch.equal(
+            getattr(cached.train_dataset.cameras, name), getattr(undistorted.train_dataset.cameras, name)
+        )
+
+
+class _ExtrasDataset(InputDataset):
+    """Dataset returning non-tensor entries alongside the images"""
+
+    def get_metadata(self, data: Dict) -> Dict:
+        return {"depth_unit_scale_factor": 0.5, "frame": {"name": f"frame_{data['image_idx']}", "tags": ["a", "b"]}}
+
+
+class _UncacheableExtrasDataset(InputDataset):
+    """Dataset returning non-tensor entries that can't be stored as json"""
+
+    def get_metadata(self, data: Dict) -> Dict:
+        return {"frame_range": (0, data["image_idx"])}
+
+
+def test_full_image_datamanager_undistorted_cache_extras(tmp_path: Path):
+    """Cached image data dictionaries match the uncached ones key for key"""
+
+    def setup_datamanager(dataset_type: Type[InputDataset], cache_dir: Optional[Path]) -> FullImageDatamanager:
+        config = FullImageDatamanagerConfig(
+            dataparser=BlenderDataParserConfig(data=LEGO_DATA_PATH),
+            undistorted_cache_dir=cache_dir,
+            cache_images_type="uint8",
+        )
+        return FullImageDatamanager[dataset_type](config, device="cpu")
+
+    uncached = setup_datamanager(_ExtrasDataset, None).cached_train
+    setup_datamanager(_ExtrasDataset, tmp_path).cached_train
+    assert len(list(tmp_path.glob("undistorted_*.shard"))) == 1
+    cached = setup_datamanager(_ExtrasDataset, tmp_path).cached_train
+    assert len(cached) == len(uncached)
+    for cached_data, uncached_data in zip(cached, uncached):
+        assert cached_data.keys() == uncached_data.keys()
+        for key, value in uncached_data.items():
+            if isinstance(value, torch.Tensor):
+                assert torch.equal(cached_data[key], value)
+            else:
+                assert cached_data[key] == value
+
+    # Entries that would change when stored are kept, and the images are not cached.
+    for max_resident_images in (-1, 1):
+        cache_dir = tmp_path / f"uncacheable_{max_resident_images}"
+        config = FullImageDatamanagerConfig(
+            dataparser=BlenderDataParserConfig(data=LEGO_DATA_PATH),
+            undistorted_cache_dir=cache_dir,
+            max_resident_images=max_resident_images,
+            cache_images_type="uint8",
+        )
+        datamanager = FullImageDatamanager[_UncacheableExtrasDataset](config, device="cpu")
+        assert datamanager.cached_train[1]["frame_range"] == (0, 1)
+        assert not list(cache_dir.glob("*.shard"))
+
+
+def test_full_image_datamanager_max_resident_images():
+    """Images are streamed through a bounded cache"""
+    config = FullImageDatamanagerConfig(
+        dataparser=BlenderDataParserConfig(data=LEGO_DATA_PATH), max_resident_images=1, cache_images_type="uint8"
+    )
+    datamanager = config.setup(device="cpu")
+    camera, data = datamanager.next_train(0)
+    camera, data = datamanager.next_train(1)
+    assert isinstance(datamanager.cached_train, LRUImageCache)
+    assert data["image"].shape[:2] == (camera.height.item(), camera.width.item())
+    assert datamanager.cached_train.get_stats()["resident"] == 1
+    eval_dataloader = datamanager.fixed_indices_eval_dataloader
+    assert isinstance(eval_dataloader, LazyEvalImages)
+    assert len(eval_dataloader) == len(datamanager.eval_dataset)
+    for camera, data in eval_dataloader:
+        assert data["image"].shape[:2] == (camera.height.item(), camera.width.item())
+
+
+def test_full_image_datamanager_max_resident_images_undistorted_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """In bounded-memory mode, the undistorted image cache is built on first use and images are reloaded from it"""
+
+    def setup_datamanager() -> FullImageDatamanager:
+        config = FullImageDatamanagerConfig(
+            dataparser=BlenderDataParserConfig(data=LEGO_DATA_PATH),
+            undistorted_cache_dir=tmp_path,
+            max_resident_images=1,
+            cache_images_type="uint8",
+        )
+        datamanager = config.setup(device="cpu")
+        datamanager.eval_dataset.cameras.distortion_params = torch.tensor(
+            [[0.1, 0.01, 0.0, 0.0, 0.001, 0.001]]
+        ).repeat(len(datamanager.eval_dataset), 1)
+        return datamanager
+
+    reference = setup_datamanager()
+    reference_images = [data["image"].clone() for _, data in reference.fixed_indices_eval_dataloader]
+    assert len(list(tmp_path.glob("undistorted_*.shard"))) >= 1
+
+    def undistort_idx(*args, **kwargs):
+        raise AssertionError("Images are undistorted again instead of being read from the cache")
+
+    monkeypatch.setattr(FullImageDatamanager, "_undistort_idx", undistort_idx)
+    cached = setup_datamanager()
+    # Iterate twice so that images are reloaded after being evicted.
+    for _ in range(2):
+        for idx, (camera, data) in enumerate(cached.fixed_indices_eval_dataloader):
+            assert torch.equal(data["image"], reference_images[idx])
+            assert torch.equal(camera.fx, reference.eval_dataset.cameras.fx[idx : idx + 1])
+
+
+def test_fixed_indices_eval_dataloader_distorted_cameras():
+    """Eval images are paired with the intrinsics of the undistorted images"""
+    for max_resident_images in (-1, 1):
+        config = FullImageDatamanagerConfig(
+            dataparser=BlenderDataParserConfig(data=LEGO_DATA_PATH),
+            max_resident_images=max_resident_images,
+            cache_images_type="uint8",
+        )
+        datamanager = config.setup(device="cpu")
+        distorted_cameras = datamanager.eval_dataset.cameras
+        distorted_cameras.distortion_params = torch.tensor([[0.1, 0.01, 0.0, 0.0, 0.001, 0.001]]).repeat(
+            len(distorted_cameras), 1
+        )
+        distorted_fx = distorted_cameras.fx.clone()
+        for idx, (camera, data) in enumerate(datamanager.fixed_indices_eval_dataloader):
+            assert data["image"].shape[:2] == (camera.height.item(), camera.width.item())
+            assert camera.fx.item() != distorted_fx[idx].item()
+            assert torch.equal(camera.fx, datamanager.eval_dataset.cameras.fx[idx : idx + 1])
+
+
+def test_lazy_eval_images():
+    """Iterating over the eval images keeps at most max_resident_images of them in memory"""
+    num_images = 5
+    cache = LRUImageCache(lambda idx: {"image": torch.full((2, 2, 3), idx)}, num_images, max_resident_images=2)
+    cameras = Cameras(camera_to_worlds=torch.eye(4)[None, :3].repeat(num_images, 1, 1), fx=1.0, fy=1.0, cx=1.0, cy=1.0)
+    eval_images = LazyEvalImages(cameras, cache, device="cpu", num_prefetch_images=1)
+    assert len(eval_images) == num_images
+    for idx, (camera, data) in enumerate(eval_images):
+        assert camera.shape == (1,)
+        assert data["image"][0, 0, 0] == idx
+        assert cache.get_stats()["resident"] <= 2
+    assert cache.get_stats()["evictions"] >= num_images - 2
+    assert eval_images[-1][1]["image"][0, 0, 0] == num_images - 1
@@ -0,0 +1,85 @@
+"""
+Test the persistent decoded-image cache
+"""
+
+import pickle
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from nerfstudio.data.dataparsers.blender_dataparser import BlenderDataParserConfig
+from nerfstudio.data.datasets.base_dataset import InputDataset
+from nerfstudio.data.utils.image_cache import ImageShard, ImageShardWriter, LRUImageCache
+
+LEGO_DATA_PATH = Path(__file__).parent / "lego_test"
+
+
+def test_image_shard_roundtrip(tmp_path: Path):
+    """Arrays written to a shard are returned unchanged"""
+    path = tmp_path / "test.shard"
+    writer = ImageShardWriter(path)
+    arrays = [
+        {"image": np.random.randint(0, 255, (5, 7, 3), dtype=np.uint8), "mask": np.random.rand(5, 7, 1) > 0.5},
+        {"image": np.random.randint(0, 255, (3, 2, 4), dtype=np.uint8)},
+    ]
+    for record in arrays:
+        writer.append(record)
+    writer.close(metadata={"foo": 1})
+
+    shard = pickle.loads(pickle.dumps(ImageShard(path)))
+    assert len(shard) == 2
+    assert shard.metadata == {"foo": 1}
+    assert not shard.has(1, "mask")
+    for i, record in enumerate(arrays):
+        for name, array in record.items():
+            cached = shard.get(i, name)
+            assert cached.dtype == array.dtype
+            np.testing.assert_array_equal(cached, array)
+
+
+def test_input_dataset_image_cache(tmp_path: Path):
+    """Images loaded through the cache match the decoded images"""
+    dataparser = BlenderDataParserConfig(data=LEGO_DATA_PATH).setup()
+    outputs = dataparser.get_dataparser_outputs(split="train")
+    reference = InputDataset(outputs, scale_factor=0.5)
+    dataset = InputDataset(outputs, scale_factor=0.5)
+    dataset.setup_image_cache(tmp_path)
+    assert dataset.image_cache is not None
+    assert len(list(tmp_path.glob("*.shard"))) == 1
+
+    # A second dataset reuses the existing shard.
+    cached = InputDataset(outputs, scale_factor=0.5)
+    cached.setup_image_cache(tmp_path)
+    assert cached.image_cache is not None and cached.image_cache.path == dataset.image_cache.path
+    # The cache returns the same images as decoding, including the alpha channel.
+    assert reference.get_numpy_image(0).shape[-1] == 4
+    np.testing.assert_array_equal(cached.get_numpy_image(0), reference.get_numpy_image(0))
+    assert torch.equal(cached.get_image_uint8(0), reference.get_image_uint8(0))
+    assert torch.equal(cached.get_image_float32(0), reference.get_image_float32(0))
+
+    # Changing the scale factor results in a new shard.
+    InputDataset(outputs, scale_factor=0.25).setup_image_cache(tmp_path)
+    assert len(list(tmp_path.glob("*.shard"))) == 2
+
+
+def test_lru_image_cache():
+    """Only the most recently used images stay resident"""
+    loaded = []
+
+    def load_fn(idx: int):
+        loaded.append(idx)
+        return {"image": torch.full((2, 2, 3), idx)}
+
+    cache = LRUImageCache(load_fn, num_images=5, max_resident_images=2)
+    assert cache[0]["image"][0, 0, 0] == 0
+    assert cache[0]["image"][0, 0, 0] == 0
+    cache.prefetch([1, 2])
+    assert cache[2]["image"][0, 0, 0] == 2
+    assert cache[1]["image"][0, 0, 0] == 1
+    assert cache[0]["image"][0, 0, 0] == 0
+    stats = cache.get_stats()
+    assert stats["resident"] == 2
+    assert stats["hits"] + stats["misses"] == 5
+    assert loaded.count(0) == 2
+    assert [data["image"][0, 0, 0] for data in cache] == list(range(5))
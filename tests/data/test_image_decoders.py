@@ -0,0 +1,37 @@
+"""
+Test the image decoding backends
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from nerfstudio.data.utils.image_decoders import get_image_decoder, get_jpeg_size
+
+
+@pytest.mark.parametrize("suffix", [".jpg", ".png"])
+@pytest.mark.parametrize("scale_factor", [1.0, 0.5, 0.25])
+@pytest.mark.parametrize("reduced_decoding", [False, True])
+def test_image_decoders(tmp_path: Path, suffix: str, scale_factor: float, reduced_decoding: bool):
+    """All decoders return images close to a full resolution Pillow decode"""
+    image = np.tile(np.linspace(0, 255, 101, dtype=np.uint8)[None, :, None], (75, 1, 3))
+    filepath = tmp_path / f"image{suffix}"
+    Image.fromarray(image).save(filepath)
+
+    reference = get_image_decoder("pil", reduced_decoding=False).decode(filepath, scale_factor)
+    assert reference.shape == (int(75 * scale_factor), int(101 * scale_factor), 3)
+    for name in ("pil", "opencv"):
+        decoded = get_image_decoder(name, reduced_decoding=reduced_decoding).decode(filepath, scale_factor)
+        assert decoded.dtype == np.uint8 and decoded.shape == reference.shape
+        assert np.abs(decoded.astype(np.float32) - reference).mean() < 4
+        if name == "pil" and not reduced_decoding:
+            np.testing.assert_array_equal(decoded, reference)
+
+
+def test_get_jpeg_size(tmp_path: Path):
+    """The size is read from the JPEG header"""
+    filepath = tmp_path / "image.jpg"
+    Image.fromarray(np.zeros((75, 101, 3), dtype=np.uint8)).save(filepath)
+    assert get_jpeg_size(np.fromfile(filepath, dtype=np.uint8)) == (101, 75)
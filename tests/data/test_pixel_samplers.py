@@ -0,0 +1,90 @@
+"""
+Test the pixel samplers
+"""
+
+import pytest
+import torch
+
+from nerfstudio.data.pixel_samplers import ErrorDrivenPixelSamplerConfig, IndexedPixelSamplerConfig
+
+
+def test_indexed_pixel_sampler_mask():
+    """Only pixels inside the masks are sampled, and sampled values match the indices"""
+    image = torch.rand(3, 8, 10, 3)
+    mask = torch.zeros(3, 8, 10, 1, dtype=torch.bool)
+    mask[0, 2:4, 3:5] = True
+    mask[2, 7, 9] = True
+    image_batch = {"image": image, "mask": mask, "image_idx": torch.tensor([4, 5, 6])}
+    sampler = IndexedPixelSamplerConfig(num_rays_per_batch=256).setup()
+
+    pixel_batch = sampler.sample(image_batch)
+    assert pixel_batch["image"].shape == (256, 3)
+    assert pixel_batch["mask"].all()
+    c, y, x = pixel_batch["indices"].unbind(-1)
+    assert set(c.tolist()) <= {4, 6}
+    assert torch.equal(pixel_batch["image"], image[c - 4, y, x])
+
+
+def test_indexed_pixel_sampler_list():
+    """Images of different resolutions are sampled with fisheye and equirectangular layouts"""
+    images = [torch.rand(6, 8, 3), torch.rand(10, 4, 3)]
+    image_batch = {"image": images, "image_idx": torch.tensor([0, 1])}
+
+    sampler = IndexedPixelSamplerConfig(num_rays_per_batch=512, fisheye_crop_radius=2.0).setup()
+    c, y, x = sampler.sample(image_batch)["indices"].unbind(-1)
+    heights, widths = torch.tensor([6, 10])[c], torch.tensor([8, 4])[c]
+    assert ((x + 0.5 - widths // 2) ** 2 + (y + 0.5 - heights // 2) ** 2 <= 4.0).all()
+
+    sampler = IndexedPixelSamplerConfig(num_rays_per_batch=512, is_equirectangular=True).setup()
+    pixel_batch = sampler.sample(image_batch)
+    c, y, x = pixel_batch["indices"].unbind(-1)
+    assert ((y < torch.tensor([6, 10])[c]) & (x < torch.tensor([8, 4])[c])).all()
+    assert torch.equal(pixel_batch["image"][c == 1], images[1][y[c == 1], x[c == 1]])
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="requires CUDA")
+def test_indexed_pixel_sampler_mixed_devices():
+    """Images on the GPU are sampled with masks left on the CPU, as with images_on_gpu and not masks_on_gpu"""
+    image = torch.rand(2, 8, 10, 3, device="cuda")
+    mask = torch.ones(2, 8, 10, 1, dtype=torch.bool)
+    mask[0, :4] = False
+    image_batch = {"image": image, "mask": mask, "image_idx": torch.tensor([0, 1])}
+    for config in (
+        IndexedPixelSamplerConfig(num_rays_per_batch=64),
+        ErrorDrivenPixelSamplerConfig(num_rays_per_batch=64),
+    ):
+        pixel_batch = config.setup().sample(image_batch)
+        assert pixel_batch["image"].device.type == "cuda"
+        assert pixel_batch["mask"].device.type == "cpu"
+        assert pixel_batch["mask"].all()
+        c, y, x = pixel_batch["indices"].unbind(-1)
+        assert torch.equal(pixel_batch["image"], image[c, y, x])
+
+
+def test_error_driven_pixel_sampler():
+    """Rays concentrate in the cells with the highest reported losses"""
+    image_batch = {"image": torch.rand(2, 16, 20, 3), "image_idx": torch.tensor([0, 1])}
+    for mask in (None, torch.ones(2, 16, 20, 1, dtype=torch.bool)):
+        if mask is not None:
+            mask[:, :, :2] = False
+            image_batch["mask"] = mask
+        config = ErrorDrivenPixelSamplerConfig(
+            num_rays_per_batch=1024,
+            loss_map_resolution=4,
+            loss_map_momentum=0.0,
+            uniform_fraction=0.1,
+            refresh_every=1,
+        )
+        sampler = config.setup(num_images=2)
+        pixel_batch = sampler.sample(image_batch)
+        c, y, x = pixel_batch["indices"].unbind(-1)
+        assert torch.equal(pixel_batch["image"], image_batch["image"][c, y, x])
+        assert torch.equal(pixel_batch["loss_map_cells"], c * 16 + (y // 4) * 4 + x // 5)
+        if mask is not None:
+            assert (x >= 2).all()
+
+        losses = (pixel_batch["loss_map_cells"] == 16 + 5).float() * 100
+        sampler.update_loss_map(pixel_batch["loss_map_cells"], losses)
+        c, y, x = sampler.sample(image_batch)["indices"].unbind(-1)
+        in_cell = (c == 1) & (y // 4 == 1) & (x // 5 == 1)
+        assert in_cell.float().mean() > 0.5
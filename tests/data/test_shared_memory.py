@@ -0,0 +1,84 @@
+"""
+Test the tensors and buffers shared between data loading processes
+"""
+
+import dataclasses
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from nerfstudio.data.datamanagers.parallel_datamanager import cache_images_to_shared_memory
+from nerfstudio.data.dataparsers.blender_dataparser import BlenderDataParserConfig
+from nerfstudio.data.datasets.base_dataset import InputDataset
+from nerfstudio.data.utils.nerfstudio_collate import nerfstudio_collate
+from nerfstudio.data.utils.shared_memory import SharedTensor, SharedTensorRing
+
+LEGO_DATA_PATH = Path(__file__).parent / "lego_test"
+
+
+def test_shared_tensor_pickle():
+    """Pickled shared tensors map the same memory"""
+    shared = SharedTensor.from_tensor(torch.arange(12, dtype=torch.uint8).reshape(3, 4))
+    attached = pickle.loads(pickle.dumps(shared))
+    assert attached.path == shared.path
+    assert torch.equal(attached.tensor, shared.tensor)
+    shared.tensor[0, 0] = 42
+    assert attached.tensor[0, 0] == 42
+    path = shared.path
+    del shared
+    assert not path.exists()
+
+
+def test_shared_tensor_ring():
+    """Batches read from the ring match the batches written to it"""
+    template = {"rays": torch.zeros(4, 3), "indices": torch.zeros(4, 3, dtype=torch.int64)}
+    ring = SharedTensorRing(template, num_slots=2)
+    batches = [{"rays": torch.rand(4, 3), "indices": torch.randint(0, 10, (4, 3))} for _ in range(2)]
+    for batch in batches:
+        ring.put(batch)
+    for batch in batches:
+        received = ring.get()
+        assert all(torch.equal(received[key], batch[key]) for key in batch)
+    ring.close()
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="requires CUDA")
+def test_shared_tensor_ring_pinned():
+    """Slots pinned for asynchronous copies are unregistered when the ring is closed"""
+    template = {"rays": torch.zeros(4, 3)}
+    ring = SharedTensorRing(template, num_slots=1)
+    batch = {"rays": torch.rand(4, 3)}
+    ring.put(batch)
+    received = ring.get("cuda")
+    assert ring._pinned == {0: True}
+    assert torch.equal(received["rays"].cpu(), batch["rays"])
+    ring.close()
+    assert ring._pinned == {}
+    # The slot can only be registered again if it was unregistered.
+    tensor = ring.slots[0]["rays"].tensor
+    cudart = torch.cuda.cudart()
+    assert int(cudart.cudaHostRegister(tensor.data_ptr(), tensor.numel() * tensor.element_size(), 0)) == 0
+    assert int(cudart.cudaHostUnregister(tensor.data_ptr())) == 0
+
+
+def test_shared_memory_images_mask_color(tmp_path: Path):
+    """Masked images stay uint8 in shared memory, with the mask color in [0, 255]"""
+    outputs = BlenderDataParserConfig(data=LEGO_DATA_PATH).setup().get_dataparser_outputs(split="train")
+    reference = InputDataset(outputs).get_image_uint8(0)
+    mask = np.zeros(reference.shape[:2], dtype=np.uint8)
+    mask[:, : mask.shape[1] // 2] = 255
+    mask_filename = tmp_path / "mask.png"
+    Image.fromarray(mask).save(mask_filename)
+    outputs = dataclasses.replace(
+        outputs, mask_filenames=[mask_filename], metadata={**outputs.metadata, "mask_color": (0.0, 0.5, 1.0)}
+    )
+
+    batch = cache_images_to_shared_memory(InputDataset(outputs), nerfstudio_collate)
+    image = batch["image"].tensor[0]
+    assert image.dtype == torch.uint8
+    assert torch.equal(image[:, : mask.shape[1] // 2], reference[:, : mask.shape[1] // 2])
+    assert torch.all(image[:, mask.shape[1] // 2 :] == torch.tensor([0, 128, 255], dtype=torch.uint8))
@@ -93,3 +93,26 @@ def test_nerfstudio_dataparser_split_filelist(mocked_dataset):
         mocked_dataset / "images_4/img_4.png",
         mocked_dataset / "images_4/img_5.png",
     ]
+
+
+def test_nerfstudio_dataparser_packed(mocked_dataset):
+    """Packed datasets are parsed and loaded like the original dataset"""
+    from nerfstudio.data.dataparsers.nerfstudio_dataparser import NerfstudioDataParserConfig
+    from nerfstudio.data.datasets.base_dataset import InputDataset
+    from nerfstudio.data.utils.dataset_archive import pack_dataset
+
+    archive_path = mocked_dataset / "dataset.nspack"
+    archive = pack_dataset(mocked_dataset, archive_path)
+    assert len(archive.files) == 10
+
+    outputs = []
+    for data in (mocked_dataset, archive_path):
+        parser = NerfstudioDataParserConfig(
+            data=data, downscale_factor=4, orientation_method="none", center_method="none", auto_scale_poses=False
+        ).setup()
+        outputs.append(parser.get_dataparser_outputs("train"))
+    original, packed = outputs
+    assert [path.relative_to(archive_path) for path in packed.image_filenames] == [
+        path.relative_to(mocked_dataset) for path in original.image_filenames
+    ]
+    assert np.array_equal(InputDataset(packed).get_numpy_image(0), InputDataset(original).get_numpy_image(0))
@@ -169,6 +169,24 @@ def test_tensor_hash_encoder():
     assert encoded_tcnn.shape == (10, out_dim)
 
 
+def test_fused_hash_encoder():
+    """Test that the fused hash encoding matches the reference implementation, values and gradients"""
+    encoder = encodings.HashEncoding(num_levels=4, features_per_level=2, log2_hashmap_size=5, implementation="torch")
+    # Include points outside of the unit cube and on grid vertices.
+    in_tensor = torch.cat([torch.rand((64, 3)) * 1.2 - 0.1, torch.zeros((1, 3)), torch.ones((1, 3))])
+    in_tensor = in_tensor.reshape(2, 33, 3).requires_grad_()
+    encoded_reference = encoder.pytorch_fwd(in_tensor)
+    encoded_fused = encoder.fused_fwd(in_tensor)
+    assert encoded_fused.shape == (2, 33, 8)
+    assert torch.allclose(encoded_fused, encoded_reference, atol=1e-7)
+
+    grad_output = torch.randn_like(encoded_reference)
+    grads_reference = torch.autograd.grad(encoded_reference, [in_tensor, encoder.hash_table], grad_output)
+    grads_fused = torch.autograd.grad(encoded_fused, [in_tensor, encoder.hash_table], grad_output)
+    for grad_reference, grad_fused in zip(grads_reference, grads_fused):
+        assert torch.allclose(grad_fused, grad_reference, atol=1e-5)
+
+
 def test_kplane_encoder():
     """Test K-Planes encoder"""
 
@@ -203,3 +221,4 @@ if __name__ == "__main__":
     test_tensor_cp_encoder()
     test_tensor_sh_encoder()
     test_tensor_hash_encoder()
+    test_fused_hash_encoder()
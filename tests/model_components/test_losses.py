@@ -4,7 +4,9 @@ Test losses
 
 import torch
 
-from nerfstudio.model_components.losses import tv_loss
+from nerfstudio.cameras.rays import PackedRaySamples, RayBundle
+from nerfstudio.model_components.losses import distortion_loss, interlevel_loss, tv_loss
+from nerfstudio.model_components.ray_samplers import UniformSampler
 
 
 def test_tv_loss():
@@ -24,5 +26,43 @@ def test_tv_loss():
     assert tv_loss(grids).item() == 4.0
 
 
+def test_packed_ray_samples_losses():
+    """Test that the losses give the same values for dense and packed samples"""
+    num_rays = 6
+    ray_bundle = RayBundle(
+        origins=torch.zeros((num_rays, 3)),
+        directions=torch.ones((num_rays, 3)),
+        pixel_area=torch.ones((num_rays, 1)),
+        nears=torch.zeros((num_rays, 1)),
+        fars=torch.ones((num_rays, 1)) * 4,
+    )
+    ray_samples_list = [UniformSampler(num_samples=num_samples)(ray_bundle) for num_samples in (16, 12)]
+    weights_list = [ray_samples.get_weights(torch.rand((*ray_samples.shape, 1))) for ray_samples in ray_samples_list]
+    # The samples without weight don't change the losses, so culling them only changes the average.
+    masks = [torch.rand(weights.shape[:-1]) > 0.3 for weights in weights_list]
+    masks[-1][0] = False
+    weights_list = [weights * mask[..., None] for weights, mask in zip(weights_list, masks)]
+
+    packed_ray_samples_list = [
+        PackedRaySamples.from_dense(ray_samples, mask) for ray_samples, mask in zip(ray_samples_list, masks)
+    ]
+    packed_weights_list = [weights[mask] for weights, mask in zip(weights_list, masks)]
+    densities = torch.rand((*ray_samples_list[0].shape, 1))
+    assert torch.allclose(
+        PackedRaySamples.from_dense(ray_samples_list[0]).get_weights(densities.view(-1, 1)),
+        ray_samples_list[0].get_weights(densities).view(-1, 1),
+    )
+
+    dense_interlevel = interlevel_loss(weights_list, ray_samples_list) * weights_list[-1][..., 0].numel()
+    packed_interlevel = interlevel_loss(packed_weights_list, packed_ray_samples_list) * len(packed_weights_list[-1])
+    assert torch.allclose(dense_interlevel, packed_interlevel, atol=1e-5)
+    assert torch.allclose(
+        distortion_loss(weights_list, ray_samples_list),
+        distortion_loss(packed_weights_list, packed_ray_samples_list),
+        atol=1e-6,
+    )
+
+
 if __name__ == "__main__":
     test_tv_loss()
+    test_packed_ray_samples_losses()
@@ -0,0 +1,55 @@
+"""
+Test the occupancy bitfield
+"""
+
+import torch
+
+from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+from nerfstudio.model_components.occupancy_grid import OccupancyBitfield
+from nerfstudio.model_components.ray_samplers import UniformLinDispPiecewiseSampler
+
+
+def sphere_density_fn(positions: torch.Tensor) -> torch.Tensor:
+    """Opaque sphere of radius 0.3 at the origin"""
+    return (positions.norm(dim=-1, keepdim=True) < 0.3).float() * 100.0
+
+
+def test_occupancy_bitfield():
+    """Test baking, querying and clipping rays with the occupancy bitfield"""
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    grid = OccupancyBitfield(aabb, spatial_distortion=SceneContraction(order=float("inf")), resolution=32)
+    assert not grid.is_baked
+    coords = torch.rand((100, 3))
+    assert torch.allclose(grid.normalize(grid.denormalize(coords)), coords, atol=1e-4)
+
+    grid.bake([sphere_density_fn])
+    assert grid.is_baked and grid.bitfield.shape == (2 * 32**3 // 8,)
+    occupied = grid.query(torch.tensor([[0.0, 0.0, 0.0], [0.29, 0.0, 0.0], [0.8, 0.0, 0.0], [50.0, 0.0, 0.0]]))
+    assert occupied.tolist() == [True, True, False, False]
+    fine_occupancy, coarse_occupancy = grid.occupancy()
+    assert 0.0 < coarse_occupancy < fine_occupancy < 0.1
+
+    ray_bundle = RayBundle(
+        origins=torch.tensor([[0.0, 0.0, -3.0], [0.0, 2.0, -3.0]]),
+        directions=torch.tensor([[0.0, 0.0, 1.0], [0.0, 0.0, 1.0]]),
+        pixel_area=torch.ones((2, 1)),
+        nears=torch.full((2, 1), 0.05),
+        fars=torch.full((2, 1), 1000.0),
+    )
+    sampler = UniformLinDispPiecewiseSampler()
+    sampler.eval()
+    clipped = grid.clip_ray_bundle(ray_bundle, sampler, num_steps=256)
+    assert clipped.nears is not None and clipped.fars is not None
+    # The first ray hits the sphere between 2.7 and 3.3.
+    assert 2.4 < clipped.nears[0, 0] <= 2.7 and 3.3 <= clipped.fars[0, 0] < 3.6
+    # The second ray misses it.
+    assert clipped.nears[1, 0] == clipped.fars[1, 0] == 1000.0
+
+    # The baked grid is saved with the model, and models from before it existed still load.
+    loaded = OccupancyBitfield(aabb, spatial_distortion=SceneContraction(order=float("inf")), resolution=32)
+    loaded.load_state_dict(grid.state_dict())
+    assert torch.equal(loaded.bitfield, grid.bitfield)
+    loaded = OccupancyBitfield(aabb, spatial_distortion=SceneContraction(order=float("inf")), resolution=32)
+    loaded.load_state_dict({})
+    assert not loaded.is_baked
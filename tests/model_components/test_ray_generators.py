@@ -0,0 +1,60 @@
+"""
+Test ray generators
+"""
+
+import torch
+
+from nerfstudio.cameras.cameras import Cameras, CameraType
+from nerfstudio.model_components.ray_generators import RayGenerator
+
+
+def _get_cameras() -> Cameras:
+    """Four cameras in two intrinsics groups with different image sizes, and a fisheye camera."""
+    num_cameras = 5
+    rotations = torch.linalg.qr(torch.randn(num_cameras, 3, 3))[0]
+    c2w = torch.cat([rotations, torch.randn(num_cameras, 3, 1)], dim=-1)
+    distortion_params = torch.zeros(num_cameras, 6)
+    distortion_params[:2, 0] = 0.1
+    distortion_params[:2, 3] = 0.01
+    return Cameras(
+        camera_to_worlds=c2w,
+        fx=torch.tensor([40.0, 40.0, 30.0, 30.0, 20.0])[:, None],
+        fy=torch.tensor([40.0, 40.0, 30.0, 30.0, 20.0])[:, None],
+        cx=torch.tensor([16.0, 16.0, 12.0, 12.0, 10.0])[:, None],
+        cy=torch.tensor([12.0, 12.0, 8.0, 8.0, 10.0])[:, None],
+        width=torch.tensor([32, 32, 24, 24, 20])[:, None],
+        height=torch.tensor([24, 24, 16, 16, 20])[:, None],
+        distortion_params=distortion_params,
+        camera_type=torch.tensor([CameraType.PERSPECTIVE.value] * 4 + [CameraType.FISHEYE.value])[:, None],
+    )
+
+
+def _get_ray_indices(cameras: Cameras, num_rays: int) -> torch.Tensor:
+    c = torch.randint(0, cameras.shape[0], (num_rays,))
+    y = (torch.rand(num_rays) * cameras.height[c, 0]).long()
+    x = (torch.rand(num_rays) * cameras.width[c, 0]).long()
+    return torch.stack([c, y, x], dim=-1)
+
+
+def test_direction_lut_matches_generate_rays():
+    """Rays generated from the lookup table match the rays generated on the fly, including when some cameras
+    don't fit in the memory budget."""
+    torch.manual_seed(0)
+    cameras = _get_cameras()
+    ray_indices = _get_ray_indices(cameras, 512)
+    expected = RayGenerator(cameras)(ray_indices)
+
+    # Only the 24 x 16 group fits, the other groups are generated on the fly.
+    budget_mb = 24 * 16 * 5 * 4 / 1024**2
+    for max_lut_memory_mb in (512.0, budget_mb):
+        ray_generator = RayGenerator(cameras, use_direction_lut=True, max_lut_memory_mb=max_lut_memory_mb)
+        ray_bundle = ray_generator(ray_indices)
+        assert torch.allclose(ray_bundle.origins, expected.origins, atol=1e-5)
+        assert torch.allclose(ray_bundle.directions, expected.directions, atol=1e-5)
+        assert torch.allclose(ray_bundle.pixel_area, expected.pixel_area, rtol=1e-4)
+        assert ray_bundle.times is None
+        assert torch.equal(ray_bundle.camera_indices, expected.camera_indices)
+        assert torch.allclose(ray_bundle.metadata["directions_norm"], expected.metadata["directions_norm"], atol=1e-5)
+
+    assert ray_generator.lut_offsets is not None
+    assert ray_generator.lut_offsets.tolist() == [-1, -1, 0, 0, -1]
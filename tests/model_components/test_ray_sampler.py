@@ -9,6 +9,7 @@ from nerfstudio.model_components.ray_samplers import (
     LinearDisparitySampler,
     LogSampler,
     PDFSampler,
+    ProposalNetworkSampler,
     SqrtSampler,
     UniformSampler,
 )
@@ -107,7 +108,36 @@ def test_pdf_sampler():
 
     # TODO Tancik: Add more precise tests
 
+    # The included original bins are merged in order
+    pdf_sampler = PDFSampler(num_samples, include_original=True)
+    ray_samples = pdf_sampler(ray_bundle, coarse_ray_samples, torch.rand((10, num_samples, 1)), num_samples)
+    assert ray_samples.spacing_starts is not None
+    assert (ray_samples.spacing_starts[..., 1:, 0] >= ray_samples.spacing_starts[..., :-1, 0]).all()
+
+
+def test_proposal_network_sampler_inference():
+    """Test that the inference pipeline of the proposal sampler gives the same samples"""
+    origins = torch.zeros((10, 3))
+    directions = torch.nn.functional.normalize(torch.randn((10, 3)), dim=-1)
+    ray_bundle = RayBundle(origins=origins, directions=directions, pixel_area=torch.ones((10, 1)))
+    ray_bundle = NearFarCollider(near_plane=0.05, far_plane=100)(ray_bundle)
+
+    def density_fn(positions):
+        return 10.0 * torch.exp(-((torch.linalg.norm(positions, dim=-1, keepdim=True) - 1.0) ** 2))
+
+    sampler = ProposalNetworkSampler(num_proposal_samples_per_ray=(32, 16), num_nerf_samples_per_ray=8).eval()
+    outputs = []
+    for use_inference_pipeline in (False, True):
+        sampler.use_inference_pipeline = use_inference_pipeline
+        with torch.no_grad():
+            outputs.append(sampler(ray_bundle, density_fns=[density_fn, density_fn]))
+    (ray_samples, weights_list, _), (inference_ray_samples, inference_weights_list, _) = outputs
+    assert torch.allclose(ray_samples.frustums.starts, inference_ray_samples.frustums.starts)
+    for weights, inference_weights in zip(weights_list, inference_weights_list):
+        assert torch.allclose(weights, inference_weights)
+
 
 if __name__ == "__main__":
     test_uniform_sampler()
     test_pdf_sampler()
+    test_proposal_network_sampler_inference()
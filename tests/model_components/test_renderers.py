@@ -5,8 +5,9 @@ Test renderers
 import pytest
 import torch
 
-from nerfstudio.cameras.rays import Frustums, RaySamples
+from nerfstudio.cameras.rays import Frustums, PackedRaySamples, RayBundle, RaySamples
 from nerfstudio.model_components import renderers
+from nerfstudio.model_components.ray_samplers import UniformSampler
 
 
 def test_rgb_renderer():
@@ -83,8 +84,77 @@ def test_depth_renderer():
     assert torch.min(depth) > 0
 
 
+def test_depth_renderer_packed():
+    """Test depth rendering of packed samples"""
+    num_rays = 5
+    ray_bundle = RayBundle(
+        origins=torch.zeros((num_rays, 3)),
+        directions=torch.ones((num_rays, 3)),
+        pixel_area=torch.ones((num_rays, 1)),
+        nears=torch.zeros((num_rays, 1)),
+        fars=torch.ones((num_rays, 1)) * 4,
+    )
+    ray_samples = UniformSampler(num_samples=16)(ray_bundle)
+    weights = ray_samples.get_weights(torch.rand((num_rays, 16, 1)))
+    packed_samples = PackedRaySamples.from_dense(ray_samples)
+
+    for method in ("median", "expected"):
+        depth_renderer = renderers.DepthRenderer(method=method)
+        depth = depth_renderer(weights=weights, ray_samples=ray_samples)
+        packed_depth = depth_renderer(
+            weights=weights.view(-1, 1),
+            ray_samples=packed_samples.ray_samples,
+            ray_indices=packed_samples.ray_indices,
+            num_rays=num_rays,
+        )
+        assert torch.allclose(depth, packed_depth, atol=1e-5)
+        assert torch.allclose(depth, depth_renderer(weights=weights.view(-1, 1), ray_samples=packed_samples), atol=1e-5)
+
+
+def test_renderers_packed_samples():
+    """Test that rendering packed samples matches rendering the dense samples without the dropped ones"""
+    num_rays, num_samples = 4, 8
+    ray_bundle = RayBundle(
+        origins=torch.zeros((num_rays, 3)),
+        directions=torch.ones((num_rays, 3)),
+        pixel_area=torch.ones((num_rays, 1)),
+        nears=torch.zeros((num_rays, 1)),
+        fars=torch.ones((num_rays, 1)) * 4,
+    )
+    ray_samples = UniformSampler(num_samples=num_samples)(ray_bundle)
+    weights = ray_samples.get_weights(torch.rand((num_rays, num_samples, 1)))
+    rgb = torch.rand((num_rays, num_samples, 3))
+    normals = torch.randn((num_rays, num_samples, 3))
+    # The first ray has no samples, the others keep their last one.
+    mask = torch.rand((num_rays, num_samples)) > 0.5
+    mask[0] = False
+    mask[1:, -1] = True
+    packed_samples = PackedRaySamples.from_dense(ray_samples, mask)
+    packed_weights = packed_samples.pack_values(weights)
+    masked_weights = weights * mask[..., None]
+    assert torch.equal(packed_weights[:, 0], weights[mask][:, 0])
+
+    for background_color in ("black", "last_sample"):
+        rgb_renderer = renderers.RGBRenderer(background_color=background_color)
+        packed_rgb = rgb_renderer(
+            rgb=packed_samples.pack_values(rgb), weights=packed_weights, packed_samples=packed_samples
+        )
+        assert torch.allclose(packed_rgb[1:], rgb_renderer(rgb=rgb, weights=masked_weights)[1:], atol=1e-6)
+        assert torch.equal(packed_rgb[0], torch.zeros(3))
+
+    accumulation = renderers.AccumulationRenderer()(weights=packed_weights, packed_samples=packed_samples)
+    assert torch.allclose(accumulation, renderers.AccumulationRenderer()(weights=masked_weights), atol=1e-6)
+    packed_normals = renderers.NormalsRenderer()(
+        normals=packed_samples.pack_values(normals), weights=packed_weights, packed_samples=packed_samples
+    )
+    dense_normals = renderers.NormalsRenderer()(normals=normals, weights=masked_weights)
+    assert torch.allclose(packed_normals, dense_normals, atol=1e-5)
+
+
 if __name__ == "__main__":
     test_rgb_renderer()
     test_sh_renderer()
     test_acc_renderer()
     test_depth_renderer()
+    test_depth_renderer_packed()
+    test_renderers_packed_samples()
@@ -0,0 +1,176 @@
+"""
+Test the rendering helpers of the base model
+"""
+
+from typing import Dict, List
+
+import pytest
+import torch
+from torch.nn import Parameter
+
+from nerfstudio.cameras.cameras import Cameras, CameraType
+from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.models.base_model import Model, ModelConfig
+from nerfstudio.utils.cancellation import CancellationToken, cancellation_context
+from nerfstudio.utils.chunking import AdaptiveChunkSize, group_cameras_by_num_rays
+
+
+class DirectionsModel(Model):
+    """Model rendering the ray directions and camera indices"""
+
+    def get_param_groups(self) -> Dict[str, List[Parameter]]:
+        return {}
+
+    def get_outputs(self, ray_bundle: RayBundle):
+        assert len(ray_bundle) <= 7, "passes must respect the ray budget"
+        assert ray_bundle.camera_indices is not None
+        return {"rgb": ray_bundle.directions, "camera": ray_bundle.camera_indices.float(), "list": [0]}
+
+    def get_loss_dict(self, outputs, batch, metrics_dict=None) -> Dict[str, torch.Tensor]:
+        return {}
+
+
+def test_get_outputs_for_cameras():
+    """Test that rendering several cameras at once matches rendering them one by one"""
+    cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3, :].repeat(3, 1, 1),
+        fx=torch.tensor([[10.0], [12.0], [8.0]]),
+        fy=torch.tensor([[10.0], [12.0], [8.0]]),
+        cx=torch.tensor([[2.5], [3.0], [1.5]]),
+        cy=torch.tensor([[2.0], [1.5], [2.5]]),
+        width=torch.tensor([[5], [6], [3]]),
+        height=torch.tensor([[4], [3], [5]]),
+        camera_type=CameraType.PERSPECTIVE,
+    )
+    model = DirectionsModel(
+        ModelConfig(enable_collider=False, eval_num_rays_per_chunk=7),
+        scene_box=SceneBox(aabb=torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])),
+        num_train_data=3,
+    )
+    model.eval()
+
+    images = model.get_outputs_for_cameras(cameras)
+    assert len(images) == 3
+    for i, image in enumerate(images):
+        expected = model.get_outputs_for_camera_ray_bundle(cameras.generate_rays(camera_indices=i, keep_shape=True))
+        assert image.keys() == {"rgb", "camera"}
+        assert image["rgb"].shape == (cameras.height[i], cameras.width[i], 3)
+        assert torch.allclose(image["rgb"], expected["rgb"])
+        assert torch.all(image["camera"] == i)
+
+    camera_indices = torch.tensor([[2], [0]])
+    images = model.get_outputs_for_cameras(cameras, camera_indices, num_rays_per_pass=4)
+    assert [image["rgb"].shape[:2] for image in images] == [(5, 3), (4, 5)]
+    assert torch.all(images[0]["camera"] == 2)
+
+
+def test_get_outputs_for_cameras_overridden_camera():
+    """Test that models rendering whole cameras render one camera at a time"""
+
+    class WholeImageModel(DirectionsModel):
+        """Model filling each image with its focal length"""
+
+        def get_outputs_for_camera(self, camera: Cameras, obb_box=None) -> Dict[str, torch.Tensor]:
+            return {"rgb": torch.full((int(camera.height.item()), int(camera.width.item()), 3), camera.fx.item())}
+
+    cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3, :].repeat(2, 1, 1),
+        fx=torch.tensor([[10.0], [12.0]]),
+        fy=torch.tensor([[10.0], [12.0]]),
+        cx=torch.full((2, 1), 2.0),
+        cy=torch.full((2, 1), 2.0),
+        width=torch.tensor([[5], [6]]),
+        height=torch.tensor([[4], [3]]),
+    )
+    model = WholeImageModel(
+        ModelConfig(enable_collider=False), scene_box=SceneBox(aabb=torch.zeros((2, 3))), num_train_data=2
+    )
+    images = model.get_outputs_for_cameras(cameras, torch.tensor([[1], [0]]))
+    assert [image["rgb"].shape[:2] for image in images] == [(3, 6), (4, 5)]
+    assert torch.all(images[0]["rgb"] == 12.0) and torch.all(images[1]["rgb"] == 10.0)
+
+
+def test_group_cameras_by_num_rays():
+    """Test that consecutive cameras are grouped until they hold enough rays"""
+    cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3, :].repeat(4, 1, 1),
+        fx=torch.full((4, 1), 10.0),
+        fy=torch.full((4, 1), 10.0),
+        cx=torch.full((4, 1), 2.0),
+        cy=torch.full((4, 1), 2.0),
+        width=torch.tensor([[5], [3], [8], [2]]),
+        height=torch.tensor([[4], [3], [5], [2]]),
+    )
+    groups = list(group_cameras_by_num_rays(((cameras[i : i + 1], i) for i in range(4)), num_rays_per_group=25))
+    assert [[data for _, data in group] for group in groups] == [[0, 1], [2], [3]]
+    cameras = Cameras.cat([camera for camera, _ in groups[0]])
+    assert cameras.shape == (2,)
+    assert cameras.width.tolist() == [[5], [3]]
+
+
+def test_adaptive_num_rays_per_chunk():
+    """Test that chunks that run out of memory are retried with fewer rays"""
+
+    class OutOfMemoryModel(DirectionsModel):
+        """Model running out of memory above 100 rays"""
+
+        def get_outputs(self, ray_bundle: RayBundle):
+            if len(ray_bundle) > 100:
+                raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+            if len(ray_bundle) == 3:
+                raise RuntimeError("Some other error")
+            return {"rgb": ray_bundle.directions}
+
+    cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3, :],
+        fx=10.0,
+        fy=10.0,
+        cx=10.0,
+        cy=8.0,
+        width=20,
+        height=16,
+        camera_type=CameraType.PERSPECTIVE,
+    )
+    config = ModelConfig(enable_collider=False, eval_num_rays_per_chunk=256, eval_adaptive_num_rays_per_chunk=True)
+    model = OutOfMemoryModel(config, scene_box=SceneBox(aabb=torch.zeros((2, 3))), num_train_data=1)
+    model.eval()
+    ray_bundle = cameras.generate_rays(camera_indices=0, keep_shape=True)
+    outputs = model.get_outputs_for_camera_ray_bundle(ray_bundle)
+    assert torch.allclose(outputs["rgb"], ray_bundle.directions)
+    # The chunk size is remembered for the resolution.
+    assert model.eval_chunk_size is not None
+    assert model.eval_chunk_size.states[320].num_rays == 64
+    assert model.eval_chunk_size.states[320].limit == 128
+
+    # Other errors are raised.
+    with pytest.raises(RuntimeError, match="Some other error"):
+        model.get_outputs_for_rays(ray_bundle.flatten()[:3])
+
+
+def test_adaptive_num_rays_per_chunk_cancellable():
+    """Test that cancellable renders don't use grown chunks, as they can only stop between chunks"""
+    num_rays_per_pass = []
+
+    class CountingModel(DirectionsModel):
+        """Model recording the number of rays of each pass"""
+
+        def get_outputs(self, ray_bundle: RayBundle):
+            num_rays_per_pass.append(len(ray_bundle))
+            return {"rgb": ray_bundle.directions}
+
+    config = ModelConfig(enable_collider=False, eval_num_rays_per_chunk=16, eval_adaptive_num_rays_per_chunk=True)
+    model = CountingModel(config, scene_box=SceneBox(aabb=torch.zeros((2, 3))), num_train_data=1)
+    model.eval()
+    ray_bundle = RayBundle(origins=torch.zeros((64, 3)), directions=torch.ones((64, 3)), pixel_area=torch.ones((64, 1)))
+    model.eval_chunk_size = AdaptiveChunkSize(16, 64)
+    model.eval_chunk_size.get(64)
+    model.eval_chunk_size.states[64].num_rays = 64
+    model.get_outputs_for_rays(ray_bundle)
+    assert num_rays_per_pass == [64]
+
+    num_rays_per_pass.clear()
+    with cancellation_context(CancellationToken()):
+        outputs = model.get_outputs_for_rays(ray_bundle)
+    assert num_rays_per_pass == [16, 16, 16, 16]
+    assert torch.equal(outputs["rgb"], ray_bundle.directions)
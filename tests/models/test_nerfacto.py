@@ -0,0 +1,97 @@
+"""
+Test the inference paths of nerfacto
+"""
+
+import pytest
+import torch
+import torchmetrics.image.lpip
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.models.nerfacto import NerfactoModelConfig
+
+
+@pytest.mark.parametrize("background_color", ["last_sample", "black"])
+def test_sample_culling(monkeypatch: pytest.MonkeyPatch, background_color: str):
+    """Test that culling samples renders like evaluating all of them, up to the weights of the dropped samples"""
+    # LPIPS downloads pretrained weights and isn't used at inference.
+    monkeypatch.setattr(
+        torchmetrics.image.lpip, "LearnedPerceptualImagePatchSimilarity", lambda **_: torch.nn.Identity()
+    )
+    torch.manual_seed(0)
+    config = NerfactoModelConfig(
+        implementation="torch", predict_normals=True, background_color=background_color, num_nerf_samples_per_ray=16
+    )
+    model = config.setup(scene_box=SceneBox(aabb=torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])), num_train_data=1)
+    model.eval()
+    # An untrained field is nearly transparent, make it opaque so that rays terminate and samples get dropped.
+    get_density = model.field.get_density
+
+    def get_opaque_density(ray_samples):
+        density, density_embedding = get_density(ray_samples)
+        return density * 100.0, density_embedding
+
+    monkeypatch.setattr(model.field, "get_density", get_opaque_density)
+    num_colored_samples = []
+    get_outputs = model.field.get_outputs
+
+    def get_counted_outputs(ray_samples, density_embedding=None):
+        num_colored_samples.append(ray_samples.shape.numel())
+        return get_outputs(ray_samples, density_embedding=density_embedding)
+
+    monkeypatch.setattr(model.field, "get_outputs", get_counted_outputs)
+    camera = Cameras(camera_to_worlds=torch.eye(4)[None, :3], fx=8.0, fy=8.0, cx=4.0, cy=3.0, width=8, height=6)
+
+    def render(use_sample_culling: bool, threshold: float):
+        model.config.use_sample_culling = use_sample_culling
+        model.config.sample_culling_weight_threshold = threshold
+        # The proposal sampler jitters the samples, the renders must use the same ones.
+        torch.manual_seed(1)
+        with torch.no_grad():
+            return model.get_outputs_for_camera(camera)
+
+    reference = render(False, 0.0)
+    culled = render(True, 0.0)
+    for name in ("rgb", "accumulation", "depth", "normals", "pred_normals"):
+        assert torch.allclose(culled[name], reference[name], atol=1e-5), name
+
+    # Each dropped sample has a weight below the threshold, and so does the transmittance left after the last
+    # evaluated sample of a ray.
+    threshold = 1e-2
+    num_colored_samples.clear()
+    culled = render(True, threshold)
+    assert sum(num_colored_samples) < int(camera.width) * int(camera.height) * config.num_nerf_samples_per_ray
+    bound = (config.num_nerf_samples_per_ray + 1) * threshold
+    assert (culled["rgb"] - reference["rgb"]).abs().max() <= bound
+    assert (culled["accumulation"] - reference["accumulation"]).abs().max() <= bound
+
+
+def test_sample_culling_empty_space(monkeypatch: pytest.MonkeyPatch):
+    """Test that culling renders rays that drop every sample without evaluating the color head"""
+    monkeypatch.setattr(
+        torchmetrics.image.lpip, "LearnedPerceptualImagePatchSimilarity", lambda **_: torch.nn.Identity()
+    )
+    config = NerfactoModelConfig(
+        implementation="torch", predict_normals=True, background_color="black", num_nerf_samples_per_ray=16
+    )
+    model = config.setup(scene_box=SceneBox(aabb=torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])), num_train_data=1)
+    model.eval()
+    model.config.use_sample_culling = True
+    model.config.sample_culling_weight_threshold = 1e-2
+    get_density = model.field.get_density
+
+    def get_empty_density(ray_samples):
+        density, density_embedding = get_density(ray_samples)
+        return torch.zeros_like(density), density_embedding
+
+    def get_outputs(ray_samples, density_embedding=None):
+        raise AssertionError("The color head is evaluated on no samples")
+
+    monkeypatch.setattr(model.field, "get_density", get_empty_density)
+    monkeypatch.setattr(model.field, "get_outputs", get_outputs)
+    camera = Cameras(camera_to_worlds=torch.eye(4)[None, :3], fx=8.0, fy=8.0, cx=4.0, cy=3.0, width=8, height=6)
+    with torch.no_grad():
+        outputs = model.get_outputs_for_camera(camera)
+    assert torch.equal(outputs["rgb"], torch.zeros_like(outputs["rgb"]))
+    assert torch.equal(outputs["accumulation"], torch.zeros_like(outputs["accumulation"]))
+    assert outputs["pred_normals"].shape == outputs["normals"].shape
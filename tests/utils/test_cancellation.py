@@ -0,0 +1,89 @@
+"""
+Test the cooperative cancellation of renders
+"""
+
+import threading
+
+import pytest
+import torch
+
+from nerfstudio.cameras.rays import Frustums, RaySamples
+from nerfstudio.field_components.field_heads import FieldHeadNames
+from nerfstudio.fields.base_field import Field
+from nerfstudio.utils.cancellation import (
+    CancellationToken,
+    RenderCancelledException,
+    cancellation_context,
+    check_cancelled,
+    is_cancellable,
+)
+
+
+def test_cancellation_context():
+    """Test that checkpoints only raise in the thread rendering with a cancelled token"""
+    token = CancellationToken()
+    token.cancel()
+    check_cancelled()
+
+    other_thread_errors = []
+
+    def other_render():
+        try:
+            check_cancelled()
+        except RenderCancelledException as e:
+            other_thread_errors.append(e)
+
+    with cancellation_context(token):
+        with pytest.raises(RenderCancelledException):
+            check_cancelled()
+        thread = threading.Thread(target=other_render)
+        thread.start()
+        thread.join()
+        token.reset()
+        check_cancelled()
+    assert not other_thread_errors
+
+    token.cancel()
+    check_cancelled()
+
+
+def test_field_checkpoint():
+    """Test that a cancelled render stops between the density and color heads of a field"""
+
+    class CancellingField(Field):
+        """Field cancelling the render while evaluating the density"""
+
+        def __init__(self, token: CancellationToken) -> None:
+            super().__init__()
+            self.token = token
+            self.num_color_evaluations = 0
+
+        def get_density(self, ray_samples):
+            self.token.cancel()
+            return torch.ones((*ray_samples.shape, 1)), None
+
+        def get_outputs(self, ray_samples, density_embedding=None):
+            self.num_color_evaluations += 1
+            return {FieldHeadNames.RGB: torch.zeros((*ray_samples.shape, 3))}
+
+    ray_samples = RaySamples(
+        frustums=Frustums(
+            origins=torch.zeros((2, 3)),
+            directions=torch.ones((2, 3)),
+            starts=torch.zeros((2, 1)),
+            ends=torch.ones((2, 1)),
+            pixel_area=torch.ones((2, 1)),
+        )
+    )
+    token = CancellationToken()
+    field = CancellingField(token)
+    with cancellation_context(token) as context_token:
+        assert context_token is token and is_cancellable()
+        with pytest.raises(RenderCancelledException):
+            field(ray_samples)
+    assert field.num_color_evaluations == 0
+    assert not is_cancellable()
+
+    # Renders that can't be cancelled run to the end.
+    field(ray_samples)
+    assert field.num_color_evaluations == 1
@@ -186,9 +186,101 @@ def test_non_tensor():
     assert DummyTensorDataclass(a=torch.ones((3, 10)), b={"k": 2}, c=None).b == {"k": 2}  # type: ignore
 
 
+def test_construct_unchecked():
+    """Test creating a tensor dataclass without checks and deriving dataclasses without __post_init__"""
+    a = torch.ones((4, 6, 3))
+    b = torch.zeros((4, 6, 2))
+    tensor_dataclass = DummyTensorDataclass.construct_unchecked((4, 6), a=a, b=b, c=None)
+    assert tensor_dataclass.shape == (4, 6)
+    assert tensor_dataclass.a is a
+    assert tensor_dataclass.d == {}
+    with pytest.raises(TypeError):
+        DummyTensorDataclass.construct_unchecked((4, 6), a=a)
+
+    c = DummyNestedClass(x=torch.ones(6, 5))
+    tensor_dataclass = DummyTensorDataclass(a=a, b=b, c=c, d={"e": torch.ones(4, 6, 1)})
+    reshaped = tensor_dataclass[1:3].reshape((12,))
+    assert reshaped.shape == (12,)
+    assert reshaped.c.shape == (12,)
+    assert reshaped.d["e"].shape == (12, 1)
+
+
+def test_pack():
+    """Test that packed tensor dataclasses behave like regular ones"""
+    a = torch.rand((4, 6, 3))
+    b = torch.rand((6, 2))
+    c = DummyNestedClass(x=torch.rand(4, 6, 5))
+    d = {"e": torch.randint(0, 10, (4, 6, 1)), "f": torch.rand(4, 6, 2)}
+    tensor_dataclass = DummyTensorDataclass(a=a, b=b, c=c, d=d)
+    packed = tensor_dataclass.pack()
+    assert packed.is_packed and not tensor_dataclass.is_packed
+    # One buffer per dtype.
+    assert len(packed.__dict__["_packed_buffers"]) == 2
+
+    def check_equal(x: DummyTensorDataclass, y: DummyTensorDataclass) -> None:
+        assert x.shape == y.shape
+        assert torch.equal(x.a, y.a) and torch.equal(x.b, y.b) and torch.equal(x.c.x, y.c.x)
+        assert x.d.keys() == y.d.keys() and all(torch.equal(x.d[k], y.d[k]) for k in x.d)
+
+    mask = torch.rand(size=(4,)) > 0.5
+    for op in (
+        lambda x: x,
+        lambda x: x[1:3],
+        lambda x: x[:, 2],
+        lambda x: x[..., None],
+        lambda x: x[mask],
+        lambda x: x.flatten()[5:17],
+        lambda x: x.reshape((2, 12)),
+        lambda x: x.to("cpu"),
+    ):
+        result = op(packed)
+        assert result.is_packed
+        check_equal(result, op(tensor_dataclass))
+
+    flat = DummyTensorDataclass(a=a[:, :1], b=b[:1], c=None)
+    assert torch.equal(flat.pack().broadcast_to((4, 3)).a, flat.broadcast_to((4, 3)).a)
+
+    # Fields are views into the buffers.
+    packed.a[0, 0, 0] = -1.0
+    assert packed.__dict__["_packed_buffers"][torch.float32][0, 0, 0] == -1.0
+
+    # Replacing a field unpacks the dataclass.
+    packed.b = torch.zeros((4, 6, 2))
+    assert not packed.is_packed
+    assert torch.equal(packed[1:3].b, torch.zeros((2, 6, 2)))
+    packed = tensor_dataclass.pack()
+    packed.d["g"] = torch.ones((4, 6, 1))
+    assert not packed.is_packed
+    assert packed[0].d["g"].shape == (6, 1)
+
+
+def test_cat():
+    """Test concatenating tensor dataclasses along the first batch dimension"""
+    x = DummyTensorDataclass(
+        a=torch.rand((2, 6, 3)), b=torch.rand((6, 2)), c=DummyNestedClass(x=torch.rand(2, 6, 5)), d={"e": 1}
+    )
+    y = DummyTensorDataclass(
+        a=torch.rand((3, 6, 3)), b=torch.rand((3, 6, 2)), c=DummyNestedClass(x=torch.rand(3, 6, 5)), d={"e": 2}
+    )
+    cat = DummyTensorDataclass.cat([x, y.pack()])
+    assert cat.shape == (5, 6)
+    assert cat.c.shape == (5, 6)
+    assert torch.equal(cat.a, torch.cat([x.a, y.a]))
+    assert torch.equal(cat[:2].b, x.b)
+    assert torch.equal(cat.c.x[2:], y.c.x)
+    assert cat.d == {"e": 1}
+
+    with pytest.raises(AssertionError):
+        DummyTensorDataclass.cat([x, y[:, :3]])
+    with pytest.raises(AssertionError):
+        DummyTensorDataclass.cat([DummyTensorDataclass(a=x.a, b=x.b, c=None), y])
+
+
 if __name__ == "__main__":
     test_init()
     test_broadcasting()
     test_tensor_ops()
     test_iter()
     test_nested_class()
+    test_construct_unchecked()
+    test_pack()
@@ -0,0 +1,58 @@
+"""
+Test the render state machine of the viewer
+"""
+
+import torch
+
+from nerfstudio.viewer.render_state_machine import ProgressiveRender, RenderOutputCache
+
+
+def test_render_output_cache():
+    """Test that renders are served from the largest cached render and evicted in least recently used order"""
+    cache = RenderOutputCache(max_size=2)
+    cache.put("a", 100, 200, {"rgb": "a high"})
+    assert cache.get("a", 50, 100) == {"rgb": "a high"}
+    assert cache.get("a", 200, 400) is None
+
+    # A smaller render of the same view doesn't replace the larger one.
+    cache.put("a", 50, 100, {"rgb": "a low"})
+    assert cache.get("a", 100, 200) == {"rgb": "a high"}
+
+    cache.put("b", 100, 200, {"rgb": "b"})
+    cache.get("a", 100, 200)
+    cache.put("c", 100, 200, {"rgb": "c"})
+    assert cache.get("b", 100, 200) is None
+    assert cache.get("a", 100, 200) is not None
+    assert cache.get("c", 100, 200) is not None
+
+    cache.clear()
+    assert cache.get("a", 100, 200) is None
+
+    disabled_cache = RenderOutputCache(max_size=0)
+    disabled_cache.put("a", 100, 200, {"rgb": "a"})
+    assert disabled_cache.get("a", 100, 200) is None
+
+
+def test_progressive_render():
+    """Test that the passes of a progressive render refine to the full image, rendering each pixel once"""
+    image = torch.rand((16 * 16, 3))
+    progress = ProgressiveRender("key", 16, 16, "cpu")
+    # A budget of 16 rays for the first pass starts from a grid with a spacing of 4 pixels.
+    assert progress.get_strides(16) == [4, 2, 1]
+    assert progress.get_strides(1e6) == [1]
+
+    indices = progress.get_pass_indices(4)
+    assert indices.numel() == 16
+    progress.add_pass(indices, {"rgb": image[indices]})
+    outputs = progress.get_outputs(4)
+    assert outputs["rgb"].shape == (16, 16, 3)
+    assert torch.equal(outputs["rgb"][:4, :4], image[:1].expand(4, 4, 3))
+
+    # A render interrupted after the first pass resumes from the pixels already rendered.
+    num_rendered_pixels = indices.numel()
+    for stride in progress.get_strides(16):
+        indices = progress.get_pass_indices(stride)
+        num_rendered_pixels += indices.numel()
+        progress.add_pass(indices, {"rgb": image[indices]})
+    assert num_rendered_pixels == 16 * 16
+    assert torch.equal(progress.get_outputs(1)["rgb"], image.view(16, 16, 3))
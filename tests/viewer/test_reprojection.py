@@ -0,0 +1,49 @@
+"""
+Test the reprojection of viewer frames to new camera poses
+"""
+
+import torch
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.viewer.reprojection import ReprojectionCache
+
+
+def get_camera(x: float = 0.0) -> Cameras:
+    """Returns a camera at (x, 0, 0) looking along the negative z axis"""
+    c2w = torch.eye(4)[:3]
+    c2w[0, 3] = x
+    return Cameras(camera_to_worlds=c2w[None], fx=8.0, fy=8.0, cx=4.0, cy=3.0, width=8, height=6)
+
+
+def test_reprojection():
+    """Test that frames of a plane move with the camera and are filled where disoccluded or occluded"""
+    camera = get_camera()
+    # Depth along the rays of the plane z = -2.
+    directions = camera.generate_rays(camera_indices=0, keep_shape=True).directions
+    depth = 2.0 / -directions[..., 2:3]
+    rgb = torch.rand((6, 8, 3))
+    cache = ReprojectionCache()
+    cache.store("key", camera, {"rgb": rgb, "depth": depth})
+
+    fill_rgb = torch.full((3, 4, 3), -1.0)
+    # The low resolution render sees a surface behind the plane, which hides none of it.
+    fill_outputs = {"rgb": fill_rgb, "depth": torch.full((3, 4, 1), 4.0), "accumulation": torch.ones((3, 4, 1))}
+    assert cache.reproject("other key", camera, fill_outputs) is None
+
+    outputs = cache.reproject("key", camera, fill_outputs)
+    assert outputs is not None
+    assert torch.equal(outputs["rgb"], rgb)
+    assert torch.allclose(outputs["depth"], depth)
+    assert outputs["accumulation"].shape == (6, 8, 1)
+
+    # Moving by 0.5 shifts the plane by 2 pixels to the left, the right columns are disoccluded.
+    outputs = cache.reproject("key", get_camera(0.5), fill_outputs)
+    assert outputs is not None
+    assert torch.equal(outputs["rgb"][:, :6], rgb[:, 2:])
+    assert torch.all(outputs["rgb"][:, 6:] == -1.0)
+
+    # Points behind the surface of the fill render are hidden by it.
+    fill_outputs["depth"] = torch.full((3, 4, 1), 1.0)
+    outputs = cache.reproject("key", camera, fill_outputs)
+    assert outputs is not None
+    assert torch.all(outputs["rgb"] == -1.0)